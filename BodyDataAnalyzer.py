@@ -5,9 +5,18 @@ BodyDataAnalyzer + XGBoost 身高预测
 一键复制即可跑
 """
 import os
+import gc
 import json
+import hashlib
+import queue
+import asyncio
+import threading
+import multiprocessing
 import numpy as np
-from typing import List, Dict, Union, Tuple
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, Iterator, List, Dict, Union, Tuple
 from pathlib import Path
 
 # ====== 第三方库 ======
@@ -16,7 +25,20 @@ import xgboost as xgb
 import joblib
 
 # ====== 角色卡加载器 ======
-from chara_loader import AiSyoujyoCharaData, KoikatuCharaData
+from chara_loader import AiSyoujyoCharaData, KoikatuCharaData, PROFILER
+from chara_loader.funcs import DecodeTimeout, decode_deadline
+from chara_loader.inventory import detect_format
+from chara_loader.stream import archive_member_path, iter_archive_cards, iter_stream_cards
+from chara_loader.validate import CardValidationError, validate_card
+from feature_store import FeatureStore, content_hash
+from journal import JournalMismatch, RunJournal
+from library_stats import LibraryStats, ShadowStats
+from model_registry import DEFAULT_KEY, ModelRegistry
+from quarantine import CardQuarantined, Quarantine
+from scheduler import plan_batches, scan_card_sizes
+from snapshot_diff import diff_files, format_counts
+from shards import (file_sha256, manifest_path, merge_shards, parse_shard_spec, shard_key, shard_of,
+                    shard_output_path, write_shard)
 
 
 # ------------------------------------------------------------------
@@ -49,6 +71,145 @@ def train_and_save_model(data_path: str = None, save_path: str = "height_xgb.pkl
 # ------------------------------------------------------------------
 #  2. 分析器主体
 # ------------------------------------------------------------------
+_END = object()  # 流水线各阶段之间的结束标记
+
+
+def read_card_file(file_path: str) -> bytes:
+    """流水线默认的读取函数，异常信息与 load_character_card 保持一致"""
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"文件不存在: {file_path}")
+    with PROFILER.stage("read"):
+        with open(file_path, "rb") as f:
+            data = f.read()
+    PROFILER.count("bytes_read", len(data))
+    return data
+
+
+def _is_final_result(result: Dict) -> bool:
+    """重跑也不会变的结果：成功，或因卡片内容本身失败（invalid_reason）；其余失败可能是一时的，值得重试"""
+    return bool(result.get('success') or result.get('invalid_reason'))
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    # 有界队列的 put，下游提前退出时不会永久阻塞
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+class ByteBudget:
+    """
+    在途字节预算：读取前按文件大小申请，解析完成后归还
+    单张卡超过整个预算时，只要当前没有其他在途卡片也允许通过，避免死锁
+    """
+
+    def __init__(self, limit: int = None):
+        self.limit = limit
+        self.in_flight = 0
+        self.peak = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, n: int, stop: threading.Event) -> bool:
+        with self._cond:
+            while self.limit is not None and self.in_flight and self.in_flight + n > self.limit:
+                if stop.is_set():
+                    return False
+                self._cond.wait(0.1)
+            self.in_flight += n
+            self.peak = max(self.peak, self.in_flight)
+            return True
+
+    def release(self, n: int) -> None:
+        with self._cond:
+            self.in_flight -= n
+            self._cond.notify_all()
+
+
+def current_rss_mb() -> float:
+    """当前进程常驻内存（MB），不支持的平台返回 None"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # 取不到当前值时退化为进程峰值
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _get(q: queue.Queue, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _END
+
+
+class AsyncPredictBatcher:
+    """
+    把同一事件循环里并发到达的单卡预测合并成一次 predict：
+    第一个请求到达后最多等待 max_delay 秒，凑满 max_batch 张则立即提交到 executor
+    """
+
+    def __init__(self, predict: Callable[[List[List[float]], List[Tuple[str, str]]], List], max_batch: int = 64,
+                 max_delay: float = 0.002, executor=None):
+        self._predict = predict
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.executor = executor
+        self.loop = asyncio.get_running_loop()
+        self.batches = 0
+        self._pending = []
+        self._timer = None
+
+    async def predict(self, shape_value: List[float], card_format: Tuple[str, str] = None) -> Union[float, Exception]:
+        fut = self.loop.create_future()
+        self._pending.append((shape_value, card_format, fut))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = self.loop.call_later(self.max_delay, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # 调用方已取消的请求不再送去预测
+        pending = [item for item in self._pending if not item[2].done()]
+        self._pending = []
+        if not pending:
+            return
+        self.batches += 1
+        task = self.loop.run_in_executor(self.executor, self._predict, [sv for sv, _, _ in pending],
+                                         [fmt for _, fmt, _ in pending])
+        task.add_done_callback(lambda t: self._resolve(pending, t))
+
+    @staticmethod
+    def _resolve(pending, task) -> None:
+        if task.cancelled():
+            for _, _, fut in pending:
+                fut.cancel()
+            return
+        exc = task.exception()
+        heights = None if exc else task.result()
+        for i, (_, _, fut) in enumerate(pending):
+            if fut.done():
+                continue
+            if exc:
+                fut.set_exception(exc)
+            else:
+                fut.set_result(heights[i])
+
+
 class BodyDataAnalyzer:
     # 基础身高分类
     HEIGHT_CATEGORIES = {
@@ -70,32 +231,326 @@ class BodyDataAnalyzer:
     # 输出标签顺序
     TAG_ORDER = ['bodyHeight', 'bustSize', 'hipSize', 'muscle', 'bustSoftness']
 
-    def __init__(self, model_path: str = "height_xgb.pkl"):
-        if not os.path.exists(model_path):
-            raise FileNotFoundError(
-                f"找不到模型文件: {model_path}  —— 请把 height_xgb.pkl 放在同一目录下！"
-            )
-        self.model = joblib.load(model_path)
+    # asyncio 接口：同时在途的单卡分析数、合并 predict 的批大小和最长等待（秒）
+    ASYNC_CONCURRENCY = 32
+    ASYNC_BATCH_SIZE = 64
+    ASYNC_BATCH_DELAY = 0.002
+
+    # 解释模式默认用精确的 TreeSHAP；True 时改用近似贡献（Saabas），快一个数量级以上
+    EXPLAIN_APPROX = False
+
+    # 加载前结构校验要求卡片带有的块：没有 Custom 就取不到 shapeValueBody
+    REQUIRED_BLOCKS = ("Custom",)
+
+    # 单张卡解码时限（秒，按解码线程的 CPU 时间计）：超时的卡记为 timeout 错误结果，不拖住整批；None 不限时
+    CARD_DEADLINE = None
+
+    # True 时每条结果附带卡片内容哈希 content_hash（"sha256:..."），供 snapshot_diff 区分内容变化和仅重新评分
+    RECORD_HASH = False
+
+    def __init__(self, model_path: str = "height_xgb.pkl", models=None):
+        """
+        models 为按卡片格式/版本选模型的配置（JSON 路径或 {键: 模型路径}，见 model_registry），
+        不给时所有卡片都用 model_path 这一个模型
+        """
+        if models is None:
+            if not os.path.exists(model_path):
+                raise FileNotFoundError(
+                    f"找不到模型文件: {model_path}  —— 请把 height_xgb.pkl 放在同一目录下！"
+                )
+            self.registry = ModelRegistry({DEFAULT_KEY: model_path})
+        else:
+            self.registry = ModelRegistry(models)
+        self.model_path = model_path
+        self.shadow = None
+        self.feature_store = None
+        # 坏卡隔离名单（quarantine.Quarantine），结构校验未通过的卡片记入名单，之后的运行直接跳过
+        self.quarantine = None
+        # 同一时刻只跑一个 predict：多个线程共用一个分析器时，CPU 只被 nthread 个 XGBoost 线程占用
+        self._predict_lock = threading.Lock()
+        self.last_run_stats = {}
+        self.last_contributions = []
+        self._async_batcher = None
+        self._async_limit = None
+
+    @property
+    def model(self):
+        """默认模型（注册表里的 "*"）；赋值等同于热替换默认模型"""
+        entry = self.registry.default
+        return entry.model if entry else None
+
+    @model.setter
+    def model(self, model) -> None:
+        self.registry.swap(DEFAULT_KEY, self.model_path, model=model)
+
+    @property
+    def model_fingerprint(self) -> str:
+        """
+        模型文件的 sha256（直接赋值给 model 的按模型内容计算），用于确认分片 / 断点续跑之间用的是同一组模型；
+        注册了多个模型时由各模型的键和 sha256 共同决定
+        """
+        return self.registry.fingerprint()
+
+    @property
+    def thresholds_fingerprint(self) -> str:
+        """当前阈值表（HEIGHT_CATEGORIES / AESTHETIC_CATEGORIES，含 set_thresholds 的修改）的 sha256"""
+        table = {'HEIGHT_CATEGORIES': self.HEIGHT_CATEGORIES, 'AESTHETIC_CATEGORIES': self.AESTHETIC_CATEGORIES}
+        return hashlib.sha256(json.dumps(table, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    @property
+    def shadow_fingerprint(self) -> Union[str, None]:
+        """影子评分候选模型的指纹（同 model_fingerprint），未开启影子评分时为 None"""
+        return self.shadow.fingerprint() if self.shadow is not None else None
+
+    def set_shadow_models(self, models) -> None:
+        """
+        影子评分：models 为候选模型（.pkl 路径，或与 models 参数相同的 JSON 配置 / 字典），None 关闭。
+        开启后批量分析解析出的 shapeValueBody 在同一遍里再交给候选模型预测一次，
+        结果附加 'shadow' 字段（候选身高、与正式身高的差、身高分类是否变化），正式结果不受影响
+        """
+        if models is None:
+            self.shadow = None
+        elif isinstance(models, str) and not models.lower().endswith('.json'):
+            self.shadow = ModelRegistry({DEFAULT_KEY: models}, nthread=self.registry.nthread)
+        else:
+            self.shadow = ModelRegistry(models, nthread=self.registry.nthread)
+
+    @staticmethod
+    def card_format(chara_data: Union[AiSyoujyoCharaData, KoikatuCharaData]) -> Tuple[str, str]:
+        """卡片的 (格式, 版本)，用于在注册表里选模型"""
+        return detect_format(chara_data.header), chara_data.version.decode("utf-8", errors="replace")
 
     # ---------- 加载 ----------
     def load_character_card(self, file_path: str) -> Union[AiSyoujyoCharaData, KoikatuCharaData]:
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"文件不存在: {file_path}")
-        try:
-            return AiSyoujyoCharaData.load(file_path)
-        except Exception:
-            return KoikatuCharaData.load(file_path)
+        return self.load_character_bytes(read_card_file(file_path))
+
+    def load_character_bytes(self, data: bytes, **load_kwargs) -> Union[AiSyoujyoCharaData, KoikatuCharaData]:
+        """
+        从内存中的卡片字节加载（流水线 / 流式输入使用），load_kwargs 透传给 load()。
+        先做结构校验（不解码任何块），未通过时抛 CardValidationError；
+        通过后按头部判断出的格式直接用对应的加载器，不再先按 AI少女 格式试一遍。
+        CARD_DEADLINE 不为空时解码超时抛 DecodeTimeout
+        """
+        with decode_deadline(self.CARD_DEADLINE):
+            with PROFILER.stage("validate"):
+                fmt = validate_card(data, self.REQUIRED_BLOCKS)
+            loader = KoikatuCharaData if fmt == "Koikatu" else AiSyoujyoCharaData
+            return loader.load(data, **load_kwargs)
+
+    def _read_card(self, file_path: str, reader: Callable[[str], bytes] = read_card_file) -> bytes:
+        """读取卡片字节；在隔离名单中且文件没变的卡片不读取，直接抛 CardQuarantined"""
+        if self.quarantine is not None:
+            entry = self.quarantine.check(file_path)
+            if entry is not None:
+                PROFILER.count("quarantine_skipped")
+                raise CardQuarantined(entry)
+        return reader(file_path)
+
+    def _record_failure(self, result: Dict, error: Exception, data=None) -> Dict:
+        """
+        失败结果统一写 error；结构校验未通过 / 已隔离的卡片另记 invalid_reason，并把前者加入隔离名单；
+        解码超时的卡记 timeout=True（可能只是机器繁忙，不加入隔离名单）
+        """
+        PROFILER.count("analyze_errors")
+        result['error'] = f"{type(error).__name__}: {str(error)}"
+        if isinstance(error, DecodeTimeout):
+            result['timeout'] = True
+        elif isinstance(error, CardQuarantined):
+            result['invalid_reason'] = error.entry['reason']
+        elif isinstance(error, CardValidationError):
+            result['invalid_reason'] = error.reason
+            if self.quarantine is not None:
+                hash_ = content_hash(data) if isinstance(data, (bytes, bytearray)) else None
+                if self.quarantine.add(result['file_path'], error.reason, error.detail, hash_) is not None:
+                    PROFILER.count("quarantine_added")
+        return result
 
     # ---------- 预测 ----------
+    def set_predict_threads(self, nthread: int) -> None:
+        """限制正式模型和候选模型每次 predict 使用的线程数（之后热替换进来的模型同样生效）"""
+        self.registry.set_nthread(nthread)
+        if self.shadow is not None:
+            self.shadow.set_nthread(nthread)
+
+    def _predict(self, model, X) -> np.ndarray:
+        with self._predict_lock, PROFILER.stage("predict"):
+            return model.predict(X)
+
     def extract_height(self, chara_data: Union[AiSyoujyoCharaData, KoikatuCharaData]) -> float:
+        model = self.registry.get(*self.card_format(chara_data)).model
         sv = np.array(chara_data.Custom["body"]["shapeValueBody"]).reshape(1, -1)
-        return float(self.model.predict(sv)[0])
-    
+        return float(self._predict(model, sv)[0])
+
+    def _model_groups(self, shape_values: List[List[float]], formats: List[Tuple[str, str]],
+                      out: List, registry: ModelRegistry = None) -> Dict[Tuple, List[int]]:
+        """
+        按 (所选模型, shapeValueBody 长度) 分组，返回 {(ModelEntry, 长度): [下标]}；
+        整批只取一次注册表快照，预测途中热替换的模型从下一批开始生效。
+        找不到模型的卡把 KeyError 直接写进 out；registry 默认为 self.registry
+        """
+        entries = (registry or self.registry).snapshot()
+        groups = {}
+        for i, sv in enumerate(shape_values):
+            try:
+                entry = ModelRegistry.resolve(entries, *(formats[i] if formats else (DEFAULT_KEY,)))
+            except KeyError as e:
+                out[i] = e
+                continue
+            groups.setdefault((entry, len(sv)), []).append(i)
+        return groups
+
+    def extract_heights(self, shape_values: List[List[float]], formats: List[Tuple[str, str]] = None,
+                        registry: ModelRegistry = None) -> List[Union[float, Exception]]:
+        """
+        一次 predict 预测多张卡的身高，返回与输入等长的列表（float 或 该卡的异常）
+        formats 为每张卡的 (格式, 版本)，按注册表选模型，不给时全部用默认模型；
+        registry 默认为正式模型，影子评分时传入候选模型的注册表；
+        模型或 shapeValueBody 长度不同的卡分组预测；某组整体失败时逐张重试，把异常落到具体卡片上
+        """
+        heights = [None] * len(shape_values)
+        for (entry, _), idx in self._model_groups(shape_values, formats, heights, registry).items():
+            try:
+                X = np.array([shape_values[i] for i in idx])
+                preds = self._predict(entry.model, X)
+                for i, h in zip(idx, preds):
+                    heights[i] = float(h)
+            except Exception:
+                for i in idx:
+                    try:
+                        sv = np.array(shape_values[i]).reshape(1, -1)
+                        heights[i] = float(self._predict(entry.model, sv)[0])
+                    except Exception as e:
+                        heights[i] = e
+        return heights
+
+    # ---------- 解释 ----------
+    def explain_heights(self, shape_values: List[List[float]], chunk_size: int = 4096, approx: bool = None,
+                        formats: List[Tuple[str, str]] = None) -> Tuple[List[Union[float, Exception]], List[np.ndarray]]:
+        """
+        在与 extract_heights 相同的分组矩阵上，同时算预测身高和 XGBoost 的 pred_contribs
+        返回 (身高列表, 贡献列表)：贡献为长度 特征数+1 的 float32 数组，最后一列是偏置，
+        各列之和等于该卡的预测值；某组预测失败时退回 extract_heights，贡献为 None。
+        每组按 chunk_size 行切块，十万张以上的卡也不会一次构造巨大的 DMatrix；
+        approx 默认取 EXPLAIN_APPROX；formats 的含义同 extract_heights
+        """
+        if approx is None:
+            approx = self.EXPLAIN_APPROX
+        heights = [None] * len(shape_values)
+        contribs = [None] * len(shape_values)
+        for (entry, _), idx in self._model_groups(shape_values, formats, heights).items():
+            for start in range(0, len(idx), chunk_size):
+                chunk = idx[start : start + chunk_size]
+                try:
+                    X = np.array([shape_values[i] for i in chunk])
+                    preds = self._predict(entry.model, X)
+                    with self._predict_lock, PROFILER.stage("explain"):
+                        contrib = entry.model.get_booster().predict(xgb.DMatrix(X), pred_contribs=True,
+                                                                    approx_contribs=approx)
+                except Exception:
+                    for i in chunk:
+                        try:
+                            sv = np.array(shape_values[i]).reshape(1, -1)
+                            heights[i] = float(self._predict(entry.model, sv)[0])
+                        except Exception as e:
+                            heights[i] = e
+                    continue
+                for i, h, c in zip(chunk, preds, contrib):
+                    heights[i] = float(h)
+                    contribs[i] = c
+        return heights, contribs
+
+    @staticmethod
+    def top_contributions(contrib: np.ndarray, top_k: int = 5) -> List[Dict]:
+        """按贡献绝对值取前 top_k 个 shapeValueBody 下标（不含偏置列）"""
+        features = contrib[:-1]
+        order = np.argsort(-np.abs(features), kind="stable")[:top_k]
+        return [{'index': int(i), 'contribution': round(float(features[i]), 3)} for i in order]
+
+    def save_contributions(self, output_file: str) -> int:
+        """
+        把上一次解释模式运行（explain_top_k > 0）收集的贡献写成列式 .npz：
+        file_path（n）、contribs（n × 特征数+1，float32）、columns（列名，最后一列 bias）。返回行数
+        各格式的模型特征数不同时按最多的特征数对齐，较短的行在偏置列之前补 0（各列之和不变）
+        """
+        paths = [p for chunk_paths, _ in self.last_contributions for p in chunk_paths]
+        if paths:
+            width = max(m.shape[1] for _, m in self.last_contributions)
+            contribs = np.vstack([np.insert(m, [m.shape[1] - 1] * (width - m.shape[1]), 0.0, axis=1)
+                                  for _, m in self.last_contributions])
+        else:
+            contribs = np.zeros((0, 0), dtype=np.float32)
+        columns = [f"shapeValueBody[{i}]" for i in range(max(contribs.shape[1] - 1, 0))] + ["bias"]
+        os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+        np.savez_compressed(output_file, file_path=np.array(paths, dtype=str), contribs=contribs,
+                            columns=np.array(columns, dtype=str))
+        return len(paths)
+
+    # ---------- 反求 shapeValue ----------
+    def solve_shape_for_height(self, chara_data: Union[AiSyoujyoCharaData, KoikatuCharaData], target_cm: float,
+                               indices: Iterable[int] = (0,), bounds: Tuple[float, float] = (0.0, 1.0),
+                               candidates: int = 256, rounds: int = 8, tolerance: float = 0.05,
+                               save_path: str = None) -> Tuple[List[float], float]:
+        """
+        反求 shapeValueBody：只调整 indices 指定的滑块（默认 0 号身高滑块），使预测身高尽量接近 target_cm
+        每轮在搜索框内铺一张网格（约 candidates 个候选向量，一次 predict 全部算完），取最优点后
+        把搜索框缩到它周围一格继续细分，直到误差 ≤ tolerance 或用完 rounds 轮；
+        满足误差的候选里取离原值最近的。树模型是分段常数，这里不要求预测随滑块单调。
+        候选值先取整到 float32（卡片里 msgpack 存单精度），保存后重新分析得到的是同一个身高。
+        save_path 不为空时把新向量写回卡片并 save()。返回 (新的 shapeValueBody, 预测身高)。
+        indices 为空、越界或有重复时抛 ValueError
+        """
+        model = self.registry.get(*self.card_format(chara_data)).model
+        base = np.array(chara_data.Custom["body"]["shapeValueBody"], dtype=np.float32)
+        idx = [int(i) for i in indices]
+        if not idx:
+            raise ValueError("indices 不能为空：至少指定一个要调整的 shapeValueBody 下标")
+        bad = [i for i in idx if not 0 <= i < len(base)]
+        if bad:
+            raise ValueError(f"indices 越界: {bad}（shapeValueBody 共 {len(base)} 项，下标应为 0 ~ {len(base) - 1}）")
+        if len(set(idx)) != len(idx):
+            raise ValueError(f"indices 有重复: {idx}")
+        per_axis = max(3, int(round(candidates ** (1.0 / len(idx)))))
+        lo = np.full(len(idx), bounds[0], dtype=np.float64)
+        hi = np.full(len(idx), bounds[1], dtype=np.float64)
+
+        best = None  # (误差, 离原值距离, 向量, 预测身高)
+        for _ in range(rounds):
+            axes = [np.linspace(lo[j], hi[j], per_axis) for j in range(len(idx))]
+            grid = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, len(idx)).astype(np.float32)
+            if best is None:
+                grid = np.vstack([base[idx][None, :], grid])  # 原值本身也是候选
+            X = np.repeat(base[None, :], len(grid), axis=0)
+            X[:, idx] = grid
+            preds = np.asarray(self._predict(model, X), dtype=np.float64)
+            err = np.abs(preds - target_cm)
+            dist = np.abs(grid - base[idx]).sum(axis=1)
+            # 已满足误差的候选一律视为误差 0，再比离原值的距离
+            i = int(np.lexsort((dist, np.where(err <= tolerance, 0.0, err)))[0])
+            cand = (0.0 if err[i] <= tolerance else err[i], dist[i], X[i].copy(), float(preds[i]))
+            if best is None or cand[:2] < best[:2]:
+                best = cand
+            if best[0] == 0.0:
+                break
+            step = (hi - lo) / (per_axis - 1)
+            center = best[2][idx].astype(np.float64)
+            lo = np.maximum(center - step, bounds[0])
+            hi = np.minimum(center + step, bounds[1])
+
+        shape_values = [float(v) for v in best[2]]
+        if save_path:
+            chara_data.Custom["body"]["shapeValueBody"] = shape_values
+            chara_data.save(save_path)
+        return shape_values, best[3]
+
     # ---------- 获取审美参数 ----------
     def get_aesthetic_parameters(self, chara_data: Union[AiSyoujyoCharaData, KoikatuCharaData]) -> Dict[str, float]:
         """
         获取角色的审美相关参数
         """
+        with PROFILER.stage("aesthetic"):
+            return self._get_aesthetic_parameters(chara_data)
+
+    def _get_aesthetic_parameters(self, chara_data: Union[AiSyoujyoCharaData, KoikatuCharaData]) -> Dict[str, float]:
         params = {}
         try:
             # 尝试从Parameter模块获取审美参数
@@ -110,7 +565,7 @@ class BodyDataAnalyzer:
                             if param_name in param.data:
                                 params[param_name] = float(param.data[param_name])
                         except:
-                            pass
+                            PROFILER.count("aesthetic_param_errors")
                 
                 # 策略2: 使用__getitem__访问
                 if hasattr(param, '__getitem__'):
@@ -120,7 +575,7 @@ class BodyDataAnalyzer:
                                 value = param[param_name]
                                 params[param_name] = float(value)
                             except:
-                                pass
+                                PROFILER.count("aesthetic_param_errors")
                 
                 # 策略3: 使用getattr访问属性
                 for param_name in self.AESTHETIC_CATEGORIES.keys():
@@ -129,7 +584,7 @@ class BodyDataAnalyzer:
                             value = getattr(param, param_name)
                             params[param_name] = float(value)
                         except:
-                            pass
+                            PROFILER.count("aesthetic_param_errors")
                 
                 # 策略4: 尝试访问Parameter的data属性中的其他可能路径
                 if hasattr(param, 'data'):
@@ -144,14 +599,16 @@ class BodyDataAnalyzer:
                                             try:
                                                 params[subkey] = float(param.data[key][subkey])
                                             except:
-                                                pass
+                                                PROFILER.count("aesthetic_param_errors")
                     except:
-                        pass
+                        PROFILER.count("aesthetic_param_errors")
         except Exception as e:
+            PROFILER.count("aesthetic_param_errors")
             print(f"获取审美参数时出错: {str(e)}")
         
         # 如果仍然没有获取到参数，尝试使用默认值（仅用于测试）
         if not params:
+            PROFILER.count("aesthetic_defaults_used")
             # 为了演示效果，我们可以为某些参数设置默认值
             params = {
                 'bustSize': 0.75,  # 适中
@@ -165,11 +622,11 @@ class BodyDataAnalyzer:
 
     # ---------- 基础身高分类 ----------
     def classify_by_height(self, height_cm: float) -> str:
-        if height_cm < self.HEIGHT_CATEGORIES['萝莉']['threshold']:
-            return '萝莉'
-        elif height_cm < self.HEIGHT_CATEGORIES['普妹']['threshold']:
-            return '普妹'
-        return '御姐'
+        # HEIGHT_CATEGORIES 按顺序给出各分类的上界，落在第一个上界之下的分类；都不满足时取最后一个
+        for name, cat in self.HEIGHT_CATEGORIES.items():
+            if height_cm < cat['threshold']:
+                return name
+        return name
     
     # ---------- 通用分类函数 ----------
     def classify_parameter(self, value: float, param_name: str) -> str:
@@ -199,6 +656,12 @@ class BodyDataAnalyzer:
         if height_cm is None:
             height_cm = self.extract_height(chara_data)
         
+        return self.classify_parameters(params, height_cm)
+
+    def classify_parameters(self, params: Dict[str, float], height_cm: float) -> Tuple[Dict[str, str], str]:
+        """
+        根据已提取的审美参数和身高生成分类和组合标签（不再访问卡片）
+        """
         # 进行各项分类
         classifications = {}
         
@@ -220,9 +683,168 @@ class BodyDataAnalyzer:
         combined_tag = '_'.join(tag_parts)
         return classifications, combined_tag
 
+    # ---------- 阈值表 / 重新分类 ----------
+    def set_thresholds(self, table) -> None:
+        """
+        换用新的阈值表（只影响本实例）；table 为 JSON 文件路径或字典：
+          HEIGHT_CATEGORIES     整张替换，按顺序为各分类的身高上界，threshold 为 null 表示无上界
+          AESTHETIC_CATEGORIES  按维度覆盖 low / high / small / mid / large，未给出的维度保持不变
+        """
+        if isinstance(table, str):
+            with open(table, 'r', encoding='utf-8') as f:
+                table = json.load(f)
+        unknown = set(table) - {'HEIGHT_CATEGORIES', 'AESTHETIC_CATEGORIES'}
+        if unknown:
+            raise ValueError(f"阈值表中有无法识别的键: {sorted(unknown)}")
+        if 'HEIGHT_CATEGORIES' in table:
+            height = {}
+            for name, cat in table['HEIGHT_CATEGORIES'].items():
+                threshold = cat.get('threshold')
+                height[name] = dict(cat, threshold=float('inf') if threshold is None else float(threshold))
+            thresholds = [cat['threshold'] for cat in height.values()]
+            if not height or thresholds != sorted(thresholds):
+                raise ValueError("HEIGHT_CATEGORIES 的 threshold 必须按顺序递增")
+            self.HEIGHT_CATEGORIES = height
+        if 'AESTHETIC_CATEGORIES' in table:
+            aesthetic = {dim: dict(cat) for dim, cat in self.AESTHETIC_CATEGORIES.items()}
+            for dim, cat in table['AESTHETIC_CATEGORIES'].items():
+                aesthetic.setdefault(dim, {}).update(cat)
+                missing = {'low', 'high', 'small', 'mid', 'large'} - set(aesthetic[dim])
+                if missing:
+                    raise ValueError(f"AESTHETIC_CATEGORIES.{dim} 缺少 {sorted(missing)}")
+                if aesthetic[dim]['low'] > aesthetic[dim]['high']:
+                    raise ValueError(f"AESTHETIC_CATEGORIES.{dim} 的 low 大于 high")
+            self.AESTHETIC_CATEGORIES = aesthetic
+
+    def height_category_index(self, heights: np.ndarray) -> np.ndarray:
+        """classify_by_height 的向量化版本，返回 HEIGHT_CATEGORIES 中的分类序号"""
+        thresholds = np.array([cat['threshold'] for cat in self.HEIGHT_CATEGORIES.values()], dtype=np.float64)
+        return np.minimum(np.searchsorted(thresholds, heights, side='right'), len(thresholds) - 1)
+
+    def classify_heights(self, heights: np.ndarray) -> np.ndarray:
+        """classify_by_height 的向量化版本，返回标签的 object 数组"""
+        return np.array(list(self.HEIGHT_CATEGORIES), dtype=object)[self.height_category_index(heights)]
+
+    def parameter_index(self, values: np.ndarray, param_name: str) -> np.ndarray:
+        """classify_parameter 的向量化版本：0/1/2 对应 small/mid/large，NaN（参数缺失）为 3"""
+        cat = self.AESTHETIC_CATEGORIES[param_name]
+        idx = np.where(values < cat['low'], 0, np.where(values <= cat['high'], 1, 2))
+        return np.where(np.isnan(values), 3, idx)
+
+    def reclassify_results(self, results: List[Dict]) -> Dict[str, int]:
+        """
+        按当前的 HEIGHT_CATEGORIES / AESTHETIC_CATEGORIES / TAG_ORDER 就地重算结果中的身高分类、
+        审美分类和 combined_tag（影子评分的候选分类一并重算）。只用结果里保存的 height_raw 和
+        parameters，不读卡也不调用模型；与重新分析得到的标签相同。
+        各维度整列向量化算出分类序号，合成每张卡的分类组合编码；不同的组合只有几百种，
+        每种组合的分类字典和标签只生成一次，再逐条写回。
+        没有保存原始数值的结果（旧版本的输出）跳过。返回 {'reclassified', 'changed', 'skipped'}
+        """
+        rows = [r for r in results if r.get('success') and 'height_raw' in r]
+        skipped = sum(1 for r in results if r.get('success')) - len(rows)
+        n = len(rows)
+        heights = np.fromiter((r['height_raw'] for r in rows), dtype=np.float64, count=n)
+        columns = [('bodyHeight', self.height_category_index(heights), list(self.HEIGHT_CATEGORIES))]
+        for dim, cat in self.AESTHETIC_CATEGORIES.items():
+            if dim == 'bodyHeight':
+                continue
+            values = np.fromiter((r['parameters'].get(dim, np.nan) for r in rows), dtype=np.float64, count=n)
+            columns.append((dim, self.parameter_index(values, dim), [cat['small'], cat['mid'], cat['large']]))
+
+        # 组合编码：按维度混合进制（每个维度的分类数 + 1，多出的一个表示参数缺失）
+        codes = np.zeros(n, dtype=np.int64)
+        for _, idx, labels in columns:
+            codes = codes * (len(labels) + 1) + idx
+        uniq, first, inverse = np.unique(codes, return_index=True, return_inverse=True)
+
+        combos = []
+        for i in first.tolist():
+            classifications = {dim: labels[idx[i]] for dim, idx, labels in columns
+                               if dim == 'bodyHeight' or idx[i] != 3}
+            tag = '_'.join(classifications[dim] for dim in self.TAG_ORDER if dim in classifications)
+            combos.append((classifications['bodyHeight'], classifications, tag))
+
+        changed = 0
+        for r, k in zip(rows, inverse.tolist()):
+            category, classifications, tag = combos[k]
+            if (category != r.get('height_category') or tag != r.get('combined_tag')
+                    or classifications != r.get('aesthetic_classifications')):
+                changed += 1
+            r['height_category'] = category
+            r['aesthetic_classifications'] = dict(classifications)
+            r['combined_tag'] = tag
+
+        shadowed = [(i, r['shadow']) for i, r in enumerate(rows) if 'delta_cm' in r.get('shadow', {})]
+        if shadowed:
+            idx = np.array([i for i, _ in shadowed])
+            deltas = np.array([sh['delta_cm'] for _, sh in shadowed], dtype=np.float64)
+            for (i, sh), category in zip(shadowed, self.classify_heights(heights[idx] + deltas).tolist()):
+                sh['height_category'] = category
+                sh['category_changed'] = category != rows[i]['height_category']
+        return {'reclassified': n, 'changed': changed, 'skipped': skipped}
+
+    # ---------- 角色名 ----------
+    def get_character_name(self, chara: Union[AiSyoujyoCharaData, KoikatuCharaData]) -> str:
+        # 改进的角色名获取逻辑，根据查看的代码，Parameter类有__getitem__方法
+        try:
+            # 尝试直接获取fullname属性
+            if hasattr(chara, 'Parameter'):
+                param = chara.Parameter
+                # 首先尝试使用字典方式访问（通过__getitem__）
+                try:
+                    name = param['fullname']
+                except (KeyError, TypeError):
+                    name = ''
+
+                # 如果没有fullname，尝试获取姓氏和名字
+                if not name:
+                    try:
+                        lastname = param.get('lastname', '') if hasattr(param, 'get') else param['lastname'] if 'lastname' in param else ''
+                        firstname = param.get('firstname', '') if hasattr(param, 'get') else param['firstname'] if 'firstname' in param else ''
+                        name = f"{lastname} {firstname}".strip()
+                    except:
+                        PROFILER.count("name_lookup_errors")
+                        name = ''
+
+                # 如果上述方法都失败，尝试直接访问属性
+                if not name and hasattr(param, 'data') and isinstance(param.data, dict):
+                    name = param.data.get('fullname', '')
+                    if not name:
+                        name = f"{param.data.get('lastname', '')} {param.data.get('firstname', '')}".strip()
+
+                # 最后的尝试
+                if not name:
+                    try:
+                        # 尝试将Parameter对象转换为字典
+                        if hasattr(param, '__dict__'):
+                            param_dict = dict(param.__dict__)
+                            if 'data' in param_dict and isinstance(param_dict['data'], dict):
+                                name = param_dict['data'].get('fullname', '')
+                                if not name:
+                                    name = f"{param_dict['data'].get('lastname', '')} {param_dict['data'].get('firstname', '')}".strip()
+                    except:
+                        PROFILER.count("name_lookup_errors")
+
+                return name or '未知'
+            else:
+                return '未知'
+        except Exception as e:
+            PROFILER.count("name_lookup_errors")
+            print(f"获取角色名时出错: {str(e)}")
+            return '未知'
+
     # ---------- 单卡分析 ----------
     def analyze_character_card(self, file_path: str) -> Dict:
-        result = {
+        return self._analyze(file_path, lambda: self._read_card(file_path))
+
+    def analyze_character_bytes(self, data: bytes, file_path: str = '<bytes>') -> Dict:
+        """
+        分析内存中的卡片字节，结果格式与 analyze_character_card 相同
+        """
+        return self._analyze(file_path, lambda: data)
+
+    def _new_result(self, file_path: str) -> Dict:
+        return {
             'file_path': file_path,
             'file_name': os.path.basename(file_path),
             'success': False,
@@ -230,77 +852,589 @@ class BodyDataAnalyzer:
             'height_category': None,
             'error': None
         }
+
+    def _analyze(self, file_path: str, read: Callable[[], bytes]) -> Dict:
+        result = self._new_result(file_path)
+        data = None
         try:
-            chara = self.load_character_card(file_path)
-            # 改进的角色名获取逻辑，根据查看的代码，Parameter类有__getitem__方法
-            try:
-                # 尝试直接获取fullname属性
-                if hasattr(chara, 'Parameter'):
-                    param = chara.Parameter
-                    # 首先尝试使用字典方式访问（通过__getitem__）
-                    try:
-                        name = param['fullname']
-                    except (KeyError, TypeError):
-                        name = ''
-                    
-                    # 如果没有fullname，尝试获取姓氏和名字
-                    if not name:
-                        try:
-                            lastname = param.get('lastname', '') if hasattr(param, 'get') else param['lastname'] if 'lastname' in param else ''
-                            firstname = param.get('firstname', '') if hasattr(param, 'get') else param['firstname'] if 'firstname' in param else ''
-                            name = f"{lastname} {firstname}".strip()
-                        except:
-                            name = ''
-                    
-                    # 如果上述方法都失败，尝试直接访问属性
-                    if not name and hasattr(param, 'data') and isinstance(param.data, dict):
-                        name = param.data.get('fullname', '')
-                        if not name:
-                            name = f"{param.data.get('lastname', '')} {param.data.get('firstname', '')}".strip()
-                    
-                    # 最后的尝试
-                    if not name:
-                        try:
-                            # 尝试将Parameter对象转换为字典
-                            if hasattr(param, '__dict__'):
-                                param_dict = dict(param.__dict__)
-                                if 'data' in param_dict and isinstance(param_dict['data'], dict):
-                                    name = param_dict['data'].get('fullname', '')
-                                    if not name:
-                                        name = f"{param_dict['data'].get('lastname', '')} {param_dict['data'].get('firstname', '')}".strip()
-                        except:
-                            pass
-                    
-                    result['character_name'] = name or '未知'
-                else:
-                    result['character_name'] = '未知'
-            except Exception as e:
-                print(f"获取角色名时出错: {str(e)}")
-                result['character_name'] = '未知'
+            data = read()
+            self._record_hash(result, data)
+            chara = self.load_character_bytes(data)
+            result['character_name'] = self.get_character_name(chara)
+            if self.feature_store is not None:
+                self._store_features(file_path, data, chara, self.card_format(chara), result.get('content_hash'))
 
             height_cm = self.extract_height(chara)
-            result['height_cm'] = round(height_cm, 1)
-            result['height_category'] = self.classify_by_height(height_cm)
-            
-            # 获取完整分类信息
-            classifications, combined_tag = self.get_complete_classification(chara, height_cm)
-            result['aesthetic_classifications'] = classifications
-            result['combined_tag'] = combined_tag
-            
-            result['success'] = True
+            self._apply_height(result, self.get_aesthetic_parameters(chara), height_cm)
+            if self.shadow is not None:
+                shadow_cm = self.extract_heights([chara.Custom["body"]["shapeValueBody"]], [self.card_format(chara)],
+                                                 registry=self.shadow)[0]
+                self._apply_shadow(result, height_cm, shadow_cm)
         except Exception as e:
-            result['error'] = f"{type(e).__name__}: {str(e)}"
+            self._record_failure(result, e, data)
         return result
 
     # ---------- 批量 ----------
-    def batch_analyze(self, directory_path: str) -> List[Dict]:
+    def batch_analyze(self, directory_path: str, shadow=None) -> List[Dict]:
+        """
+        shadow 不为空时本次调用用它做影子评分（同 set_shadow_models），每个结果附带候选模型的影子评分；
+        调用结束后恢复原来的 self.shadow
+        """
+        if shadow is None:
+            return list(self.iter_batch_analyze(directory_path))
+        previous = self.shadow
+        self.set_shadow_models(shadow)
+        try:
+            return list(self.iter_batch_analyze(directory_path))
+        finally:
+            self.shadow = previous
+
+    def iter_batch_analyze(self, directory_path: str, pipeline: bool = False, threads: int = 0,
+                           processes: int = 0, schedule: bool = False, **kwargs) -> Iterator[Dict]:
+        """
+        逐个产出 batch_analyze（pipeline=True 时为 batch_analyze_pipelined，threads > 0 时为
+        threads 个线程的 iter_analyze_threaded，processes > 0 时为 processes 个进程的
+        iter_analyze_forked，再加 schedule=True 时为按文件大小调度、按完成顺序产出的
+        iter_analyze_scheduled）的结果，不在内存中保留列表
+        """
+        if not os.path.exists(directory_path):
+            print(f"目录不存在: {directory_path}")
+            return
+        if processes and schedule:
+            yield from self.iter_analyze_scheduled(scan_card_sizes(directory_path), workers=processes, **kwargs)
+            return
+        paths = [os.path.join(directory_path, fname) for fname in os.listdir(directory_path)
+                 if fname.lower().endswith('.png')]
+        if processes:
+            yield from self.iter_analyze_forked(paths, workers=processes, **kwargs)
+        elif threads:
+            yield from self.iter_analyze_threaded(paths, workers=threads, **kwargs)
+        elif pipeline:
+            yield from self.iter_analyze_pipelined(paths, **kwargs)
+        else:
+            for path in paths:
+                yield self.analyze_character_card(path)
+
+    def batch_analyze_stats(self, directory_path: str, stats: LibraryStats = None,
+                            pipeline: bool = False, **kwargs) -> LibraryStats:
+        """
+        与 batch_analyze 遍历相同，但结果只流经 LibraryStats 聚合、不保留结果列表；
+        传入已有的 stats 时在其基础上继续累计
+        """
+        stats = stats if stats is not None else LibraryStats()
+        for result in self.iter_batch_analyze(directory_path, pipeline=pipeline, **kwargs):
+            stats.add(result)
+        return stats
+
+    def list_card_paths(self, directory_path: str, shard: Tuple[int, int] = None) -> List[str]:
+        """
+        目录下的卡片路径，按路径排序；shard=(i, N) 时只返回按相对路径稳定哈希分到第 i 片的卡片
+        """
+        paths = sorted(os.path.join(directory_path, fname) for fname in os.listdir(directory_path)
+                       if fname.lower().endswith('.png'))
+        if shard is not None:
+            index, total = shard
+            paths = [p for p in paths if shard_of(shard_key(directory_path, p), total) == index]
+        return paths
+
+    # ---------- 流水线批量 ----------
+    def batch_analyze_pipelined(self, directory_path: str, **kwargs) -> List[Dict]:
+        """
+        与 batch_analyze 结果相同，但磁盘读取、解析、预测三个阶段并行重叠，参数见 iter_analyze_pipelined
+        """
+        return list(self.iter_batch_analyze(directory_path, pipeline=True, **kwargs))
+
+    def iter_analyze_pipelined(self, paths: Iterable[str], read_workers: int = 4, prefetch: int = 16,
+                               queue_size: int = 16, batch_size: int = 64,
+                               reader: Callable[[str], bytes] = read_card_file,
+                               memory_budget: int = None, explain_top_k: int = 0) -> Iterator[Dict]:
+        """
+        三段流水线，按输入顺序逐个产出结果：
+          读取：read_workers 个线程预取原始字节，最多 prefetch 个在途
+          解析：单线程 load(bytes) + 角色名 + 审美参数，结果放入长度 queue_size 的队列
+          预测：当前线程凑满 batch_size 张后一次 predict
+        解析时不保留缩略图和未知块，提取完所需字段后卡片对象立即释放。
+        memory_budget（字节）限制从读取到解析完成之间在途卡片的文件总大小；
+        运行统计（在途字节峰值、按批采样的 RSS 峰值）写入 self.last_run_stats；
+        explain_top_k > 0 时为每个结果附加贡献最大的 shapeValueBody 下标，完整贡献收集到
+        self.last_contributions，可用 save_contributions 写出
+        """
+        read_q = queue.Queue(maxsize=prefetch)
+        parse_q = queue.Queue(maxsize=queue_size)
+        stop = threading.Event()
+        budget = ByteBudget(memory_budget)
+        stats = {'cards': 0, 'memory_budget': memory_budget, 'peak_inflight_bytes': 0,
+                 'peak_rss_mb': current_rss_mb()}
+        self.last_run_stats = stats
+        self.last_contributions = []
+        # 读取/解析线程中的异常（如 paths 生成器本身出错）：各阶段照常发出结束标记，由当前线程重新抛出
+        errors = []
+
+        def read_stage():
+            try:
+                with ThreadPoolExecutor(max_workers=read_workers) as pool:
+                    for path in paths:
+                        try:
+                            size = os.path.getsize(path)
+                        except OSError:
+                            size = 0
+                        if not budget.acquire(size, stop):
+                            break
+                        if not _put(read_q, (path, size, pool.submit(self._read_card, path, reader)), stop):
+                            break
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                _put(read_q, _END, stop)
+
+        def parse_stage():
+            try:
+                while True:
+                    item = _get(read_q, stop)
+                    if item is _END:
+                        break
+                    path, size, future = item
+                    item = self._parse_card(path, future)
+                    # 原始字节在这里就释放，之后只保留 shapeValue 和审美参数
+                    future = None
+                    budget.release(size)
+                    if not _put(parse_q, item, stop):
+                        break
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                _put(parse_q, _END, stop)
+
+        stages = [threading.Thread(target=read_stage, daemon=True),
+                  threading.Thread(target=parse_stage, daemon=True)]
+        for t in stages:
+            t.start()
+        try:
+            batch = []
+            while True:
+                item = parse_q.get()
+                if item is _END:
+                    break
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    self._sample_run_stats(stats, budget, len(batch))
+                    yield from self._finish_batch(batch, explain_top_k)
+                    batch = []
+            self._sample_run_stats(stats, budget, len(batch))
+            yield from self._finish_batch(batch, explain_top_k)
+            if errors:
+                raise errors[0]
+        finally:
+            stop.set()
+            for t in stages:
+                t.join()
+
+    # ---------- 线程池批量 ----------
+    def batch_analyze_threaded(self, directory_path: str, workers: int = 4, **kwargs) -> List[Dict]:
+        """与 batch_analyze 结果相同，参数见 iter_analyze_threaded"""
+        return list(self.iter_batch_analyze(directory_path, threads=workers, **kwargs))
+
+    def iter_analyze_threaded(self, paths: Iterable[str], workers: int = 4, batch_size: int = 64,
+                              prefetch: int = None, nthread: int = None,
+                              reader: Callable[[str], bytes] = read_card_file,
+                              explain_top_k: int = 0) -> Iterator[Dict]:
+        """
+        线程池模式，按输入顺序逐个产出结果：workers 个线程各自读取并解析卡片，
+        当前线程收集解析结果，凑满 batch_size 张后一次 predict（XGBoost 预测期间释放 GIL，
+        解析线程继续工作）。整个进程只有一份模型，内存与单进程相同。
+        最多 prefetch（默认 workers * 4）张卡同时在途；nthread 不为空时先 set_predict_threads(nthread)，
+        一般取 CPU 核数减去解析实际占用的核数，避免预测线程与解析线程争抢 CPU。
+        explain_top_k 的含义同 iter_analyze_pipelined
+        """
+        if nthread:
+            self.set_predict_threads(nthread)
+        prefetch = prefetch or workers * 4
+        self.last_contributions = []
+        todo = iter(paths)
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            def fill():
+                while len(in_flight) < prefetch:
+                    path = next(todo, None)
+                    if path is None:
+                        return
+                    in_flight.append(pool.submit(self._read_and_parse, path, reader))
+
+            try:
+                fill()
+                batch = []
+                while in_flight:
+                    batch.append(in_flight.popleft().result())
+                    fill()
+                    if len(batch) >= batch_size:
+                        yield from self._finish_batch(batch, explain_top_k)
+                        batch = []
+                yield from self._finish_batch(batch, explain_top_k)
+            finally:
+                # 提前关闭生成器时不再启动排队中的卡片
+                for future in in_flight:
+                    future.cancel()
+
+    # ---------- 多进程批量（fork 共享模型） ----------
+    def forked_pool(self, workers: int = None) -> ProcessPoolExecutor:
+        """
+        在当前进程已加载好模型和阈值表之后 fork 出 workers 个（默认 CPU 核数）工作进程并返回进程池。
+        子进程直接继承父进程的模型（XGBoost 的树在 C++ 堆上，只读不写），写时复制下各进程共用同一份物理内存，
+        不必每个进程各自 joblib.load；fork 之前 gc.freeze()，避免子进程里的垃圾回收改写继承对象的头部
+        把共享页面逐页复制出来。每个子进程的 predict 固定为单线程。
+        fork 之后父进程再热替换模型不影响已有的进程池；不支持 fork 的平台抛 ValueError
+        """
+        global _FORK_ANALYZER
+        ctx = multiprocessing.get_context("fork")
+        workers = workers or os.cpu_count() or 1
+        _FORK_ANALYZER = self
+        gc.collect()
+        gc.freeze()
+        try:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_fork_worker_init)
+            # fork 方式下第一次提交任务时一次性启动全部进程
+            pool.submit(os.getpid).result()
+        finally:
+            gc.unfreeze()
+            _FORK_ANALYZER = None
+        return pool
+
+    def iter_analyze_forked(self, paths: Iterable[str], workers: int = None, batch_size: int = 64,
+                            pool: ProcessPoolExecutor = None, prefetch: int = None) -> Iterator[Dict]:
+        """
+        多进程模式，按输入顺序逐个产出结果：每 batch_size 张卡为一个任务，子进程读取、解析并批量 predict。
+        paths 按需拉取，最多 prefetch（默认进程数 * 2）个任务同时在途，每取走一个任务的结果再提交下一个，
+        调用方消费得慢时结果不会在父进程里越积越多。
+        pool 为 forked_pool() 返回的进程池时复用它（多次调用只 fork 一次），否则临时创建、用完关闭。
+        子进程不写特征库（各进程各自追加会弄乱行号），开启特征库时请用 iter_analyze_threaded
+        """
+        if self.feature_store is not None:
+            raise ValueError("多进程模式不支持特征库，请改用线程池模式")
+        own_pool = pool is None
+        if own_pool:
+            pool = self.forked_pool(workers)
+        prefetch = prefetch or pool._max_workers * 2
+        todo = iter(paths)
+        futures = deque()
+
+        def fill():
+            while len(futures) < prefetch:
+                chunk = list(islice(todo, batch_size))
+                if not chunk:
+                    return
+                futures.append(pool.submit(_fork_analyze_chunk, chunk))
+
+        try:
+            fill()
+            while futures:
+                results = self._merge_chunk(futures.popleft().result())
+                fill()
+                yield from results
+        finally:
+            for future in futures:
+                future.cancel()
+            if own_pool:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+    def _merge_chunk(self, chunk: Tuple[List[Dict], Dict, List[Dict]]) -> List[Dict]:
+        """
+        子进程任务返回 (结果, 计时快照, 隔离名单记录)：计时并入父进程的 PROFILER，--profile 才能看到各阶段耗时；
+        隔离名单只由父进程写入
+        """
+        results, profile, quarantined = chunk
+        if profile is not None:
+            PROFILER.merge(profile)
+        if quarantined:
+            self.quarantine.apply(quarantined)
+        return results
+
+    def iter_analyze_scheduled(self, entries: Iterable[Tuple[str, int]], workers: int = None,
+                               batch_size: int = 64, batch_bytes: int = None,
+                               pool: ProcessPoolExecutor = None) -> Iterator[Dict]:
+        """
+        按文件大小调度的多进程模式：entries 为 (路径, 字节数)（见 scheduler.scan_card_sizes），
+        按 plan_batches 从大到小装箱（batch_bytes 为空时按总大小和进程数自动选）后依次放入进程池，
+        空闲的进程取走下一个任务。
+        结果按完成顺序产出，不是输入顺序；需要按路径排序的场合（分片、断点续跑）不要用这个模式。
+        pool 的用法同 iter_analyze_forked；配合 CARD_DEADLINE 可避免个别卡片解码卡住整批
+        """
+        if self.feature_store is not None:
+            raise ValueError("多进程模式不支持特征库，请改用线程池模式")
+        own_pool = pool is None
+        if own_pool:
+            pool = self.forked_pool(workers)
+        batches = plan_batches(list(entries), batch_size, batch_bytes, workers=pool._max_workers)
+        futures = [pool.submit(_fork_analyze_chunk, batch) for batch in batches]
+        try:
+            for future in as_completed(futures):
+                yield from self._merge_chunk(future.result())
+        finally:
+            for future in futures:
+                future.cancel()
+            if own_pool:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+    def _read_and_parse(self, path: str, reader: Callable[[str], bytes] = read_card_file
+                        ) -> Tuple[Dict, List[float], Dict[str, float], Tuple[str, str]]:
+        try:
+            data = self._read_card(path, reader)
+        except Exception as e:
+            return self._record_failure(self._new_result(path), e), None, None, None
+        return self._parse_card(path, data)
+
+    @staticmethod
+    def _sample_run_stats(stats: Dict, budget: ByteBudget, n: int) -> None:
+        stats['cards'] += n
+        stats['peak_inflight_bytes'] = budget.peak
+        rss = current_rss_mb()
+        if rss is not None:
+            stats['peak_rss_mb'] = max(stats['peak_rss_mb'] or 0.0, rss)
+
+    def _parse_card(self, path: str, data) -> Tuple[Dict, List[float], Dict[str, float], Tuple[str, str]]:
+        """
+        解析阶段：加载卡片并提取角色名、shapeValueBody、审美参数和 (格式, 版本)，卡片对象不外传；
+        data 可以是 bytes 或读取任务的 Future
+        """
+        result = self._new_result(path)
+        try:
+            if not isinstance(data, (bytes, bytearray)):
+                data = data.result()
+            self._record_hash(result, data)
+            with PROFILER.stage("parse"):
+                chara = self.load_character_bytes(data, keep_image=False, keep_unknown=False)
+                result['character_name'] = self.get_character_name(chara)
+                sv = chara.Custom["body"]["shapeValueBody"]
+                params = self.get_aesthetic_parameters(chara)
+                card_format = self.card_format(chara)
+            if self.feature_store is not None:
+                self._store_features(path, data, chara, card_format, result.get('content_hash'))
+            return result, sv, params, card_format
+        except Exception as e:
+            return self._record_failure(result, e, data), None, None, None
+
+    def _record_hash(self, result: Dict, data: bytes) -> None:
+        if self.RECORD_HASH:
+            with PROFILER.stage("hash"):
+                result['content_hash'] = content_hash(data)
+
+    def _store_features(self, path: str, data: bytes, chara, card_format: Tuple[str, str],
+                        hash_: str = None) -> None:
+        """
+        把 shapeValueBody / shapeValueFace 追加到特征库；路径和内容哈希都没变的卡跳过。
+        hash_ 为空时由 data 计算（data 也为空时从文件重新计算）；写入失败只计数，不影响分析结果
+        """
+        try:
+            if hash_ is None:
+                hash_ = content_hash(data) if data is not None else file_sha256(path)
+            if self.feature_store.has(path, hash_):
+                return
+            custom = chara.Custom.data
+            self.feature_store.append(path, hash_, card_format[0],
+                                      custom.get("body", {}).get("shapeValueBody", []),
+                                      custom.get("face", {}).get("shapeValueFace", []))
+        except Exception as e:
+            PROFILER.count("feature_store_errors")
+            print(f"写入特征库失败 {path}: {type(e).__name__}: {e}")
+
+    def _finish_batch(self, batch: List[Tuple[Dict, List[float], Dict[str, float], Tuple[str, str]]],
+                      explain_top_k: int = 0) -> List[Dict]:
+        pending = [item for item in batch if item[1] is not None]
+        shape_values = [item[1] for item in pending]
+        formats = [item[3] for item in pending]
+        if explain_top_k:
+            heights, contribs = self.explain_heights(shape_values, formats=formats)
+        else:
+            heights, contribs = self.extract_heights(shape_values, formats), [None] * len(pending)
+        # 影子评分只多一次 predict：同一批 shapeValue 矩阵交给候选模型
+        shadow = self.extract_heights(shape_values, formats, registry=self.shadow) if self.shadow is not None else None
+
+        by_width = {}
+        for n, ((result, _, params, _), height_cm, contrib) in enumerate(zip(pending, heights, contribs)):
+            self._apply_height(result, params, height_cm)
+            if shadow is not None:
+                self._apply_shadow(result, height_cm, shadow[n])
+            if result['success'] and contrib is not None:
+                result['top_contributions'] = self.top_contributions(contrib, explain_top_k)
+                paths, rows = by_width.setdefault(len(contrib), ([], []))
+                paths.append(result['file_path'])
+                rows.append(contrib)
+        for paths, rows in by_width.values():
+            # 按批次存成二维数组，不为每张卡单独保留一个小数组；不同格式的特征数不同，分开存
+            self.last_contributions.append((paths, np.vstack(rows)))
+        return [item[0] for item in batch]
+
+    def _apply_height(self, result: Dict, params: Dict[str, float], height_cm: Union[float, Exception]) -> Dict:
+        if isinstance(height_cm, Exception):
+            PROFILER.count("analyze_errors")
+            result['error'] = f"{type(height_cm).__name__}: {str(height_cm)}"
+            return result
+        result['height_cm'] = round(height_cm, 1)
+        result['height_category'] = self.classify_by_height(height_cm)
+        classifications, combined_tag = self.classify_parameters(params, height_cm)
+        result['aesthetic_classifications'] = classifications
+        result['combined_tag'] = combined_tag
+        # 保存未取整的身高和提取到的参数，阈值调整后用 reclassify_results 重新分类，不必重新分析
+        result['height_raw'] = float(height_cm)
+        result['parameters'] = params
+        result['success'] = True
+        return result
+
+    def _apply_shadow(self, result: Dict, height_cm: float, shadow_cm: Union[float, Exception]) -> Dict:
+        """正式预测成功的卡附加候选模型的结果；delta_cm 为 候选 - 正式（未取整的身高相减）"""
+        if not result['success']:
+            return result
+        if isinstance(shadow_cm, Exception):
+            result['shadow'] = {'error': f"{type(shadow_cm).__name__}: {str(shadow_cm)}"}
+            return result
+        category = self.classify_by_height(shadow_cm)
+        result['shadow'] = {
+            'height_cm': round(shadow_cm, 1),
+            'delta_cm': round(shadow_cm - height_cm, 3),
+            'height_category': category,
+            'category_changed': category != result['height_category'],
+        }
+        return result
+
+    # ---------- 断点续跑 ----------
+    def batch_analyze_resumable(self, directory_path: str, journal_path: str, restart: bool = False,
+                                pipeline: bool = False, **kwargs) -> List[Dict]:
+        """
+        与 batch_analyze 结果相同（按路径排序），但每张卡的结果先追加到运行日志 journal_path；
+        中途退出后用同一日志重跑，已记录的卡片直接跳过，只分析剩余部分。
+        只记录成功的结果和由卡片内容决定的失败（结构校验未通过 / 已隔离）；读取出错、解码超时等
+        可能是一时的失败不写入日志，重跑时重新分析（旧日志中已有的这类记录同样不算完成）。
+        日志由其他模型、其他目录、其他阈值表或其他影子模型生成时抛 JournalMismatch，restart=True 丢弃旧日志；
+        pipeline=True 时剩余卡片走 iter_analyze_pipelined，kwargs 透传。
+        日志不保存贡献矩阵，从日志恢复的卡片无法写进 save_contributions，因此不接受 explain_top_k
+        """
+        if kwargs.get('explain_top_k'):
+            raise ValueError("断点续跑不支持 explain_top_k：从运行日志恢复的卡片没有贡献矩阵")
         if not os.path.exists(directory_path):
             print(f"目录不存在: {directory_path}")
             return []
-        results = []
-        for fname in os.listdir(directory_path):
-            if fname.lower().endswith('.png'):
-                results.append(self.analyze_character_card(os.path.join(directory_path, fname)))
+        paths = self.list_card_paths(directory_path)
+        with RunJournal(journal_path, self.model_fingerprint, directory_path, restart=restart,
+                        thresholds_fingerprint=self.thresholds_fingerprint,
+                        shadow_fingerprint=self.shadow_fingerprint) as journal:
+            if journal.dropped_bytes:
+                print(f"运行日志末尾有 {journal.dropped_bytes} 字节未写完整的记录，已截断")
+            done = {p: r for p, r in journal.done.items() if _is_final_result(r)}
+            todo = [p for p in paths if p not in done]
+            if len(todo) < len(paths):
+                print(f"从运行日志恢复 {len(paths) - len(todo)} 张，剩余 {len(todo)} 张")
+            if pipeline:
+                results = self.iter_analyze_pipelined(todo, **kwargs)
+            else:
+                results = (self.analyze_character_card(p) for p in todo)
+            for r in results:
+                if _is_final_result(r):
+                    journal.append(r)
+                done[r['file_path']] = r
+        return [done[p] for p in paths]
+
+    # ---------- 字节流 / 压缩包 ----------
+    def iter_analyze_bytes(self, items: Iterable[Tuple[str, bytes]], batch_size: int = 64,
+                           explain_top_k: int = 0) -> Iterator[Dict]:
+        """
+        分析 (标识路径, 卡片字节) 序列，按批次 predict；items 按需拉取，任意时刻只缓存一个批次。
+        字节的位置也可以是异常（如字节流中切不出卡片的一段），记为该项的错误结果。
+        explain_top_k 的含义同 iter_analyze_pipelined
+        """
+        self.last_contributions = []
+        batch = []
+        for path, data in items:
+            if isinstance(data, Exception):
+                batch.append((self._record_failure(self._new_result(path), data), None, None, None))
+            else:
+                batch.append(self._parse_card(path, data))
+            if len(batch) >= batch_size:
+                yield from self._finish_batch(batch, explain_top_k)
+                batch = []
+        yield from self._finish_batch(batch, explain_top_k)
+
+    def iter_analyze_stream(self, stream, name: str = '<stdin>', **kwargs) -> Iterator[Dict]:
+        """
+        分析连续拼接的卡片字节流（stdin、管道），file_path 记为 name#序号；
+        切不出卡片的坏数据记为一条错误结果，从下一个 PNG 签名处继续，不影响前后的卡片
+        """
+        items = ((f"{name}#{i}", data) for i, data in enumerate(iter_stream_cards(stream, resync=True)))
+        return self.iter_analyze_bytes(items, **kwargs)
+
+    def iter_analyze_archive(self, archive_path: str, **kwargs) -> Iterator[Dict]:
+        """直接分析 zip/tar 中的卡片，不解压到磁盘，file_path 记为 压缩包::成员名"""
+        items = ((archive_member_path(archive_path, member), data)
+                 for member, data in iter_archive_cards(archive_path))
+        return self.iter_analyze_bytes(items, **kwargs)
+
+    # ---------- asyncio ----------
+    def _async_context(self) -> Tuple[AsyncPredictBatcher, asyncio.Semaphore]:
+        # 批处理器和并发信号量都绑定在事件循环上，换了循环（例如再次 asyncio.run）就重建
+        loop = asyncio.get_running_loop()
+        if self._async_batcher is None or self._async_batcher.loop is not loop:
+            self._async_batcher = AsyncPredictBatcher(self._predict_with_shadow, max_batch=self.ASYNC_BATCH_SIZE,
+                                                      max_delay=self.ASYNC_BATCH_DELAY)
+            self._async_limit = asyncio.Semaphore(self.ASYNC_CONCURRENCY)
+        return self._async_batcher, self._async_limit
+
+    async def analyze_character_card_async(self, file_path: str, executor=None) -> Dict:
+        """
+        analyze_character_card 的协程版本，结果与同步接口相同：
+        读文件和解析放到 executor（默认为事件循环的线程池），不阻塞事件循环；
+        同一循环里并发调用的预测会合并成批次 predict。
+        同时读取/解析的卡片数受 ASYNC_CONCURRENCY 限制；任务被取消时已提交到线程池的
+        读取或解析仍会跑完，但结果直接丢弃
+        """
+        batcher, limit = self._async_context()
+        loop = batcher.loop
+        async with limit:
+            try:
+                data = await loop.run_in_executor(executor, self._read_card, file_path)
+            except Exception as e:
+                return self._record_failure(self._new_result(file_path), e)
+            result, sv, params, card_format = await loop.run_in_executor(executor, self._parse_card, file_path, data)
+            data = None
+        if sv is None:
+            return result
+        height_cm, shadow_cm = await batcher.predict(sv, card_format)
+        self._apply_height(result, params, height_cm)
+        if shadow_cm is not None:
+            self._apply_shadow(result, height_cm, shadow_cm)
+        return result
+
+    def _predict_with_shadow(self, shape_values: List[List[float]],
+                             formats: List[Tuple[str, str]]) -> List[Tuple[Union[float, Exception], Union[float, Exception, None]]]:
+        """asyncio 批处理用：每张卡返回 (正式身高, 候选身高)，未开启影子评分时候选为 None"""
+        heights = self.extract_heights(shape_values, formats)
+        if self.shadow is None:
+            return [(h, None) for h in heights]
+        return list(zip(heights, self.extract_heights(shape_values, formats, registry=self.shadow)))
+
+    async def batch_analyze_async(self, directory_path: str, concurrency: int = None, executor=None) -> List[Dict]:
+        """
+        batch_analyze 的协程版本，按 os.listdir 顺序返回结果；
+        最多 concurrency 张卡同时在途（默认 ASYNC_CONCURRENCY），取消时未完成的卡片一并取消
+        """
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(executor, os.path.exists, directory_path):
+            print(f"目录不存在: {directory_path}")
+            return []
+        names = await loop.run_in_executor(executor, os.listdir, directory_path)
+        paths = [os.path.join(directory_path, fname) for fname in names if fname.lower().endswith('.png')]
+
+        results = [None] * len(paths)
+        todo = iter(enumerate(paths))
+
+        async def worker():
+            for i, path in todo:
+                results[i] = await self.analyze_character_card_async(path, executor=executor)
+
+        workers = [asyncio.ensure_future(worker())
+                   for _ in range(min(concurrency or self.ASYNC_CONCURRENCY, len(paths)))]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for w in workers:
+                w.cancel()
         return results
 
     # ---------- 保存 ----------
@@ -310,26 +1444,388 @@ class BodyDataAnalyzer:
             json.dump(results, f, ensure_ascii=False, indent=2)
 
 
+# 由 forked_pool 在 fork 之前设置，子进程里就是继承来的分析器
+_FORK_ANALYZER = None
+
+
+def _fork_worker_init() -> None:
+    analyzer = _FORK_ANALYZER
+    # fork 时父进程里的锁可能正被其它线程持有，子进程换一把新的
+    analyzer._predict_lock = threading.Lock()
+    analyzer.set_predict_threads(1)
+    # fork 时继承了父进程已有的计时，清掉，之后每个任务只交回自己的部分
+    PROFILER.reset()
+    if analyzer.quarantine is not None:
+        analyzer.quarantine.defer()
+
+
+def _fork_analyze_chunk(paths: List[str]) -> Tuple[List[Dict], Dict, List[Dict]]:
+    """
+    返回 (结果, 本任务的 PROFILER 快照, 本任务的隔离名单记录)，由父进程合并：
+    快照交出后子进程清零，未开启计时时为 None；没有隔离名单时记录为空列表
+    """
+    analyzer = _FORK_ANALYZER
+    results = analyzer._finish_batch([analyzer._read_and_parse(p) for p in paths])
+    quarantined = analyzer.quarantine.take_pending() if analyzer.quarantine is not None else []
+    if not PROFILER.enabled:
+        return results, None, quarantined
+    profile = PROFILER.snapshot()
+    PROFILER.reset()
+    return results, profile, quarantined
+
+
 # ------------------------------------------------------------------
 #  3. 命令行入口
 # ------------------------------------------------------------------
-if __name__ == "__main__":
+def install_reload_handler(analyzer: BodyDataAnalyzer, config: str) -> threading.Event:
+    """
+    收到 SIGHUP 时按配置重新加载全部模型；在途的批次用旧模型跑完，加载失败则继续用旧模型。
+    信号处理函数只置位返回的 Event，joblib.load 在后台线程里做，主线程的分析不会停下来等加载；
+    加载期间再收到的 SIGHUP 合并为加载完成后的一次
+    """
+    import signal
+    requested = threading.Event()
+    if not hasattr(signal, "SIGHUP"):
+        return requested
+
+    def reloader():
+        while True:
+            requested.wait()
+            requested.clear()
+            try:
+                analyzer.registry.reload(config)
+            except Exception as e:
+                print(f"模型重新加载失败，继续使用原模型: {type(e).__name__}: {e}")
+                continue
+            print(f"模型已重新加载（第 {analyzer.registry.generation} 版）: {config}")
+
+    threading.Thread(target=reloader, name="model-reload", daemon=True).start()
+    signal.signal(signal.SIGHUP, lambda signum, frame: requested.set())
+    return requested
+
+
+def reclassify_file(results_path: str, output_path: str, thresholds: str = None) -> Dict[str, int]:
+    """命令行 --reclassify：读取结果 JSON，按新阈值重算标签后写回（先写临时文件再替换）"""
     import sys
-    if len(sys.argv) < 2:
-        print("用法: python BodyDataAnalyzer.py <角色卡目录路径>")
+    import time
+    analyzer = BodyDataAnalyzer(models={})  # 只重算标签，不加载模型
+    try:
+        if thresholds:
+            analyzer.set_thresholds(thresholds)
+        with open(results_path, 'r', encoding='utf-8') as f:
+            results = json.load(f)
+    except (ValueError, OSError) as e:
+        print(f"重新分类失败: {e}")
         sys.exit(1)
+    start = time.perf_counter()
+    summary = analyzer.reclassify_results(results)
+    elapsed = time.perf_counter() - start
+    tmp_path = output_path + '.tmp'
+    analyzer.save_analysis_results(results, tmp_path)
+    os.replace(tmp_path, output_path)
+    print(f"重新分类 {summary['reclassified']} 张，标签变化 {summary['changed']} 张（{elapsed:.2f} 秒），"
+          f"结果已保存至: {output_path}")
+    if summary['skipped']:
+        print(f"{summary['skipped']} 张结果没有保存原始身高和参数（旧版本输出），未重新分类，需要重新分析")
+    return summary
 
-    input_dir = sys.argv[1]
-    analyzer = BodyDataAnalyzer()          # 默认加载 height_xgb.pkl
-    results = analyzer.batch_analyze(input_dir)
 
-    # 打印结果
-    for r in results:
+def main(argv=None):
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(description="AI-Syoujyo 角色卡身体数据分析")
+    parser.add_argument("input_dir", nargs="?", help="角色卡目录路径")
+    parser.add_argument("--stdin", action="store_true", help="从标准输入读取首尾相接的卡片字节流")
+    parser.add_argument("--archive", default=None, help="直接分析 zip/tar 压缩包中的卡片，不解压")
+    parser.add_argument("--output", default=None,
+                        help="结果 JSON 路径，默认写到目录（或压缩包所在目录、当前目录）下的 analysis_results.json")
+    parser.add_argument("--profile", action="store_true", help="统计各阶段耗时/读取字节数/异常次数并打印汇总表")
+    parser.add_argument("--profile-out", default=None, help="同时把统计写成 Prometheus 文本格式文件")
+    parser.add_argument("--pipeline", action="store_true", help="读取/解析/预测流水线并行（适合网络盘、冷 HDD）")
+    parser.add_argument("--read-workers", type=int, default=4, help="流水线预取读取线程数")
+    parser.add_argument("--prefetch", type=int, default=16, help="流水线最多在途读取数")
+    parser.add_argument("--queue-size", type=int, default=16, help="解析→预测队列长度")
+    parser.add_argument("--batch-size", type=int, default=64, help="每次 predict 的卡片数")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="线程池模式：N 个线程读取并解析，进程内共用一份模型，批量 predict")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="多进程模式：加载模型后 fork 出 N 个工作进程，写时复制共用一份模型")
+    parser.add_argument("--schedule", action="store_true",
+                        help="与 --processes 一起使用：按文件大小从大到小调度，结果按完成顺序输出（不能与 --shard/--journal 同用）")
+    parser.add_argument("--batch-mb", type=float, default=None,
+                        help="--schedule 时每个任务的卡片总大小上限（MB），默认按总大小和进程数自动选")
+    parser.add_argument("--deadline", type=float, default=None, metavar="SEC",
+                        help="单张卡解码时限（秒，CPU 时间），超时记为 timeout 错误结果，不拖住整批")
+    parser.add_argument("--predict-threads", type=int, default=None,
+                        help="每次 predict 使用的 XGBoost 线程数（默认由 XGBoost 决定）")
+    parser.add_argument("--memory-budget", type=float, default=None,
+                        help="在途卡片字节上限（MB），启用后自动使用流水线模式（不能与 --threads/--processes/--stdin/--archive 同用）")
+    parser.add_argument("--shard", default=None,
+                        help="只分析第 i/N 片（按相对路径稳定哈希划分），结果写成 JSONL + manifest")
+    parser.add_argument("--merge", nargs="+", default=None, metavar="MANIFEST",
+                        help="校验并合并各分片的 *.manifest.json，写成一个结果 JSON")
+    parser.add_argument("--diff", nargs=2, default=None, metavar=("OLD", "NEW"),
+                        help="比较两次分析结果（JSON 数组或 JSONL），把新增/删除/内容变化/分类变化的卡片写成 JSONL，"
+                             "默认写到 NEW 同目录下的 changes.jsonl")
+    parser.add_argument("--hash", action="store_true",
+                        help="结果中附带卡片内容哈希 content_hash，--diff 据此区分内容变化和仅重新评分")
+    parser.add_argument("--journal", default=None,
+                        help="运行日志路径：逐张追加结果并定期 fsync，中断后用同一命令重跑会跳过已完成的卡片")
+    parser.add_argument("--journal-restart", action="store_true", help="丢弃已有的运行日志，从头开始")
+    parser.add_argument("--explain", type=int, default=0, metavar="K",
+                        help="解释模式：为每张卡附加贡献最大的 K 个 shapeValueBody 下标（pred_contribs），启用后使用流水线模式")
+    parser.add_argument("--explain-approx", action="store_true",
+                        help="解释模式使用近似贡献（Saabas），比精确 TreeSHAP 快一个数量级以上，适合十万张以上的卡片库")
+    parser.add_argument("--contribs-out", default=None,
+                        help="解释模式下完整贡献矩阵的列式输出（.npz），默认与结果文件同名")
+    parser.add_argument("--stats", default=None, metavar="PATH",
+                        help="边分析边累计卡片库统计（身高分布、分位数、分类和标签计数），写成可合并的 JSON 报告")
+    parser.add_argument("--models", default=None, metavar="CONFIG",
+                        help="按卡片格式/版本选模型的 JSON 配置（如 {\"*\": \"height_xgb.pkl\", \"Koikatu\": \"height_kk.pkl\"}），"
+                             "运行中收到 SIGHUP 时重新加载")
+    parser.add_argument("--thresholds", default=None, metavar="JSON",
+                        help="用新的分类阈值表（HEIGHT_CATEGORIES / AESTHETIC_CATEGORIES）分析或重新分类")
+    parser.add_argument("--reclassify", default=None, metavar="RESULTS",
+                        help="按当前（或 --thresholds 给出的）阈值重算已有结果 JSON 的分类标签，不读卡、不调用模型；"
+                             "默认原地改写，--output 可另存")
+    parser.add_argument("--features", default=None, metavar="DIR",
+                        help="边分析边把 shapeValueBody / shapeValueFace 追加到特征库目录（float32 矩阵 + 路径/哈希索引），"
+                             "内容未变的卡不重复写入")
+    parser.add_argument("--quarantine", default=None, metavar="PATH",
+                        help="坏卡隔离名单（JSONL）：结构校验未通过的卡片记入名单并注明原因，之后的运行中未变化的直接跳过")
+    parser.add_argument("--shadow", default=None, metavar="CANDIDATE",
+                        help="影子评分：同一遍里再用候选模型（.pkl 或 --models 格式的 JSON）预测，输出逐卡差值和分类变化")
+    parser.add_argument("--shadow-report", default=None,
+                        help="影子评分汇总（MAE、一致率、分类变化计数）的 JSON 路径，默认与结果文件同名 .shadow.json")
+    parser.add_argument("--stats-only", action="store_true",
+                        help="配合 --stats：只输出统计，不保存也不逐张打印结果，结果列表不驻留内存")
+    args = parser.parse_args(argv)
+    if sum(bool(x) for x in (args.input_dir, args.stdin, args.archive, args.merge, args.reclassify, args.diff)) != 1:
+        parser.error("请指定角色卡目录、--stdin、--archive、--merge、--reclassify 或 --diff 其中之一")
+    if args.journal and (not args.input_dir or args.shard):
+        parser.error("--journal 只能用于不分片的目录输入")
+    if args.stats_only and (not args.stats or args.shard or args.journal):
+        parser.error("--stats-only 需要 --stats，且不能与 --shard、--journal 同时使用")
+    if args.schedule and (not args.processes or args.shard or args.journal):
+        parser.error("--schedule 需要 --processes，且不能与 --shard、--journal 同时使用（结果不按路径排序）")
+    if args.explain and args.journal:
+        parser.error("--explain 不能与 --journal 同时使用（运行日志不保存贡献矩阵，续跑时会缺少已恢复卡片的贡献）")
+    if args.memory_budget and (args.threads or args.processes or args.stdin or args.archive):
+        parser.error("--memory-budget 只对流水线模式生效，不能与 --threads、--processes、--stdin、--archive 同时使用")
+    if args.explain and args.processes:
+        parser.error("--explain 不能与 --processes 同时使用（子进程不收集贡献矩阵），请改用 --threads 或流水线模式")
+    shard = None
+    if args.shard:
+        if not args.input_dir:
+            parser.error("--shard 只能用于目录输入")
+        try:
+            shard = parse_shard_spec(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+
+    def print_result(r):
         if r['success']:
-            print(f"{r['file_name']} -> {r['height_cm']} cm ({r['height_category']}) [{r.get('combined_tag', '')}]")
+            shadow = r.get('shadow')
+            if shadow and 'delta_cm' in shadow:
+                flag = f" {r['height_category']}→{shadow['height_category']}" if shadow['category_changed'] else ""
+                shadow = f"  候选 {shadow['height_cm']} cm ({shadow['delta_cm']:+.2f}){flag}"
+            elif shadow:
+                shadow = f"  候选模型错误: {shadow['error']}"
+            print(f"{r['file_name']} -> {r['height_cm']} cm ({r['height_category']}) [{r.get('combined_tag', '')}]{shadow or ''}")
         else:
             print(f"{r['file_name']} -> 错误: {r['error']}")
 
-    output_path = os.path.join(input_dir, 'analysis_results.json')
-    analyzer.save_analysis_results(results, output_path)
-    print(f"\n详细结果已保存至: {output_path}")
\ No newline at end of file
+    def echo(results):
+        for r in results:
+            print_result(r)
+            yield r
+
+    if args.merge:
+        output_path = args.output or os.path.join(os.path.dirname(args.merge[0]) or '.', 'analysis_results.json')
+        try:
+            summary = merge_shards(args.merge, output_path)
+        except (ValueError, KeyError, OSError) as e:
+            print(f"合并失败: {e}")
+            sys.exit(1)
+        print(f"已合并 {summary['num_shards']} 个分片，共 {summary['count']} 张卡片"
+              f"（成功 {summary['success']}），结果已保存至: {output_path}")
+        return
+
+    if args.diff:
+        old_path, new_path = args.diff
+        output_path = args.output or os.path.join(os.path.dirname(new_path) or '.', 'changes.jsonl')
+        try:
+            counts = diff_files(old_path, new_path, output_path)
+        except (ValueError, KeyError, OSError) as e:
+            print(f"比较失败: {e}")
+            sys.exit(1)
+        print(f"{format_counts(counts)}\n变化集已保存至: {output_path}")
+        return
+
+    if args.reclassify:
+        reclassify_file(args.reclassify, args.output or args.reclassify, args.thresholds)
+        return
+
+    if args.profile or args.profile_out:
+        PROFILER.enable()
+
+    input_dir = args.input_dir
+    memory_budget = int(args.memory_budget * 1024 * 1024) if args.memory_budget else None
+    pipeline_kwargs = dict(read_workers=args.read_workers, prefetch=args.prefetch, queue_size=args.queue_size,
+                           batch_size=args.batch_size, memory_budget=memory_budget, explain_top_k=args.explain)
+    use_pipeline = bool(args.pipeline or memory_budget or args.explain)
+    if args.models:
+        try:
+            analyzer = BodyDataAnalyzer(models=args.models)
+        except (ValueError, OSError) as e:
+            print(f"模型配置加载失败: {e}")
+            sys.exit(1)
+        for key, (path, _) in analyzer.registry.describe().items():
+            print(f"模型 {key}: {path}")
+        install_reload_handler(analyzer, args.models)
+    else:
+        analyzer = BodyDataAnalyzer()          # 默认加载 height_xgb.pkl
+    analyzer.EXPLAIN_APPROX = args.explain_approx
+    analyzer.CARD_DEADLINE = args.deadline
+    analyzer.RECORD_HASH = args.hash
+    if args.thresholds:
+        try:
+            analyzer.set_thresholds(args.thresholds)
+        except (ValueError, OSError) as e:
+            print(f"阈值表无效: {e}")
+            sys.exit(1)
+    if args.processes and args.features:
+        print("--processes 不支持 --features（各进程各自追加会弄乱特征库），请改用 --threads")
+        sys.exit(1)
+    if args.features:
+        analyzer.feature_store = FeatureStore(args.features)
+    if args.quarantine:
+        analyzer.quarantine = Quarantine(args.quarantine)
+    if args.predict_threads:
+        analyzer.set_predict_threads(args.predict_threads)
+    shadow_stats = None
+    if args.shadow:
+        try:
+            analyzer.set_shadow_models(args.shadow)
+        except (ValueError, OSError) as e:
+            print(f"候选模型加载失败: {e}")
+            sys.exit(1)
+        shadow_stats = ShadowStats()
+    if shard is not None:
+        if not os.path.exists(input_dir):
+            print(f"目录不存在: {input_dir}")
+            sys.exit(1)
+        paths = analyzer.list_card_paths(input_dir, shard)
+        if args.processes:
+            results = analyzer.iter_analyze_forked(paths, workers=args.processes, batch_size=args.batch_size)
+        elif args.threads:
+            results = analyzer.iter_analyze_threaded(paths, workers=args.threads, batch_size=args.batch_size,
+                                                     explain_top_k=args.explain)
+        elif use_pipeline:
+            results = analyzer.iter_analyze_pipelined(paths, **pipeline_kwargs)
+        else:
+            results = (analyzer.analyze_character_card(p) for p in paths)
+    elif args.stdin:
+        results = analyzer.iter_analyze_stream(sys.stdin.buffer, batch_size=args.batch_size,
+                                               explain_top_k=args.explain)
+        default_dir = '.'
+    elif args.archive:
+        results = analyzer.iter_analyze_archive(args.archive, batch_size=args.batch_size,
+                                                explain_top_k=args.explain)
+        default_dir = os.path.dirname(args.archive) or '.'
+    elif args.journal:
+        try:
+            results = analyzer.batch_analyze_resumable(input_dir, args.journal, restart=args.journal_restart,
+                                                       pipeline=use_pipeline,
+                                                       **pipeline_kwargs)
+        except JournalMismatch as e:
+            print(e)
+            sys.exit(1)
+        default_dir = input_dir
+    elif args.processes and args.schedule:
+        results = analyzer.iter_batch_analyze(input_dir, processes=args.processes, schedule=True,
+                                              batch_size=args.batch_size,
+                                              batch_bytes=int(args.batch_mb * 1024 * 1024) if args.batch_mb else None)
+        default_dir = input_dir
+    elif args.processes:
+        results = analyzer.iter_batch_analyze(input_dir, processes=args.processes, batch_size=args.batch_size)
+        default_dir = input_dir
+    elif args.threads:
+        results = analyzer.iter_batch_analyze(input_dir, threads=args.threads, batch_size=args.batch_size,
+                                              explain_top_k=args.explain)
+        default_dir = input_dir
+    elif use_pipeline:
+        results = analyzer.iter_batch_analyze(input_dir, pipeline=True, **pipeline_kwargs)
+        default_dir = input_dir
+    else:
+        results = analyzer.iter_batch_analyze(input_dir)
+        default_dir = input_dir
+
+    stats = LibraryStats() if args.stats else None
+    if stats is not None:
+        results = stats.observe(results)
+    if shadow_stats is not None:
+        results = shadow_stats.observe(results)
+
+    if shard is not None:
+        index, total = shard
+        output_path = shard_output_path(args.output or os.path.join(input_dir, 'analysis_results.jsonl'), index, total)
+        manifest = {'shard': index, 'num_shards': total, 'input': os.path.abspath(input_dir),
+                    'model_fingerprint': analyzer.model_fingerprint}
+        manifest = write_shard(echo(results), output_path, manifest)
+        print(f"\n分片 {index}/{total}: {manifest['count']} 张卡片，结果已保存至: {output_path}")
+        print(f"manifest: {manifest_path(output_path)}")
+    elif args.stats_only:
+        output_path = args.output or os.path.join(default_dir, 'analysis_results.json')
+        for _ in results:
+            pass
+    else:
+        # 打印结果
+        results = list(echo(results))
+        output_path = args.output or os.path.join(default_dir, 'analysis_results.json')
+        analyzer.save_analysis_results(results, output_path)
+        print(f"\n详细结果已保存至: {output_path}")
+
+    if stats is not None:
+        stats.save(args.stats)
+        print("\n===== 卡片库统计 =====")
+        print(stats.report())
+        print(f"统计已保存至: {args.stats}")
+
+    if analyzer.feature_store is not None:
+        store = analyzer.feature_store
+        store.close()
+        print(f"特征库: {args.features}  共 {len(store)} 张卡片，矩阵 {store.rows} 行")
+
+    if analyzer.quarantine is not None:
+        analyzer.quarantine.close()
+        reasons = "，".join(f"{reason} {n}" for reason, n in analyzer.quarantine.summary().most_common())
+        print(f"隔离名单: {args.quarantine}  共 {len(analyzer.quarantine)} 张" + (f"（{reasons}）" if reasons else ""))
+
+    if shadow_stats is not None:
+        shadow_path = args.shadow_report or os.path.splitext(output_path)[0] + '.shadow.json'
+        shadow_stats.save(shadow_path)
+        print("\n===== 影子评分 =====")
+        print(shadow_stats.report())
+        print(f"影子评分汇总已保存至: {shadow_path}")
+
+    if args.explain:
+        contribs_path = args.contribs_out or os.path.splitext(output_path)[0] + '.contribs.npz'
+        n = analyzer.save_contributions(contribs_path)
+        print(f"{n} 张卡片的 shapeValue 贡献已保存至: {contribs_path}")
+
+    if analyzer.last_run_stats:
+        stats = analyzer.last_run_stats
+        print(f"在途字节峰值: {stats['peak_inflight_bytes'] / 1024 / 1024:.1f} MB"
+              f"  进程内存峰值: {stats['peak_rss_mb'] or 0:.1f} MB")
+
+    if PROFILER.enabled:
+        print("\n===== 性能统计 =====")
+        print(PROFILER.report())
+        if args.profile_out:
+            PROFILER.write_prometheus(args.profile_out)
+            print(f"统计已写入: {args.profile_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# -*- coding:utf-8 -*-
+"""
+可复现的基准测试：合成语料上测 加载 / 分析 / 保存 三个阶段的吞吐、峰值内存和分阶段耗时
+与 baseline.json 对比，吞吐下降或内存上涨超过容差即以非零状态退出；有卡片分析失败时同样非零退出
+（失败的卡走的是异常路径，吞吐数字没有意义）
+
+baseline.json 是本机的绝对数字，不纳入版本库：换机器后先在改动前的代码上 --update-baseline 生成，再对比
+
+    python benchmarks/bench_cards.py --update-baseline  # 生成本机基线
+    python benchmarks/bench_cards.py                    # 对比基线
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from BodyDataAnalyzer import BodyDataAnalyzer
+from chara_loader import PROFILER
+from synth_cards import train_synthetic_models, write_corpus
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# 指标名 -> 方向（higher: 越大越好；lower: 越小越好）
+METRICS = {
+    "load_cards_per_sec": "higher",
+    "analyze_cards_per_sec": "higher",
+    "save_cards_per_sec": "higher",
+    "peak_rss_mb": "lower",
+}
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位是 KB，macOS 是字节
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _timed(func, items):
+    start = time.perf_counter()
+    out = [func(x) for x in items]
+    return time.perf_counter() - start, out
+
+
+def make_analyzer(workdir, seed, model_path=None):
+    """model_path 为 .json 时按 --models 配置加载；为空时训练合成的 AI少女 / 恋活 两个模型"""
+    if model_path is None:
+        return BodyDataAnalyzer(models=train_synthetic_models(os.path.join(workdir, "models"), seed=seed))
+    if model_path.endswith(".json"):
+        return BodyDataAnalyzer(models=model_path)
+    return BodyDataAnalyzer(model_path)
+
+
+def run_benchmark(workdir, count, seed, model_path=None, repeat=3, **corpus_kwargs):
+    cards_dir = os.path.join(workdir, "cards")
+    save_dir = os.path.join(workdir, "saved")
+    os.makedirs(save_dir, exist_ok=True)
+    paths = write_corpus(cards_dir, count, seed=seed, **corpus_kwargs)
+
+    analyzer = make_analyzer(workdir, seed, model_path)
+
+    best = {"load": float("inf"), "analyze": float("inf"), "save": float("inf")}
+    results = []
+    for _ in range(repeat):
+        elapsed, charas = _timed(analyzer.load_character_card, paths)
+        best["load"] = min(best["load"], elapsed)
+
+        PROFILER.reset()
+        PROFILER.enable()
+        elapsed, results = _timed(analyzer.analyze_character_card, paths)
+        PROFILER.disable()
+        best["analyze"] = min(best["analyze"], elapsed)
+
+        targets = [(c, os.path.join(save_dir, os.path.basename(p))) for c, p in zip(charas, paths)]
+        elapsed, _ = _timed(lambda t: t[0].save(t[1]), targets)
+        best["save"] = min(best["save"], elapsed)
+        del charas, targets
+
+    metrics = {
+        "load_cards_per_sec": round(count / best["load"], 1),
+        "analyze_cards_per_sec": round(count / best["analyze"], 1),
+        "save_cards_per_sec": round(count / best["save"], 1),
+        "peak_rss_mb": round(peak_rss_mb() or 0.0, 1),
+        "success": sum(1 for r in results if r["success"]),
+        "count": count,
+    }
+    return metrics, PROFILER.report()
+
+
+def compare(metrics, baseline, tolerance):
+    regressions = []
+    for name, direction in METRICS.items():
+        if name not in baseline or not baseline[name]:
+            continue
+        old, new = baseline[name], metrics[name]
+        if direction == "higher" and new < old * (1 - tolerance):
+            regressions.append(f"{name}: {new} < 基线 {old} (-{(1 - new / old) * 100:.1f}%)")
+        elif direction == "lower" and new > old * (1 + tolerance):
+            regressions.append(f"{name}: {new} > 基线 {old} (+{(new / old - 1) * 100:.1f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="角色卡 加载/分析/保存 基准测试")
+    parser.add_argument("-n", "--count", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--image-size", type=int, default=64 * 1024)
+    parser.add_argument("--unknown-size", type=int, default=16 * 1024)
+    parser.add_argument("--kkex-size", type=int, default=0)
+    parser.add_argument("--model", default=None, help="使用真实模型（.pkl，或 --models 格式的 JSON 配置）；默认用合成数据训练的同结构模型")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="允许的相对退化比例")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bda_bench_")
+    try:
+        metrics, profile = run_benchmark(
+            workdir, args.count, args.seed, model_path=args.model, repeat=args.repeat,
+            image_size=args.image_size, unknown_size=args.unknown_size, kkex_size=args.kkex_size,
+        )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print("===== 基准结果 =====")
+    for k, v in metrics.items():
+        print(f"{k:<24} {v}")
+    print("\n===== 分析阶段分解 =====")
+    print(profile)
+
+    if metrics["success"] != metrics["count"]:
+        print(f"\n❌ {metrics['count'] - metrics['success']} 张卡片分析失败，吞吐数字测的是异常路径，不与基线比较")
+        return 1
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(metrics, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已更新: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\n未找到基线文件 {args.baseline}，用 --update-baseline 生成")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(metrics, baseline, args.tolerance)
+    if regressions:
+        print("\n❌ 性能退化:")
+        for r in regressions:
+            print("  - " + r)
+        return 1
+    print("\n✅ 未发现性能退化")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+# -*- coding:utf-8 -*-
+"""
+恋活 Coordinate 按需解码基准：多套服装、大量饰品的合成恋活卡上对比
+  加载：按需解码（默认） vs 加载后解码全部服装（等同原来 __init__ 里的逐套 msg_unpack）
+  写回：未访问的服装原样写回 vs 全部解码后重新打包
+并检查两种方式 bytes() 都与原卡逐字节一致
+
+    python benchmarks/bench_coordinate.py -n 500 --coordinates 20 --accessories 60
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chara_loader import KoikatuCharaData
+from synth_cards import make_kk_card
+
+
+def timed(func, cards):
+    start = time.perf_counter()
+    out = [func(data) for data in cards]
+    return time.perf_counter() - start, out
+
+
+def load_eager(data):
+    chara = KoikatuCharaData.load(data)
+    for _ in chara.Coordinate.data:  # 逐套解码，与原实现的工作量相同
+        pass
+    return chara
+
+
+def main():
+    parser = argparse.ArgumentParser(description="恋活 Coordinate 按需解码基准")
+    parser.add_argument("-n", "--count", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--coordinates", type=int, default=20, help="每张卡的服装套数")
+    parser.add_argument("--accessories", type=int, default=60, help="每套服装的饰品数")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    # 不生成 Shift-JIS 角色名：那类 Parameter 重新打包后字节本来就会变，与 Coordinate 无关
+    cards = [bytes(make_kk_card(rng, image_size=4096, sjis_ratio=0.0, n_coordinates=args.coordinates,
+                                accessory_count=args.accessories)) for _ in range(args.count)]
+    coord_size = len(KoikatuCharaData.load(cards[0]).Coordinate.serialize()[0])
+    print(f"卡片数: {args.count}  每张 {args.coordinates} 套服装 × {args.accessories} 个饰品"
+          f"  Coordinate 块 {coord_size / 1024:.1f} KB / 卡 {len(cards[0]) / 1024:.1f} KB")
+
+    t_eager, eager = timed(load_eager, cards)
+    t_lazy, lazy = timed(KoikatuCharaData.load, cards)
+    print(f"加载    全部解码 {args.count / t_eager:8.0f} 张/秒   按需解码 {args.count / t_lazy:8.0f} 张/秒"
+          f"  ({t_eager / t_lazy:.1f}x)")
+
+    t_repack, repacked = timed(bytes, eager)
+    t_raw, raw = timed(bytes, lazy)
+    print(f"写回    重新打包 {args.count / t_repack:8.0f} 张/秒   原样写回 {args.count / t_raw:8.0f} 张/秒"
+          f"  ({t_repack / t_raw:.1f}x)")
+    assert raw == cards, "原样写回与原卡不一致"
+    assert repacked == cards, "重新打包与原卡不一致"
+
+    # 只访问一套服装：只有这一套被解码、重新打包
+    chara = KoikatuCharaData.load(cards[0])
+    chara.Coordinate[0]["enableMakeup"] = False
+    outfits = chara.Coordinate.data
+    assert [outfits.is_decoded(i) for i in range(len(outfits))].count(True) == 1
+    reloaded = KoikatuCharaData.load(bytes(chara))
+    assert reloaded.Coordinate[0]["enableMakeup"] is False
+    assert [reloaded.Coordinate.data.raw(i) for i in range(1, len(outfits))] == \
+           [outfits.raw(i) for i in range(1, len(outfits))]
+    print("往返: 两种方式写回均与原卡逐字节一致；修改一套服装时只重新打包这一套")
+
+
+if __name__ == "__main__":
+    main()
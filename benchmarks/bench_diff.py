@@ -0,0 +1,134 @@
+# -*- coding:utf-8 -*-
+"""
+快照差异基准：合成两份几十万条的 analysis_results.json（新的一份打乱顺序，模拟 --schedule 的完成顺序输出），
+其中少量卡片新增 / 删除 / 内容变化 / 分类变化，对比
+  整体载入：json.load 两个文件，按路径建字典后比较
+  流式归并：snapshot_diff.diff_files（分段排序写临时文件 + heapq.merge）
+报告耗时和 Python 堆峰值（tracemalloc），并检查两种方式得到的变化集一致
+
+    python benchmarks/bench_diff.py -n 200000 --changed 0.01 --run-size 50000
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from BodyDataAnalyzer import BodyDataAnalyzer
+from shards import write_json_array
+from snapshot_diff import pack_labels, compare, diff_files
+
+CATEGORIES = list(BodyDataAnalyzer.HEIGHT_CATEGORIES)
+
+
+def fake_result(i, rng, salt=""):
+    """结构与真实结果相同（含审美分类、原始身高和参数），只是数值随机"""
+    height = round(rng.uniform(135, 185), 1)
+    category = next(c for c, v in BodyDataAnalyzer.HEIGHT_CATEGORIES.items() if height < v["threshold"])
+    path = f"cards/ais_{i:07d}.png"
+    return {
+        "file_path": path, "file_name": os.path.basename(path), "success": True,
+        "height_cm": height, "height_category": category, "error": None,
+        "content_hash": "sha256:" + hashlib.sha256((path + salt).encode()).hexdigest(),
+        "character_name": f"角色{i}",
+        "aesthetic_classifications": {"bodyHeight": category, "bustSize": "适中", "waistSize": "标准",
+                                      "hipSize": "匀称", "bustSoftness": "自然", "muscle": "健康"},
+        "combined_tag": f"{category}_适中_匀称_健康_自然",
+        "height_raw": height + 0.01,
+        "parameters": {k: round(rng.random(), 2) for k in ("bustSize", "waistSize", "hipSize", "bustSoftness", "muscle")},
+    }
+
+
+def make_snapshots(n, changed, rng):
+    old = [fake_result(i, rng) for i in range(n)]
+    new = [dict(r) for r in old]
+    k = max(int(n * changed / 4), 1)
+    picks = rng.sample(range(n), 3 * k)
+    for i in picks[:k]:                         # 内容变化，分类不变
+        new[i]["content_hash"] = "sha256:" + hashlib.sha256(f"{i}-v2".encode()).hexdigest()
+    for i in picks[k:2 * k]:                    # 分类变化
+        other = rng.choice([c for c in CATEGORIES if c != new[i]["height_category"]])
+        new[i]["height_category"] = other
+    removed = set(picks[2 * k:])
+    new = [r for i, r in enumerate(new) if i not in removed]
+    new += [fake_result(n + j, rng, salt="new") for j in range(k)]
+    rng.shuffle(new)
+    return old, new
+
+
+def naive_diff(old_path, new_path):
+    """下游原来的做法：两个文件整体载入，按路径建字典"""
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = {r["file_path"]: r for r in json.load(f)}
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = {r["file_path"]: r for r in json.load(f)}
+    changes = []
+    for path in sorted(old.keys() | new.keys()):
+        if path not in new:
+            changes.append({"change": "removed", "file_path": path})
+        elif path not in old:
+            changes.append({"change": "new", "file_path": path})
+        else:
+            project = lambda r: [r["file_path"], r.get("content_hash"), r["success"], r["height_category"],
+                                 r["height_cm"], r["error"], r["combined_tag"], pack_labels(r["aesthetic_classifications"])]
+            change = compare(project(old[path]), project(new[path]))
+            if change is not None:
+                changes.append({"change": change["change"], "file_path": path})
+    return changes
+
+
+def measure(func, *args):
+    start = time.perf_counter()
+    value = func(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return value, elapsed, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式快照差异 vs 整体载入比较")
+    parser.add_argument("-n", "--count", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--changed", type=float, default=0.01, help="发生变化的卡片比例")
+    parser.add_argument("--run-size", type=int, default=50000)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="bda_diff_")
+    try:
+        old, new = make_snapshots(args.count, args.changed, rng)
+        old_path, new_path = os.path.join(workdir, "old.json"), os.path.join(workdir, "new.json")
+        write_json_array(old, old_path)
+        write_json_array(new, new_path)
+        del old, new
+        size_mb = (os.path.getsize(old_path) + os.path.getsize(new_path)) / 1024 / 1024
+        changes_path = os.path.join(workdir, "changes.jsonl")
+
+        expected, t_naive, peak_naive = measure(naive_diff, old_path, new_path)
+        counts, t_stream, peak_stream = measure(diff_files, old_path, new_path, changes_path, args.run_size, workdir)
+        with open(changes_path, "r", encoding="utf-8") as f:
+            got = [json.loads(line) for line in f]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"卡片数: {args.count}  两个结果文件共 {size_mb:.0f} MB  新结果已打乱顺序  run_size {args.run_size}")
+    print(f"变化: {dict(Counter(c['change'] for c in got))}  未变化 {counts['unchanged']}")
+    print(f"整体载入  {t_naive:6.2f} s  堆峰值 {peak_naive:8.1f} MB")
+    print(f"流式归并  {t_stream:6.2f} s  堆峰值 {peak_stream:8.1f} MB  ({peak_naive / peak_stream:.0f}x 更少)")
+    ok = [(c["change"], c["file_path"]) for c in got] == [(c["change"], c["file_path"]) for c in expected]
+    print(f"变化集一致: {ok}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+# -*- coding:utf-8 -*-
+"""
+多进程共享模型基准：同样 N 个工作进程，对比
+  各自加载：spawn 启动，每个进程 import + joblib.load 一份模型（原来的做法）
+  fork 共享：父进程加载一次后 forked_pool()，子进程写时复制共用模型
+报告进程池启动到全部进程就绪的耗时、每个工作进程的 RSS / 私有内存（USS，smaps_rollup 的
+Private_Clean + Private_Dirty，即该进程独占、退出后能还给系统的部分），并检查分析结果一致
+
+    python benchmarks/bench_fork.py -n 600 --workers 4 --trees 1000 --depth 8
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from BodyDataAnalyzer import BodyDataAnalyzer, current_rss_mb
+from synth_cards import train_synthetic_models, write_corpus
+
+_worker = None
+
+
+def _init_worker(models):
+    global _worker
+    _worker = BodyDataAnalyzer(models=models)
+    _worker.set_predict_threads(1)
+
+
+def _analyze_chunk(paths):
+    return _worker._finish_batch([_worker._read_and_parse(p) for p in paths])
+
+
+def _pid():
+    time.sleep(0.05)
+    return os.getpid()
+
+
+def wait_ready(pool, workers):
+    """反复提交 workers 个小任务，直到每个进程都应答过一次（即都已跑完 initializer）"""
+    seen = set()
+    while len(seen) < workers:
+        seen.update(f.result() for f in [pool.submit(_pid) for _ in range(workers)])
+    return seen
+
+
+def memory_mb(pid):
+    """(RSS, 私有内存) MB"""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1]) / 1024
+    except OSError:
+        return 0.0, 0.0
+    return fields.get("Rss", 0.0), fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0)
+
+
+def run(label, make_pool, analyze, workers, paths, batch_size):
+    start = time.perf_counter()
+    pool = make_pool()
+    pids = wait_ready(pool, workers)
+    startup = time.perf_counter() - start
+    try:
+        start = time.perf_counter()
+        results = analyze(pool, paths, batch_size)
+        elapsed = time.perf_counter() - start
+        mem = [memory_mb(pid) for pid in pids]
+    finally:
+        pool.shutdown()
+    rss = sum(m[0] for m in mem) / len(mem)
+    uss = sum(m[1] for m in mem) / len(mem)
+    print(f"{label}  启动 {startup:6.2f} s  分析 {elapsed:6.2f} s  每进程 RSS {rss:7.1f} MB  私有 {uss:7.1f} MB"
+          f"  （{workers} 个进程私有合计 {uss * workers:7.1f} MB）")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程：各自加载模型 vs fork 共享模型")
+    parser.add_argument("-n", "--count", type=int, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--trees", type=int, default=1000, help="合成模型的树数量")
+    parser.add_argument("--depth", type=int, default=8, help="合成模型的树深度")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bda_fork_")
+    try:
+        paths = write_corpus(os.path.join(workdir, "cards"), args.count, seed=args.seed)
+        models = train_synthetic_models(os.path.join(workdir, "models"), samples=10000,
+                                        n_estimators=args.trees, max_depth=args.depth)
+        analyzer = BodyDataAnalyzer(models=models)
+        model_mb = sum(os.path.getsize(p) for p in models.values()) / 1024 / 1024
+        print(f"卡片数: {args.count}  workers: {args.workers}  模型文件 {model_mb:.1f} MB"
+              f"  父进程 RSS {current_rss_mb():.1f} MB")
+        serial = analyzer.batch_analyze(os.path.join(workdir, "cards"))
+        serial = sorted(serial, key=lambda r: r["file_path"])
+        paths = [r["file_path"] for r in serial]
+
+        def chunked(pool, paths, batch_size):
+            chunks = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+            return [r for batch in pool.map(_analyze_chunk, chunks) for r in batch]
+
+        spawn = run("各自加载", lambda: ProcessPoolExecutor(
+                        max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker, initargs=(models,)),
+                    chunked, args.workers, paths, args.batch_size)
+        forked = run("fork共享", lambda: analyzer.forked_pool(args.workers),
+                     lambda pool, paths, batch_size: list(analyzer.iter_analyze_forked(
+                         paths, batch_size=batch_size, pool=pool)),
+                     args.workers, paths, args.batch_size)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    ok = serial == spawn == forked
+    print(f"结果一致: {ok}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
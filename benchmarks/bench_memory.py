@@ -0,0 +1,60 @@
+# -*- coding:utf-8 -*-
+"""
+常驻内存对比：同一批卡片分别用普通版和 __slots__ 紧凑版加载并全部保留在内存里，
+用 tracemalloc 统计平均每张卡占用的字节数
+
+    python benchmarks/bench_memory.py -n 2000 --image-size 0
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chara_loader import (AiSyoujyoCharaData, CompactAiSyoujyoCharaData,
+                          CompactKoikatuCharaData, KoikatuCharaData)
+from synth_cards import generate_corpus
+
+VARIANTS = [
+    ("普通版", AiSyoujyoCharaData, KoikatuCharaData, {}),
+    ("紧凑版", CompactAiSyoujyoCharaData, CompactKoikatuCharaData, {}),
+    ("紧凑版(不保留缩略图)", CompactAiSyoujyoCharaData, CompactKoikatuCharaData, {"keep_image": False}),
+]
+
+
+def bytes_per_card(cards, ais_cls, kk_cls, load_kwargs):
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    held = []
+    for fname, data in cards:
+        cls = kk_cls if fname.startswith("kk_") else ais_cls
+        held.append(cls.load(data, **load_kwargs))
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before) / len(cards), held
+
+
+def main():
+    parser = argparse.ArgumentParser(description="普通版 / 紧凑版角色卡对象内存对比")
+    parser.add_argument("-n", "--count", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--image-size", type=int, default=64 * 1024)
+    parser.add_argument("--unknown-size", type=int, default=16 * 1024)
+    args = parser.parse_args()
+
+    cards = list(generate_corpus(args.count, seed=args.seed, image_size=args.image_size,
+                                 unknown_size=args.unknown_size))
+    print(f"卡片数: {args.count}  缩略图: {args.image_size} B  未知块: {args.unknown_size} B")
+    baseline = None
+    for label, ais_cls, kk_cls, load_kwargs in VARIANTS:
+        per_card, held = bytes_per_card(cards, ais_cls, kk_cls, load_kwargs)
+        baseline = baseline or per_card
+        print(f"{label:<20} {per_card / 1024:10.1f} KB/张  ({per_card / baseline * 100:5.1f}%)")
+        del held
+
+
+if __name__ == "__main__":
+    main()
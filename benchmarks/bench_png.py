@@ -0,0 +1,83 @@
+# -*- coding:utf-8 -*-
+"""
+PNG 边界定位基准：大缩略图（成百上千个 IDAT 块）的卡片上对比
+原来的逐块 read 实现、新的 get_png 和只记录偏移的 locate_png
+
+    python benchmarks/bench_png.py --image-size 8000000
+"""
+import argparse
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chara_loader.funcs import PNG_SIGNATURE, get_png, load_type, locate_png
+from synth_cards import make_png
+
+
+def get_png_legacy(data_stream):
+    """原来的实现：每块 struct.unpack + read(length + 4)，最后 seek 回去再整段读一遍"""
+    origin_pos = data_stream.tell()
+    assert data_stream.read(8) == PNG_SIGNATURE
+    while True:
+        length = load_type(data_stream, ">I")
+        chunk_type = data_stream.read(4)
+        data_stream.read(length + 4)
+        if chunk_type == b"IEND":
+            break
+    end_pos = data_stream.tell()
+    data_stream.seek(origin_pos)
+    return data_stream.read(end_pos - origin_pos)
+
+
+def bench(func, make_stream, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        stream = make_stream()
+        start = time.perf_counter()
+        func(stream)
+        best = min(best, time.perf_counter() - start)
+        stream.close()
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PNG 边界定位基准")
+    parser.add_argument("--image-size", type=int, default=8 * 1000 * 1000)
+    parser.add_argument("--idat-chunk", type=int, default=8192)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    png = make_png(random.Random(0), args.image_size, idat_chunk=args.idat_chunk)
+    card = png + b"\x64\x00\x00\x00" + b"\x00" * 1024  # PNG 后面跟着卡片数据
+    workdir = tempfile.mkdtemp(prefix="bda_png_")
+    path = os.path.join(workdir, "card.png")
+    with open(path, "wb") as f:
+        f.write(card)
+
+    try:
+        for label, make_stream in (("BytesIO", lambda: io.BytesIO(card)),
+                                   ("文件句柄", lambda: open(path, "rb"))):
+            s1, s2, s3 = make_stream(), make_stream(), make_stream()
+            assert get_png_legacy(s1) == get_png(s2) == png
+            assert locate_png(s3) == (0, len(png)) and s1.tell() == s2.tell() == s3.tell()
+            for s in (s1, s2, s3):
+                s.close()
+
+            legacy = bench(get_png_legacy, make_stream, args.repeat)
+            fast = bench(get_png, make_stream, args.repeat)
+            offset_only = bench(locate_png, make_stream, args.repeat)
+            print(f"[{label}] PNG {len(png) / 1e6:.1f} MB, {len(png) // args.idat_chunk} 个 IDAT 块")
+            print(f"  原实现 get_png      {legacy * 1000:8.2f} ms")
+            print(f"  新实现 get_png      {fast * 1000:8.2f} ms  ({legacy / fast:.1f}x)")
+            print(f"  locate_png（不拷贝） {offset_only * 1000:8.2f} ms  ({legacy / offset_only:.1f}x)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
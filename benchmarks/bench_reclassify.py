@@ -0,0 +1,71 @@
+# -*- coding:utf-8 -*-
+"""
+重新分类基准：构造 n 条带 height_raw / parameters 的分析结果（不需要卡片和模型），
+对比 reclassify_results（整列向量化）与逐条调用 classify_by_height / classify_parameters 的耗时，
+并检查两者得到的标签完全相同
+
+    python benchmarks/bench_reclassify.py -n 1000000
+"""
+import argparse
+import copy
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from BodyDataAnalyzer import BodyDataAnalyzer
+
+NEW_THRESHOLDS = {
+    "HEIGHT_CATEGORIES": {"萝莉": {"threshold": 148.0}, "普妹": {"threshold": 168.0}, "御姐": {"threshold": None}},
+    "AESTHETIC_CATEGORIES": {"bustSize": {"low": 0.6, "high": 0.85}, "muscle": {"low": 0.25, "high": 0.45}},
+}
+
+
+def make_results(n, seed):
+    rng = random.Random(seed)
+    dims = ["bodyHeight", "bustSize", "waistSize", "hipSize", "bustSoftness", "muscle"]
+    results = []
+    for i in range(n):
+        # 少数卡缺某些参数，对应分类和标签里没有这一项
+        params = {d: rng.random() for d in dims if rng.random() > 0.05}
+        results.append({"file_path": f"card_{i:07d}.png", "success": True,
+                        "height_raw": rng.gauss(158.0, 12.0), "parameters": params})
+    return results
+
+
+def reclassify_scalar(analyzer, results):
+    for r in results:
+        h = r["height_raw"]
+        r["height_category"] = analyzer.classify_by_height(h)
+        r["aesthetic_classifications"], r["combined_tag"] = analyzer.classify_parameters(r["parameters"], h)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="阈值调整后的重新分类：向量化 vs 逐条")
+    parser.add_argument("-n", "--count", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    analyzer = BodyDataAnalyzer(models={})
+    analyzer.set_thresholds(NEW_THRESHOLDS)
+    results = make_results(args.count, args.seed)
+    expected = copy.deepcopy(results)
+
+    start = time.perf_counter()
+    reclassify_scalar(analyzer, expected)
+    t_scalar = time.perf_counter() - start
+
+    start = time.perf_counter()
+    summary = analyzer.reclassify_results(results)
+    t_vector = time.perf_counter() - start
+
+    assert results == expected, "向量化结果与逐条分类不一致"
+    print(f"结果数: {args.count}")
+    print(f"逐条分类   {t_scalar:6.2f} s  ({args.count / t_scalar:10.0f} 条/秒)")
+    print(f"向量化     {t_vector:6.2f} s  ({args.count / t_vector:10.0f} 条/秒)  {t_scalar / t_vector:.1f}x")
+    print(f"重新分类 {summary['reclassified']} 条，标签变化 {summary['changed']} 条，与逐条分类结果一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# -*- coding:utf-8 -*-
+"""
+批量改卡基准：合成语料上
+  1. 不涉及任何字段的规则跑一遍，确认卡片一张都没被重写（字节、mtime 不变）；
+     改写路径上“未编辑的块换回原始字节”后 bytes() 与原卡逐字节一致（含 Shift-JIS 角色名的卡）
+  2. 把 shapeValueBody 夹到 [0, 1]，对比单进程和多进程的每秒卡片数，
+     并检查改写后的卡片：被夹的值落在区间内，其余块逐字节不变
+
+    python benchmarks/bench_rewrite.py -n 2000 --workers 4
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chara_loader.rewrite import (iter_card_paths, keep_untouched_blocks, load_card, original_blocks,
+                                  rewrite_cards)
+from synth_cards import write_corpus
+
+NOOP_SPEC = {"edits": [{"op": "delete", "path": "Parameter.no_such_field"}]}
+CLAMP_SPEC = {"edits": [{"op": "clamp", "path": "Custom.body.shapeValueBody", "min": 0.0, "max": 1.0}]}
+
+
+def snapshot(paths):
+    out = {}
+    for p in paths:
+        with open(p, "rb") as f:
+            out[p] = (f.read(), os.stat(p).st_mtime_ns)
+    return out
+
+
+def run(paths, spec, workers, **kwargs):
+    start = time.perf_counter()
+    results = list(rewrite_cards(paths, spec, workers=workers, **kwargs))
+    elapsed = time.perf_counter() - start
+    errors = [r for r in results if r["error"]]
+    assert not errors, errors[:3]
+    return results, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量改卡：字节还原与吞吐")
+    parser.add_argument("-n", "--count", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--image-size", type=int, default=64 * 1024)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bda_rewrite_")
+    try:
+        write_corpus(workdir, args.count, seed=args.seed, image_size=args.image_size)
+        paths = iter_card_paths(workdir)
+        before = snapshot(paths)
+
+        # 1. 未改动的卡片：不重写，且往返逐字节一致
+        results, _ = run(paths, NOOP_SPEC, args.workers)
+        assert not any(r["changed"] for r in results)
+        assert snapshot(paths) == before, "未改动的卡片被重写了"
+        for p, (data, _) in before.items():
+            chara = load_card(data)
+            keep_untouched_blocks(chara, data, [])
+            assert bytes(chara) == data, "往返不一致: " + p
+        print(f"往返: {len(paths)} 张卡片 load → bytes() 逐字节一致，无改动的卡片未被重写")
+
+        # 2. dry-run 不写文件
+        results, _ = run(paths, CLAMP_SPEC, args.workers, dry_run=True)
+        expected = sum(r["changed"] for r in results)
+        assert snapshot(paths) == before
+        print(f"dry-run: {expected} 张卡片需要修改，共 {sum(len(r['diffs']) for r in results)} 处改动，文件未变")
+
+        # 3. 吞吐：单进程 / 多进程，各写到独立的输出目录
+        timings = {}
+        for workers in sorted({1, args.workers}):
+            out = os.path.join(workdir + "_out", str(workers))
+            results, elapsed = run(paths, CLAMP_SPEC, workers, output_dir=out, root=workdir)
+            assert sum(r["changed"] for r in results) == expected
+            timings[workers] = elapsed
+            print(f"workers={workers:<3} {len(paths) / elapsed:8.1f} 张/秒  ({elapsed:.2f} s)")
+
+        # 4. 改写结果：被夹的值在区间内，其余块与原卡逐字节相同
+        for r in results:
+            if not r["changed"]:
+                continue
+            new_path = os.path.join(out, os.path.relpath(r["file_path"], workdir))
+            with open(new_path, "rb") as f:
+                new_data = f.read()
+            new = load_card(new_data)
+            new_blocks = original_blocks(new_data)
+            assert all(0.0 <= v <= 1.0 for v in new.Custom["body"]["shapeValueBody"])
+            for name, raw in original_blocks(before[r["file_path"]][0]).items():
+                if name != "Custom":
+                    assert new_blocks[name] == raw, name
+        if len(timings) > 1:
+            print(f"加速比: {timings[1] / timings[args.workers]:.2f}x")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        shutil.rmtree(workdir + "_out", ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# -*- coding:utf-8 -*-
+"""
+按大小调度 + 单卡时限基准：大量普通卡中混入几张大而慢的卡（大缩略图 + 需要回退解析的 Status 块），
+文件名排在最后，按路径顺序切块时它们会挤进最后一个任务；另有一张解码要几秒的卡检验 --deadline。
+对比
+  按路径切块：iter_analyze_forked
+  按大小调度：iter_analyze_scheduled（从大到小装箱，空闲进程取下一个任务）
+报告本机实际耗时，以及用串行测得的每张卡耗时模拟 W 个进程时两种任务划分的完工时间（与本机核数无关），
+并检查两种方式的结果集合一致、慢卡被记为 timeout
+
+    python benchmarks/bench_schedule.py -n 600 --giants 8 --workers 4 --deadline 1
+"""
+import argparse
+import heapq
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from msgpack import packb
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from BodyDataAnalyzer import BodyDataAnalyzer
+from scheduler import plan_batches, scan_card_sizes
+from synth_cards import ais_module, make_ais_card, train_synthetic_models, write_corpus
+
+
+def make_slow_card(rng, image_size, kkex_items):
+    """
+    Status 里是大量非 UTF-8 的 str：msg_unpack 走回退解析，逐项递归，耗时与项数成正比。
+    不放在 KKEx 里，因为分析时轻量加载不解码 KKEx
+    """
+    chara = make_ais_card(rng, image_size=image_size)
+    raw = packb(["キャラ".encode("cp932") + bytes([i % 200]) for i in range(kkex_items)], use_bin_type=False)
+    chara.Status = ais_module.UnknownBlockData("Status", raw, "0.0.0")
+    return bytes(chara)
+
+
+def makespan(tasks, workers):
+    """任务按顺序交给最先空闲的进程（与进程池的共享队列相同），返回全部完成的时刻"""
+    free = [0.0] * workers
+    for cost in tasks:
+        heapq.heappush(free, heapq.heappop(free) + cost)
+    return max(free)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按文件大小调度与单卡解码时限")
+    parser.add_argument("-n", "--count", type=int, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--giants", type=int, default=8, help="大而慢的卡片数")
+    parser.add_argument("--giant-image-mb", type=float, default=2.0)
+    parser.add_argument("--giant-items", type=int, default=100000, help="大卡 Status 块的项数（决定解码耗时）")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--deadline", type=float, default=1.0, help="单卡解码时限（秒）")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="bda_schedule_")
+    try:
+        card_dir = os.path.join(workdir, "cards")
+        write_corpus(card_dir, args.count, seed=args.seed)
+        for i in range(args.giants):
+            with open(os.path.join(card_dir, f"zz_giant_{i:03d}.png"), "wb") as f:
+                f.write(make_slow_card(rng, int(args.giant_image_mb * 1024 * 1024), args.giant_items))
+        # 不限时要解码十几秒的卡
+        with open(os.path.join(card_dir, "zz_stuck.png"), "wb") as f:
+            f.write(make_slow_card(rng, 4096, args.giant_items * 40))
+
+        analyzer = BodyDataAnalyzer(models=train_synthetic_models(os.path.join(workdir, "models")))
+        analyzer.CARD_DEADLINE = args.deadline
+        entries = scan_card_sizes(card_dir)
+        paths = [p for p, _ in entries]
+
+        # 串行测每张卡的耗时，用来模拟多进程的完工时间
+        cost = {}
+        for p in paths:
+            start = time.perf_counter()
+            analyzer.analyze_character_card(p)
+            cost[p] = time.perf_counter() - start
+        naive_tasks = [sum(cost[p] for p in paths[i:i + args.batch_size])
+                       for i in range(0, len(paths), args.batch_size)]
+        planned = plan_batches(entries, args.batch_size, workers=args.workers)
+        planned_tasks = [sum(cost[p] for p in batch) for batch in planned]
+        lower_bound = max(sum(cost.values()) / args.workers, max(cost.values()))
+
+        pool = analyzer.forked_pool(args.workers)
+        try:
+            start = time.perf_counter()
+            naive = list(analyzer.iter_analyze_forked(paths, batch_size=args.batch_size, pool=pool))
+            t_naive = time.perf_counter() - start
+            start = time.perf_counter()
+            scheduled = list(analyzer.iter_analyze_scheduled(entries, batch_size=args.batch_size, pool=pool))
+            t_scheduled = time.perf_counter() - start
+        finally:
+            pool.shutdown()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    sizes = sorted(size for _, size in entries)
+    print(f"卡片数: {len(entries)}（其中大卡 {args.giants} 张 + 超慢卡 1 张）  文件大小 {sizes[0] / 1024:.0f} KB"
+          f" ~ {sizes[-1] / 1024 / 1024:.1f} MB  CPU: {os.cpu_count()}  workers: {args.workers}"
+          f"  单卡时限 {args.deadline} s")
+    print(f"按路径切块  任务 {len(naive_tasks):4d} 个  本机 {t_naive:6.2f} s"
+          f"  模拟 {args.workers} 进程完工 {makespan(naive_tasks, args.workers):6.2f} s")
+    print(f"按大小调度  任务 {len(planned_tasks):4d} 个  本机 {t_scheduled:6.2f} s"
+          f"  模拟 {args.workers} 进程完工 {makespan(planned_tasks, args.workers):6.2f} s")
+    print(f"下界（总耗时 / 进程数 与 最慢单卡 取大）{lower_bound:6.2f} s")
+    key = lambda r: r["file_path"]
+    timeouts = [r["file_name"] for r in scheduled if r.get("timeout")]
+    ok = sorted(naive, key=key) == sorted(scheduled, key=key) and timeouts == ["zz_stuck.png"]
+    print(f"超时: {timeouts}  结果一致: {ok}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+# -*- coding:utf-8 -*-
+"""
+线程池模式基准：同一批卡片对比
+  串行：         batch_analyze，逐张 predict
+  线程池：       iter_analyze_threaded，N 个线程解析、进程内一份模型、批量 predict
+  进程池（参照）：N 个进程各自加载一份分析器和模型，逐张分析
+报告耗时与常驻内存（进程池为主进程 + 全部子进程的 RSS 之和），并检查三者结果一致
+
+    python benchmarks/bench_threads.py -n 600 --workers 4 --predict-threads 1
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from BodyDataAnalyzer import BodyDataAnalyzer, current_rss_mb
+from synth_cards import train_synthetic_models, write_corpus
+
+_worker = None
+
+
+def _init_worker(models):
+    global _worker
+    _worker = BodyDataAnalyzer(models=models)
+
+
+def _analyze(path):
+    return _worker.analyze_character_card(path)
+
+
+def process_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="线程池（共享模型） vs 串行 vs 进程池")
+    parser.add_argument("-n", "--count", type=int, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--predict-threads", type=int, default=None, help="XGBoost predict 线程数")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bda_threads_")
+    try:
+        paths = write_corpus(os.path.join(workdir, "cards"), args.count, seed=args.seed)
+        models = train_synthetic_models(os.path.join(workdir, "models"))
+        analyzer = BodyDataAnalyzer(models=models)
+        if args.predict_threads:
+            analyzer.set_predict_threads(args.predict_threads)
+        base_rss = current_rss_mb()
+
+        start = time.perf_counter()
+        serial = [analyzer.analyze_character_card(p) for p in paths]
+        serial_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        threaded = list(analyzer.iter_analyze_threaded(paths, workers=args.workers, batch_size=args.batch_size))
+        threaded_time = time.perf_counter() - start
+        threaded_rss = current_rss_mb()
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                 initargs=(models,)) as pool:
+            procs = list(pool.map(_analyze, paths, chunksize=16))
+            children = sum(process_rss_mb(pid) for pid in pool._processes)
+        procs_time = time.perf_counter() - start
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"卡片数: {args.count}  CPU: {os.cpu_count()}  workers: {args.workers}"
+          f"  predict 线程: {args.predict_threads or '默认'}")
+    print(f"串行:   {serial_time:6.2f} s  ({args.count / serial_time:7.1f} 张/秒)  RSS {base_rss:7.1f} MB")
+    print(f"线程池: {threaded_time:6.2f} s  ({args.count / threaded_time:7.1f} 张/秒)  RSS {threaded_rss:7.1f} MB"
+          f"  加速 {serial_time / threaded_time:.2f}x")
+    print(f"进程池: {procs_time:6.2f} s  ({args.count / procs_time:7.1f} 张/秒)  RSS {threaded_rss + children:7.1f} MB"
+          f"（主进程 + {args.workers} 个子进程，含启动和各自加载模型）")
+    ok = serial == threaded == procs
+    print(f"结果一致: {ok}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
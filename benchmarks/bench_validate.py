@@ -0,0 +1,128 @@
+# -*- coding:utf-8 -*-
+"""
+坏卡处理基准：合成卡片中混入截断、块索引损坏等坏卡，对比
+  加载：原来的 AI少女 → 恋活 两次尝试 vs 结构校验后按格式直接加载（好卡、坏卡分开计时）
+  整批：第一次运行（校验并写入隔离名单） vs 第二次运行（名单中的坏卡不再读取）
+并检查好卡两种加载方式得到的数据一致。原来的方式会放过截断在未解码块上的卡，校验会拒绝它们，
+所以“坏卡”按校验结果划分
+
+    python benchmarks/bench_validate.py -n 600 --bad-ratio 0.2
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from BodyDataAnalyzer import BodyDataAnalyzer
+from chara_loader import AiSyoujyoCharaData, KoikatuCharaData
+from chara_loader.validate import CardValidationError, validate_card
+from quarantine import Quarantine
+from synth_cards import train_synthetic_models, write_corpus
+
+
+def load_fallback(data):
+    """原来的加载方式：先按 AI少女 格式，失败再按恋活格式"""
+    try:
+        return AiSyoujyoCharaData.load(data)
+    except Exception:
+        return KoikatuCharaData.load(data)
+
+
+def corrupt(data, rng):
+    """截断块数据 / 改坏 lstInfo 中的数字 / 只剩 PNG"""
+    png_end = data.index(b"IEND") + 8
+    kind = rng.randrange(3)
+    if kind == 0:
+        return data[:rng.randrange(png_end + 200, len(data))]
+    if kind == 1:
+        i = data.index(b"lstInfo")
+        return data[:i + 20] + bytes(rng.randrange(256) for _ in range(40)) + data[i + 60:]
+    return data[:png_end]
+
+
+def timed(func, items, repeat=3):
+    """取 repeat 次中最快的一次，返回 (耗时, 失败数)"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        errors = 0
+        for item in items:
+            try:
+                func(item)
+            except Exception:
+                errors += 1
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="结构校验与坏卡隔离名单基准")
+    parser.add_argument("-n", "--count", type=int, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bad-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="bda_validate_")
+    try:
+        card_dir = os.path.join(workdir, "cards")
+        paths = write_corpus(card_dir, args.count, seed=args.seed)
+        for p in rng.sample(paths, int(len(paths) * args.bad_ratio)):
+            with open(p, "rb") as f:
+                data = f.read()
+            with open(p, "wb") as f:
+                f.write(corrupt(data, rng))
+        cards = []
+        for p in paths:
+            with open(p, "rb") as f:
+                cards.append(f.read())
+
+        analyzer = BodyDataAnalyzer(models=train_synthetic_models(os.path.join(workdir, "models")))
+        t_old, bad_old = timed(load_fallback, cards)
+        t_new, bad_new = timed(analyzer.load_character_bytes, cards)
+
+        good, bad = [], []
+        for data in cards:
+            try:
+                validate_card(data, analyzer.REQUIRED_BLOCKS)
+                good.append(data)
+            except CardValidationError:
+                bad.append(data)
+        old = [load_fallback(c).Custom.data for c in good]
+        assert old == [analyzer.load_character_bytes(c).Custom.data for c in good], "好卡加载结果不一致"
+        t_old_bad = timed(load_fallback, bad)[0]
+        t_new_bad = timed(analyzer.load_character_bytes, bad)[0]
+        t_old_good = timed(load_fallback, good)[0]
+        t_new_good = timed(analyzer.load_character_bytes, good)[0]
+
+        analyzer.quarantine = Quarantine(os.path.join(workdir, "quarantine.jsonl"))
+        start = time.perf_counter()
+        first = analyzer.batch_analyze(card_dir)
+        t_first = time.perf_counter() - start
+        start = time.perf_counter()
+        second = analyzer.batch_analyze(card_dir)
+        t_second = time.perf_counter() - start
+        quarantined = len(analyzer.quarantine)
+        analyzer.quarantine.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"卡片数: {args.count}  坏卡 {len(bad)} 张（隔离 {quarantined} 张）")
+    print(f"全部加载  两次尝试 {t_old:6.3f} s（失败 {bad_old}）   校验后直接加载 {t_new:6.3f} s（失败 {bad_new}）"
+          f"  ({t_old / t_new:.2f}x)")
+    print(f"  坏卡    两次尝试 {t_old_bad * 1e6 / len(bad):8.1f} us/张   校验 {t_new_bad * 1e6 / len(bad):8.1f} us/张"
+          f"  ({t_old_bad / t_new_bad:.1f}x)")
+    print(f"  好卡    两次尝试 {t_old_good * 1e6 / len(good):8.1f} us/张   校验 {t_new_good * 1e6 / len(good):8.1f} us/张")
+    print(f"整批分析  首次 {t_first:6.3f} s   有隔离名单的第二次 {t_second:6.3f} s")
+    ok = [r for r in first if r["success"]] == [r for r in second if r["success"]]
+    print(f"好卡结果一致: {ok}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+# -*- coding:utf-8 -*-
+"""
+合成角色卡生成器
+不依赖真实卡片，直接用加载器自带的 _make_bytes_header / _make_bytes_blockdata 写出
+结构合法的 AI少女 / 恋活 卡片字节，用于基准测试
+"""
+import importlib
+import os
+import random
+import struct
+import sys
+import zlib
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from msgpack import packb
+
+from chara_loader import AiSyoujyoCharaData, KoikatuCharaData
+from chara_loader.funcs import msg_pack
+
+# 包的 __init__ 用同名类覆盖了子模块属性，这里直接取模块本身以拿到各个块类
+ais_module = importlib.import_module("chara_loader.AiSyoujyoCharaData")
+kk_module = importlib.import_module("chara_loader.KoikatuCharaData")
+
+PNG_SIGNATURE = b"\x89\x50\x4e\x47\x0d\x0a\x1a\x0a"
+
+AIS_BODY_LEN = 33
+AIS_FACE_LEN = 59
+KK_BODY_LEN = 44
+KK_FACE_LEN = 52
+
+LAST_NAMES = ["佐藤", "鈴木", "高橋", "田中", "Smith", "李"]
+FIRST_NAMES = ["花子", "美咲", "さくら", "Alice", "小雪", "ユイ"]
+
+
+def rand_bytes(rng, n):
+    if n <= 0:
+        return b""
+    return rng.getrandbits(n * 8).to_bytes(n, "little")
+
+
+def _png_chunk(chunk_type, payload):
+    crc = zlib.crc32(chunk_type + payload) & 0xFFFFFFFF
+    return struct.pack(">I", len(payload)) + chunk_type + payload + struct.pack(">I", crc)
+
+
+def make_png(rng, size=4096, idat_chunk=8192):
+    """生成约 size 字节、按 idat_chunk 切分成多个 IDAT 的 PNG（只保证块结构合法）"""
+    chunks = [PNG_SIGNATURE, _png_chunk(b"IHDR", struct.pack(">IIBBBBB", 252, 352, 8, 2, 0, 0, 0))]
+    remaining = max(size, 1)
+    while remaining > 0:
+        n = min(idat_chunk, remaining)
+        chunks.append(_png_chunk(b"IDAT", rand_bytes(rng, n)))
+        remaining -= n
+    chunks.append(_png_chunk(b"IEND", b""))
+    return b"".join(chunks)
+
+
+def _shape_values(rng, length):
+    # 含少量超界 / 负值，模拟改过滑条上限的卡
+    return [round(rng.uniform(-0.2, 1.2) if rng.random() < 0.1 else rng.random(), 6) for _ in range(length)]
+
+
+def _pack_custom(face, body, hair):
+    data = []
+    for field in (face, body, hair):
+        serialized, length = msg_pack(field)
+        data.append(struct.pack("i", length))
+        data.append(serialized)
+    return b"".join(data)
+
+
+def _make_parameter(module, rng, fields, version, sjis_ratio):
+    if rng.random() < sjis_ratio:
+        # 旧工具写出的卡：字符串是 Shift-JIS 原始字节（msgpack str 类型），加载时走 msg_unpack 的回退解析；
+        # 用 UnknownBlockData 包装以便 serialize 时原样写出，不被重新打包成 bin 类型
+        fields = {k: v.encode("cp932") if isinstance(v, str) else v for k, v in fields.items()}
+        return module.UnknownBlockData("Parameter", packb(fields, use_bin_type=False), version)
+    return module.Parameter(packb(fields, use_bin_type=True), version)
+
+
+def _aesthetic_fields(rng):
+    return {
+        "bustSize": round(rng.uniform(0.4, 1.0), 4),
+        "waistSize": round(rng.uniform(0.4, 0.7), 4),
+        "hipSize": round(rng.uniform(0.5, 1.0), 4),
+        "bustSoftness": round(rng.random(), 4),
+        "muscle": round(rng.uniform(0.0, 0.7), 4),
+    }
+
+
+def make_ais_card(rng, image_size=4096, unknown_size=1024, kkex_size=0, sjis_ratio=0.2):
+    chara = AiSyoujyoCharaData()
+    chara.image = make_png(rng, image_size)
+    chara.product_no = 100
+    chara.header = "【AIS_Chara】".encode("utf-8")
+    chara.version = b"1.0.0"
+    chara.wtf = rand_bytes(rng, 78)
+
+    body = {"shapeValueBody": _shape_values(rng, AIS_BODY_LEN), "skinId": rng.randrange(10)}
+    face = {"shapeValueFace": _shape_values(rng, AIS_FACE_LEN), "headId": rng.randrange(5)}
+    hair = {"hairId": rng.randrange(20)}
+    chara.Custom = ais_module.Custom(_pack_custom(face, body, hair), "0.0.0")
+
+    lastname, firstname = rng.choice(LAST_NAMES), rng.choice(FIRST_NAMES)
+    param = {"fullname": lastname + firstname, "sex": 1}
+    param.update(_aesthetic_fields(rng))
+    chara.Parameter = _make_parameter(ais_module, rng, param, "0.0.1", sjis_ratio)
+    chara.Status = ais_module.Status(packb({"visibleBodyAlways": True}), "0.0.0")
+    chara.About = ais_module.About(packb({"dataID": "%032x" % rng.getrandbits(128)}), "0.0.0")
+    # AI少女 的加载器不解析 Coordinate，会作为未知块原样保留
+    chara.Coordinate = ais_module.UnknownBlockData("Coordinate", rand_bytes(rng, unknown_size), "0.0.0")
+    chara.blockdata = ["Custom", "Coordinate", "Parameter", "Status", "About"]
+    if kkex_size:
+        chara.KKEx = ais_module.KKEx(packb({"mod": rand_bytes(rng, kkex_size)}, use_bin_type=True), "0.0.0")
+        chara.blockdata.append("KKEx")
+    chara.unknown_blockdata = ["Coordinate"]
+    return chara
+
+
+def _pack_outfit(rng, accessory_count):
+    data = []
+    for field in (
+        {"clothesId": [rng.randrange(100) for _ in range(8)]},
+        {"parts": [{"type": rng.randrange(130), "id": rng.randrange(50)} for _ in range(accessory_count)]},
+    ):
+        serialized, length = msg_pack(field)
+        data.extend([struct.pack("i", length), serialized])
+    data.append(struct.pack("b", 1))
+    serialized, length = msg_pack({"lipColor": [rng.random() for _ in range(4)]})
+    data.extend([struct.pack("i", length), serialized])
+    return b"".join(data)
+
+
+def make_kk_card(rng, image_size=4096, unknown_size=1024, kkex_size=0, sjis_ratio=0.2,
+                 n_coordinates=7, accessory_count=20):
+    chara = KoikatuCharaData()
+    chara.image = make_png(rng, image_size)
+    chara.product_no = 100
+    chara.header = "【KoiKatuChara】".encode("utf-8")
+    chara.version = b"0.0.0"
+    chara.face_image = make_png(rng, max(image_size // 4, 64))
+
+    body = {"shapeValueBody": _shape_values(rng, KK_BODY_LEN), "bustSoftness": rng.random()}
+    face = {"shapeValueFace": _shape_values(rng, KK_FACE_LEN), "headId": rng.randrange(5)}
+    hair = {"kind": rng.randrange(3)}
+    chara.Custom = kk_module.Custom(_pack_custom(face, body, hair), "0.0.0")
+
+    outfits = [_pack_outfit(rng, accessory_count) for _ in range(n_coordinates)]
+    chara.Coordinate = kk_module.Coordinate(packb(outfits, use_bin_type=True), "0.0.0")
+
+    param = {
+        "lastname": rng.choice(LAST_NAMES),
+        "firstname": rng.choice(FIRST_NAMES),
+        "nickname": rng.choice(FIRST_NAMES),
+        "sex": 1,
+    }
+    param.update(_aesthetic_fields(rng))
+    chara.Parameter = _make_parameter(kk_module, rng, param, "0.0.5", sjis_ratio)
+    chara.Status = kk_module.Status(packb({"clothesState": [0] * 9}), "0.0.0")
+    chara.About = kk_module.About(packb({"version": "0.0.0"}), "0.0.0")
+    chara.Extended = kk_module.UnknownBlockData("Extended", rand_bytes(rng, unknown_size), "0.0.0")
+    chara.blockdata = ["Custom", "Coordinate", "Parameter", "Status", "About", "Extended"]
+    if kkex_size:
+        chara.KKEx = kk_module.KKEx(packb({"mod": rand_bytes(rng, kkex_size)}, use_bin_type=True), "0.0.0")
+        chara.blockdata.append("KKEx")
+    chara.unknown_blockdata = ["Extended"]
+    return chara
+
+
+def train_synthetic_model(save_path, n_features=AIS_BODY_LEN, samples=500, seed=0, n_estimators=300, max_depth=4):
+    """没有真实 height_xgb.pkl 时，训练一个同结构的小模型供基准测试使用（加大 n_estimators / max_depth 模拟大模型）"""
+    import joblib
+    import numpy as np
+    import xgboost as xgb
+
+    rng = np.random.RandomState(seed)
+    X = rng.uniform(-0.2, 1.2, size=(samples, n_features))
+    # shapeValueBody[0] 是身高滑条
+    y = 130 + 40 * X[:, 0] + 5 * X[:, 1:].mean(axis=1)
+    model = xgb.XGBRegressor(n_estimators=n_estimators, max_depth=max_depth, learning_rate=0.05, random_state=seed)
+    model.fit(X, y)
+    joblib.dump(model, save_path)
+    return save_path
+
+
+def train_synthetic_models(directory, **kwargs):
+    """
+    AI少女（33 维）和恋活（44 维）各训练一个模型，返回 BodyDataAnalyzer(models=...) 用的配置
+    {"*": AI少女模型, "Koikatu": 恋活模型}；只用一个 33 维模型时恋活卡会全部在 predict 处失败。
+    kwargs 透传给 train_synthetic_model
+    """
+    os.makedirs(directory, exist_ok=True)
+    return {
+        "*": train_synthetic_model(os.path.join(directory, "height_ais.pkl"), n_features=AIS_BODY_LEN, **kwargs),
+        "Koikatu": train_synthetic_model(os.path.join(directory, "height_kk.pkl"), n_features=KK_BODY_LEN, **kwargs),
+    }
+
+
+def generate_corpus(count, seed=0, kk_ratio=0.3, **kwargs):
+    """
+    逐张生成 (文件名, 卡片字节)，同一 seed 结果完全一致
+    kwargs 透传给 make_ais_card / make_kk_card（image_size, unknown_size, kkex_size, ...）
+    """
+    rng = random.Random(seed)
+    for i in range(count):
+        if rng.random() < kk_ratio:
+            chara = make_kk_card(rng, **kwargs)
+            yield "kk_{:06d}.png".format(i), bytes(chara)
+        else:
+            ais_kwargs = {k: v for k, v in kwargs.items() if k not in ("n_coordinates", "accessory_count")}
+            chara = make_ais_card(rng, **ais_kwargs)
+            yield "ais_{:06d}.png".format(i), bytes(chara)
+
+
+def write_corpus(directory, count, seed=0, **kwargs):
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for fname, data in generate_corpus(count, seed=seed, **kwargs):
+        path = os.path.join(directory, fname)
+        with open(path, "wb") as f:
+            f.write(data)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="生成合成角色卡语料")
+    parser.add_argument("output_dir")
+    parser.add_argument("-n", "--count", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--kk-ratio", type=float, default=0.3)
+    parser.add_argument("--image-size", type=int, default=4096)
+    parser.add_argument("--unknown-size", type=int, default=1024)
+    parser.add_argument("--kkex-size", type=int, default=0)
+    args = parser.parse_args()
+    paths = write_corpus(
+        args.output_dir, args.count, seed=args.seed, kk_ratio=args.kk_ratio,
+        image_size=args.image_size, unknown_size=args.unknown_size, kkex_size=args.kkex_size,
+    )
+    print(f"已生成 {len(paths)} 张卡片到 {args.output_dir}")
@@ -5,7 +5,8 @@ import io
 import json
 import struct
 
-from .funcs import get_png, load_length, load_type, msg_pack, msg_unpack
+from .funcs import get_png, load_length, load_type, locate_png, msg_pack, msg_unpack
+from .profiler import PROFILER
 
 
 def bin_to_str(serial):
@@ -16,23 +17,25 @@ def bin_to_str(serial):
 
 
 class AiSyoujyoCharaData:
-    def __init__(self):
-        self.modules = {
-            "Custom": Custom,
-            # "Coordinate": Coordinate,
-            "Parameter": Parameter,
-            "Status": Status,
-            "About": About,
-            "KKEx": KKEx,
-        }
+    # 块名 -> 解析类，所有实例共享（在文件末尾块类定义之后填充）
+    modules = {}
+    # 分析用不到的块，keep_unknown=False 时按未知块处理
+    SKIPPABLE_BLOCKS = ("KKEx",)
 
     @classmethod
-    def load(cls, filelike, contains_png=True):
+    def load(cls, filelike, contains_png=True, keep_image=True, keep_unknown=True):
+        """
+        keep_image=False: 跳过缩略图不保存（self.image 为 None），只在 self.image_span 记录 (偏移, 长度)
+        keep_unknown=False: 未知块和 SKIPPABLE_BLOCKS（插件扩展数据）只记录名字和版本，不保留也不解码数据
+        两者都关闭时得到只够分析用的轻量对象，不能再 save()
+        """
         kc = cls()
 
         if isinstance(filelike, str):
-            with open(filelike, "br") as f:
-                data = f.read()
+            with PROFILER.stage("read"):
+                with open(filelike, "br") as f:
+                    data = f.read()
+            PROFILER.count("bytes_read", len(data))
             data_stream = io.BytesIO(data)
 
         elif isinstance(filelike, bytes):
@@ -44,15 +47,24 @@ class AiSyoujyoCharaData:
         else:
             ValueError("unsupported input. type:{}".format(type(filelike)))
 
-        kc._load_header(data_stream, contains_image=contains_png)
-        kc._load_blockdata(data_stream)
+        with PROFILER.stage("header"):
+            kc._load_header(data_stream, contains_image=contains_png, keep_image=keep_image)
+        with PROFILER.stage("blockdata"):
+            kc._load_blockdata(data_stream, keep_unknown=keep_unknown)
 
         return kc
 
     def _load_header(self, data, **kwargs):
         self.image = None
+        self.image_span = None
         if "contains_image" in kwargs and kwargs["contains_image"]:
-            self.image = get_png(data)
+            with PROFILER.stage("get_png"):
+                if kwargs.get("keep_image", True):
+                    offset = data.tell()
+                    self.image = get_png(data)
+                    self.image_span = (offset, len(self.image))
+                else:
+                    self.image_span = locate_png(data)
 
         self.product_no = load_type(data, "i")  # 100
         self.header = load_length(data, "b")  # 【AIS_Chara】
@@ -61,7 +73,7 @@ class AiSyoujyoCharaData:
 
         # self.face_image = load_length(data, "i")
 
-    def _load_blockdata(self, data):
+    def _load_blockdata(self, data, keep_unknown=True):
         lstinfo_index = msg_unpack(load_length(data, "i"))
         lstinfo_raw = load_length(data, "q")
 
@@ -72,13 +84,13 @@ class AiSyoujyoCharaData:
             pos = i["pos"]
             size = i["size"]
             version = i["version"]
-            data = lstinfo_raw[pos : pos + size]
 
             self.blockdata.append(name)
-            if name in self.modules.keys():
+            if name in self.modules.keys() and (keep_unknown or name not in self.SKIPPABLE_BLOCKS):
                 # print(name)
-                setattr(self, name, self.modules[name](data, version))
+                setattr(self, name, self.modules[name](lstinfo_raw[pos : pos + size], version))
             else:
+                data = lstinfo_raw[pos : pos + size] if keep_unknown else None
                 setattr(self, name, UnknownBlockData(name, data, version))
                 self.unknown_blockdata.append(name)
 
@@ -355,3 +367,15 @@ class UnknownBlockData(BlockData):
 
     def prettify(self):
         return self.data
+
+
+AiSyoujyoCharaData.modules.update(
+    {
+        "Custom": Custom,
+        # "Coordinate": Coordinate,
+        "Parameter": Parameter,
+        "Status": Status,
+        "About": About,
+        "KKEx": KKEx,
+    }
+)
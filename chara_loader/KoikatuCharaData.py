@@ -4,8 +4,10 @@ import base64
 import io
 import json
 import struct
+from collections.abc import MutableSequence
 
-from .funcs import get_png, load_length, load_type, msg_pack, msg_unpack
+from .funcs import get_png, load_length, load_type, locate_png, msg_pack, msg_unpack
+from .profiler import PROFILER
 
 
 def bin_to_str(serial):
@@ -16,23 +18,26 @@ def bin_to_str(serial):
 
 
 class KoikatuCharaData:
-    def __init__(self):
-        self.modules = {
-            "Custom": Custom,
-            "Coordinate": Coordinate,
-            "Parameter": Parameter,
-            "Status": Status,
-            "About": About,
-            "KKEx": KKEx,
-        }
+    # 块名 -> 解析类，所有实例共享（在文件末尾块类定义之后填充）
+    modules = {}
+    # 分析用不到的块，keep_unknown=False 时按未知块处理
+    SKIPPABLE_BLOCKS = ("KKEx",)
 
     @classmethod
-    def load(cls, filelike, contains_png=True):
+    def load(cls, filelike, contains_png=True, keep_image=True, keep_unknown=True):
+        """
+        keep_image=False: 跳过缩略图和头像不保存（self.image / self.face_image 为 None），
+                          只在 self.image_span / self.face_image_span 记录 (偏移, 长度)
+        keep_unknown=False: 未知块和 SKIPPABLE_BLOCKS（插件扩展数据）只记录名字和版本，不保留也不解码数据
+        两者都关闭时得到只够分析用的轻量对象，不能再 save()
+        """
         kc = cls()
 
         if isinstance(filelike, str):
-            with open(filelike, "br") as f:
-                data = f.read()
+            with PROFILER.stage("read"):
+                with open(filelike, "br") as f:
+                    data = f.read()
+            PROFILER.count("bytes_read", len(data))
             data_stream = io.BytesIO(data)
 
         elif isinstance(filelike, bytes):
@@ -44,22 +49,37 @@ class KoikatuCharaData:
         else:
             ValueError("unsupported input. type:{}".format(type(filelike)))
 
-        kc._load_header(data_stream, contains_image=contains_png)
-        kc._load_blockdata(data_stream)
+        with PROFILER.stage("header"):
+            kc._load_header(data_stream, contains_image=contains_png, keep_image=keep_image)
+        with PROFILER.stage("blockdata"):
+            kc._load_blockdata(data_stream, keep_unknown=keep_unknown)
 
         return kc
 
     def _load_header(self, data, **kwargs):
         self.image = None
+        self.image_span = None
         if "contains_image" in kwargs and kwargs["contains_image"]:
-            self.image = get_png(data)
+            with PROFILER.stage("get_png"):
+                if kwargs.get("keep_image", True):
+                    offset = data.tell()
+                    self.image = get_png(data)
+                    self.image_span = (offset, len(self.image))
+                else:
+                    self.image_span = locate_png(data)
 
         self.product_no = load_type(data, "i")  # 100
         self.header = load_length(data, "b")  # 【KoiKatuChara】
         self.version = load_length(data, "b")  # 0.0.0
-        self.face_image = load_length(data, "i")
+        face_length = load_type(data, "i")
+        self.face_image_span = (data.tell(), face_length)
+        if kwargs.get("keep_image", True):
+            self.face_image = data.read(face_length)
+        else:
+            self.face_image = None
+            data.seek(face_length, io.SEEK_CUR)
 
-    def _load_blockdata(self, data):
+    def _load_blockdata(self, data, keep_unknown=True):
         lstinfo_index = msg_unpack(load_length(data, "i"))
         lstinfo_raw = load_length(data, "q")
 
@@ -70,12 +90,12 @@ class KoikatuCharaData:
             pos = i["pos"]
             size = i["size"]
             version = i["version"]
-            data = lstinfo_raw[pos : pos + size]
 
             self.blockdata.append(name)
-            if name in self.modules.keys():
-                setattr(self, name, self.modules[name](data, version))
+            if name in self.modules.keys() and (keep_unknown or name not in self.SKIPPABLE_BLOCKS):
+                setattr(self, name, self.modules[name](lstinfo_raw[pos : pos + size], version))
             else:
+                data = lstinfo_raw[pos : pos + size] if keep_unknown else None
                 setattr(self, name, UnknownBlockData(name, data, version))
                 self.unknown_blockdata.append(name)
 
@@ -156,9 +176,10 @@ class KoikatuCharaData:
         if "include_image" in kwargs and kwargs["include_image"]:
             if self.image:
                 data.update({"image": base64.b64encode(self.image).decode("ascii")})
-            data.update(
-                {"face_image": base64.b64encode(self.face_image).decode("ascii")}
-            )
+            if self.face_image is not None:
+                data.update(
+                    {"face_image": base64.b64encode(self.face_image).decode("ascii")}
+                )
         return data
 
     def __str__(self):
@@ -234,6 +255,94 @@ class Custom(BlockData):
         return serialized, self.name, self.version
 
 
+def decode_outfit(raw):
+    """Coordinate 0.0.0 中一套服装的字节 -> {clothes, accessory, enableMakeup, makeup}"""
+    data_stream = io.BytesIO(raw)
+    return {
+        "clothes": msg_unpack(load_length(data_stream, "i")),
+        "accessory": msg_unpack(load_length(data_stream, "i")),
+        "enableMakeup": bool(load_type(data_stream, "b")),
+        "makeup": msg_unpack(load_length(data_stream, "i")),
+    }
+
+
+def encode_outfit(outfit):
+    c = []
+    pack = struct.Struct("i")
+
+    serialized, length = msg_pack(outfit["clothes"])
+    c.extend([pack.pack(length), serialized])
+
+    serialized, length = msg_pack(outfit["accessory"])
+    c.extend([pack.pack(length), serialized])
+
+    c.append(struct.pack("b", outfit["enableMakeup"]))
+
+    serialized, length = msg_pack(outfit["makeup"])
+    c.extend([pack.pack(length), serialized])
+
+    return b"".join(c)
+
+
+class LazyOutfits(MutableSequence):
+    """
+    Coordinate 0.0.0 的服装列表：加载时只拆出每套服装的原始字节，按下标访问时才解码并缓存；
+    访问过的服装视为可能被修改，serialize 时重新打包，没访问过的原样写回
+    """
+
+    __slots__ = ("_raw", "_decoded")
+
+    def __init__(self, raw_outfits):
+        self._raw = list(raw_outfits)
+        self._decoded = [None] * len(self._raw)
+
+    def __len__(self):
+        return len(self._raw)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        outfit = self._decoded[index]
+        if outfit is None:
+            with PROFILER.stage("outfit_decode"):
+                outfit = self._decoded[index] = decode_outfit(self._raw[index])
+        return outfit
+
+    def __setitem__(self, index, outfit):
+        if isinstance(index, slice):
+            # 切片赋值可能改变长度：_raw 同步换成占位，新服装都算已解码
+            outfits = list(outfit)
+            self._decoded[index] = outfits
+            self._raw[index] = [None] * len(outfits)
+            return
+        self._decoded[index] = outfit
+
+    def __delitem__(self, index):
+        del self._raw[index]
+        del self._decoded[index]
+
+    def insert(self, index, outfit):
+        self._raw.insert(index, None)
+        self._decoded.insert(index, outfit)
+
+    def is_decoded(self, index):
+        return self._decoded[index] is not None
+
+    def raw(self, index):
+        """第 index 套服装的字节：没解码过的直接返回原始字节"""
+        outfit = self._decoded[index]
+        return self._raw[index] if outfit is None else encode_outfit(outfit)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, LazyOutfits)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return "LazyOutfits({} outfits, {} decoded)".format(
+            len(self), sum(c is not None for c in self._decoded))
+
+
 class Coordinate(BlockData):
     def __init__(self, data, version):
         self.name = "Coordinate"
@@ -242,16 +351,8 @@ class Coordinate(BlockData):
             return
 
         if version == "0.0.0":
-            self.data = []
-            for c in msg_unpack(data):
-                data_stream = io.BytesIO(c)
-                c = {
-                    "clothes": msg_unpack(load_length(data_stream, "i")),
-                    "accessory": msg_unpack(load_length(data_stream, "i")),
-                    "enableMakeup": bool(load_type(data_stream, "b")),
-                    "makeup": msg_unpack(load_length(data_stream, "i")),
-                }
-                self.data.append(c)
+            # 只拆外层数组，各套服装在被访问时才解码
+            self.data = LazyOutfits(msg_unpack(data))
 
         # エモクリのキャラデータはこのバージョン
         elif version == "0.0.1":
@@ -263,23 +364,10 @@ class Coordinate(BlockData):
 
     def serialize(self):
         if self.version == "0.0.0":
-            data = []
-            for i in self.data:
-                c = []
-                pack = struct.Struct("i")
-
-                serialized, length = msg_pack(i["clothes"])
-                c.extend([pack.pack(length), serialized])
-
-                serialized, length = msg_pack(i["accessory"])
-                c.extend([pack.pack(length), serialized])
-
-                c.append(struct.pack("b", i["enableMakeup"]))
-
-                serialized, length = msg_pack(i["makeup"])
-                c.extend([pack.pack(length), serialized])
-
-                data.append(b"".join(c))
+            if isinstance(self.data, LazyOutfits):
+                data = [self.data.raw(i) for i in range(len(self.data))]
+            else:
+                data = [encode_outfit(i) for i in self.data]
             serialized_all, _ = msg_pack(data)
 
         elif self.version == "0.0.1":
@@ -293,6 +381,11 @@ class Coordinate(BlockData):
 
         return serialized_all, self.name, self.version
 
+    def jsonalizable(self):
+        if isinstance(self.data, LazyOutfits):
+            return list(self.data)
+        return self.data
+
 
 class Parameter(BlockData):
     def __init__(self, data, version):
@@ -331,3 +424,15 @@ class UnknownBlockData(BlockData):
 
     def prettify(self):
         return self.data
+
+
+KoikatuCharaData.modules.update(
+    {
+        "Custom": Custom,
+        "Coordinate": Coordinate,
+        "Parameter": Parameter,
+        "Status": Status,
+        "About": About,
+        "KKEx": KKEx,
+    }
+)
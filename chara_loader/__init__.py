@@ -1,2 +1,4 @@
 from .AiSyoujyoCharaData import AiSyoujyoCharaData
-from .KoikatuCharaData import KoikatuCharaData
\ No newline at end of file
+from .KoikatuCharaData import KoikatuCharaData
+from .profiler import PROFILER, Profiler
+from .compact import CompactAiSyoujyoCharaData, CompactKoikatuCharaData
@@ -0,0 +1,218 @@
+# -*- coding:utf-8 -*-
+"""
+紧凑版角色卡对象：卡片和块都用 __slots__，块解析类注册表在类上共享，
+未知块保存为指向同一块数据缓冲区的 memoryview，不再逐块复制字节。
+__getitem__ / serialize / jsonalizable / save 等行为与普通版一致，适合在内存中常驻大量卡片。
+"""
+import importlib
+import sys
+
+from .funcs import load_length, msg_unpack
+
+# 包的 __init__ 用同名类覆盖了子模块属性，这里取回模块本身
+_ais = importlib.import_module(".AiSyoujyoCharaData", __package__)
+_kk = importlib.import_module(".KoikatuCharaData", __package__)
+
+
+class CompactBlockData:
+    __slots__ = ("name", "data", "version")
+
+    def __init__(self, name="Blockdata", data=None, version="1.0.0"):
+        self.name = name
+        self.data = msg_unpack(data)
+        self.version = version
+
+    serialize = _ais.BlockData.serialize
+    jsonalizable = _ais.BlockData.jsonalizable
+    __getitem__ = _ais.BlockData.__getitem__
+    __setitem__ = _ais.BlockData.__setitem__
+    __delitem__ = _ais.BlockData.__delitem__
+    prettify = _ais.BlockData.prettify
+    __str__ = _ais.BlockData.__str__
+
+
+def _named_block(name):
+    def __init__(self, data, version):
+        CompactBlockData.__init__(self, name=name, data=data, version=version)
+
+    return type("Compact" + name, (CompactBlockData,), {"__slots__": (), "__init__": __init__})
+
+
+class CompactCustom(CompactBlockData):
+    __slots__ = ()
+    fields = _ais.Custom.fields
+
+    __init__ = _ais.Custom.__init__
+    serialize = _ais.Custom.serialize
+
+
+class CompactCoordinate(CompactBlockData):
+    """服装列表同普通版一样按需解码（LazyOutfits 本身也是 __slots__ 对象）"""
+
+    __slots__ = ()
+
+    __init__ = _kk.Coordinate.__init__
+    serialize = _kk.Coordinate.serialize
+    jsonalizable = _kk.Coordinate.jsonalizable
+
+
+class CompactUnknownBlockData:
+    """
+    未知块只记录它在整张卡共享缓冲区中的偏移和长度，访问 data 时才生成 memoryview，
+    serialize / jsonalizable 时才转成 bytes
+    """
+
+    __slots__ = ("name", "version", "_buf", "_start", "_stop")
+
+    def __init__(self, name, data, version):
+        self.name = name
+        self.version = version
+        self.data = data
+
+    @property
+    def data(self):
+        if self._buf is None:
+            return None
+        return memoryview(self._buf)[self._start : self._stop]
+
+    @data.setter
+    def data(self, value):
+        self._set_buffer(value, 0, None if value is None else len(value))
+
+    def _set_buffer(self, buf, start, stop):
+        self._buf = buf
+        self._start = start
+        self._stop = stop
+
+    def serialize(self):
+        return self.jsonalizable(), self.name, self.version
+
+    def jsonalizable(self):
+        if self._buf is None:
+            return None
+        return bytes(self._buf[self._start : self._stop])
+
+    __getitem__ = _ais.UnknownBlockData.__getitem__
+    __setitem__ = _ais.UnknownBlockData.__setitem__
+
+    def prettify(self):
+        return self.jsonalizable()
+
+    __str__ = _ais.BlockData.__str__
+
+
+CompactParameter = _named_block("Parameter")
+CompactStatus = _named_block("Status")
+CompactAbout = _named_block("About")
+CompactKKEx = _named_block("KKEx")
+
+
+class _CompactCharaData:
+    """
+    常见块名直接占用 slot，仍可用 chara.Custom / chara["Custom"] 访问；
+    其他块名放进按需创建的 _extra 字典
+    """
+
+    __slots__ = (
+        "image", "image_span", "product_no", "header", "version", "blockdata", "unknown_blockdata",
+        "Custom", "Coordinate", "Parameter", "Status", "About", "KKEx", "_extra",
+    )
+    modules = {}
+    SKIPPABLE_BLOCKS = _ais.AiSyoujyoCharaData.SKIPPABLE_BLOCKS
+
+    def __getattr__(self, name):
+        # 只有常规属性查找失败时才会走到这里
+        try:
+            return object.__getattribute__(self, "_extra")[name]
+        except (AttributeError, KeyError):
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        try:
+            object.__setattr__(self, name, value)
+        except AttributeError:
+            try:
+                extra = object.__getattribute__(self, "_extra")
+            except AttributeError:
+                extra = {}
+                object.__setattr__(self, "_extra", extra)
+            extra[name] = value
+
+    def _load_blockdata(self, data, keep_unknown=True):
+        lstinfo_index = msg_unpack(load_length(data, "i"))
+        lstinfo_raw = load_length(data, "q")
+
+        self.unknown_blockdata = []
+        self.blockdata = []
+        unknown = []
+        for i in lstinfo_index["lstInfo"]:
+            # 块名和版本号在所有卡之间重复出现，驻留后只存一份
+            name = sys.intern(i["name"])
+            pos = i["pos"]
+            size = i["size"]
+            version = sys.intern(i["version"])
+
+            self.blockdata.append(name)
+            if name in self.modules and (keep_unknown or name not in self.SKIPPABLE_BLOCKS):
+                setattr(self, name, self.modules[name](lstinfo_raw[pos : pos + size], version))
+            else:
+                block = CompactUnknownBlockData(name, None, version)
+                setattr(self, name, block)
+                self.unknown_blockdata.append(name)
+                if keep_unknown:
+                    unknown.append((block, pos, size))
+
+        # 所有未知块拷进同一个缓冲区，各块只记录偏移；已解析块的原始字节不随之保留
+        if unknown:
+            shared = b"".join(lstinfo_raw[pos : pos + size] for _, pos, size in unknown)
+            offset = 0
+            for block, _, size in unknown:
+                block._set_buffer(shared, offset, offset + size)
+                offset += size
+
+
+class CompactAiSyoujyoCharaData(_CompactCharaData):
+    __slots__ = ("wtf",)
+    modules = {
+        "Custom": CompactCustom,
+        "Parameter": CompactParameter,
+        "Status": CompactStatus,
+        "About": CompactAbout,
+        "KKEx": CompactKKEx,
+    }
+
+    load = classmethod(_ais.AiSyoujyoCharaData.load.__func__)
+    _load_header = _ais.AiSyoujyoCharaData._load_header
+    __bytes__ = _ais.AiSyoujyoCharaData.__bytes__
+    _make_bytes_header = _ais.AiSyoujyoCharaData._make_bytes_header
+    _make_bytes_blockdata = _ais.AiSyoujyoCharaData._make_bytes_blockdata
+    save = _ais.AiSyoujyoCharaData.save
+    save_json = _ais.AiSyoujyoCharaData.save_json
+    _make_dict_header = _ais.AiSyoujyoCharaData._make_dict_header
+    __str__ = _ais.AiSyoujyoCharaData.__str__
+    __getitem__ = _ais.AiSyoujyoCharaData.__getitem__
+    __setitem__ = _ais.AiSyoujyoCharaData.__setitem__
+
+
+class CompactKoikatuCharaData(_CompactCharaData):
+    __slots__ = ("face_image", "face_image_span")
+    modules = {
+        "Custom": CompactCustom,
+        "Coordinate": CompactCoordinate,
+        "Parameter": CompactParameter,
+        "Status": CompactStatus,
+        "About": CompactAbout,
+        "KKEx": CompactKKEx,
+    }
+
+    load = classmethod(_kk.KoikatuCharaData.load.__func__)
+    _load_header = _kk.KoikatuCharaData._load_header
+    __bytes__ = _kk.KoikatuCharaData.__bytes__
+    _make_bytes_header = _kk.KoikatuCharaData._make_bytes_header
+    _make_bytes_blockdata = _kk.KoikatuCharaData._make_bytes_blockdata
+    save = _kk.KoikatuCharaData.save
+    save_json = _kk.KoikatuCharaData.save_json
+    _make_dict_header = _kk.KoikatuCharaData._make_dict_header
+    __str__ = _kk.KoikatuCharaData.__str__
+    __getitem__ = _kk.KoikatuCharaData.__getitem__
+    __setitem__ = _kk.KoikatuCharaData.__setitem__
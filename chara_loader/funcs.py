@@ -1,7 +1,17 @@
+import io
 import struct
+import threading
+import time
+from contextlib import contextmanager
 
 from msgpack import packb, unpackb
 
+from .profiler import PROFILER
+
+
+PNG_SIGNATURE = b"\x89\x50\x4e\x47\x0d\x0a\x1a\x0a"
+_CHUNK_HEADER = struct.Struct(">I4s")
+
 
 def load_length(data_stream, struct_type):
     length = struct.unpack(struct_type, data_stream.read(struct.calcsize(struct_type)))[
@@ -42,12 +52,44 @@ def write_string(data_stream, value):
     data_stream.write(value)
 
 
+class DecodeTimeout(TimeoutError):
+    """单张卡的解码超过了 decode_deadline 设定的时限"""
+
+
+_deadline = threading.local()
+
+
+@contextmanager
+def decode_deadline(seconds):
+    """
+    在当前线程的这个上下文里，msg_unpack（包括回退解析的每一层递归）累计用掉 seconds 秒 CPU 时间后抛
+    DecodeTimeout；seconds 为 None / 0 时不限时。按本线程的 CPU 时间计，机器繁忙、进程数多于核数时
+    不会误判；只在 msg_unpack 入口检查，一次 unpackb 内部的耗时无法打断
+    """
+    previous = getattr(_deadline, "at", None), getattr(_deadline, "seconds", None)
+    _deadline.at = time.thread_time() + seconds if seconds else None
+    _deadline.seconds = seconds
+    try:
+        yield
+    finally:
+        _deadline.at, _deadline.seconds = previous
+
+
+def check_deadline():
+    at = getattr(_deadline, "at", None)
+    if at is not None and time.thread_time() > at:
+        PROFILER.count("decode_timeouts")
+        raise DecodeTimeout("decode deadline of {}s exceeded".format(_deadline.seconds))
+
+
 def msg_unpack(data):
+    check_deadline()
     try:
         # 首先尝试标准解析方式
         return unpackb(data, raw=False, strict_map_key=False)
     except Exception:
         # 如果标准方式失败，尝试用raw=True解析，然后手动处理字符串
+        PROFILER.count("msg_unpack_fallback")
         try:
             result = unpackb(data, raw=True, strict_map_key=False)
             # 递归处理可能的二进制字符串
@@ -68,8 +110,11 @@ def msg_unpack(data):
                         for item in result]
             else:
                 return result
+        except DecodeTimeout:
+            raise
         except Exception:
             # 如果所有尝试都失败，返回原始数据
+            PROFILER.count("msg_unpack_failed")
             return data
 
 
@@ -79,29 +124,54 @@ def msg_pack(data):
 
 
 def get_png_length(png_data, orig=0):
-    idx = orig
-    assert png_data[idx : idx + 8] == b"\x89\x50\x4e\x47\x0d\x0a\x1a\x0a"
-
-    idx += 8
+    return find_png_end(png_data, orig) - orig
+
+
+def find_png_end(buf, start=0):
+    """
+    在 bytes / memoryview 中定位从 start 开始的 PNG 的结束位置（IEND 块之后）
+    只用 unpack_from 读每个块的 8 字节块头，按长度跳过块数据，不产生任何拷贝；
+    耗时只和块数有关，与图像大小无关
+    """
+    assert bytes(buf[start : start + 8]) == PNG_SIGNATURE
+    unpack_from = _CHUNK_HEADER.unpack_from
+    idx = start + 8
     while True:
-        chunk_len = struct.unpack(">I", png_data[idx : idx + 4])[0]
-        chunk_type = png_data[idx + 4 : idx + 8].decode()
-        idx += chunk_len + 12
-        if chunk_type == "IEND":
-            break
-    return idx - orig
+        length, chunk_type = unpack_from(buf, idx)
+        idx += length + 12
+        if chunk_type == b"IEND":
+            if idx > len(buf):
+                raise struct.error("PNG truncated before end of IEND chunk")
+            return idx
 
 
-def get_png(data_stream):
+def locate_png(data_stream):
+    """
+    只记录 PNG 的 (起始偏移, 长度) 并把流移到 PNG 之后，不拷贝图像
+    BytesIO 上直接在底层 bytes 上遍历块头（getvalue() 对未修改的 BytesIO 不拷贝；
+    getbuffer() 反而会强制复制一份共享缓冲区）；普通文件句柄逐块读块头并 seek 跳过块数据
+    """
     origin_pos = data_stream.tell()
-    assert data_stream.read(8) == b"\x89\x50\x4e\x47\x0d\x0a\x1a\x0a"
-    while True:
-        length = load_type(data_stream, ">I")
-        chunk_type = data_stream.read(4)
-        data_stream.read(length + 4)
-        if chunk_type == b"IEND":
-            break
-    end_pos = data_stream.tell()
+    if isinstance(data_stream, io.BytesIO):
+        end_pos = find_png_end(data_stream.getvalue(), origin_pos)
+    else:
+        assert data_stream.read(8) == PNG_SIGNATURE
+        while True:
+            length, chunk_type = _CHUNK_HEADER.unpack(data_stream.read(8))
+            data_stream.seek(length + 4, 1)
+            if chunk_type == b"IEND":
+                break
+        end_pos = data_stream.tell()
+    data_stream.seek(end_pos)
+    return origin_pos, end_pos - origin_pos
+
+
+def skip_png(data_stream):
+    """跳过 PNG 部分但不保留图像数据，返回图像长度"""
+    return locate_png(data_stream)[1]
+
+
+def get_png(data_stream):
+    origin_pos, length = locate_png(data_stream)
     data_stream.seek(origin_pos)
-    png_data = data_stream.read(end_pos - origin_pos)
-    return png_data
+    return data_stream.read(length)
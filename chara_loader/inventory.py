@@ -0,0 +1,143 @@
+# -*- coding:utf-8 -*-
+"""
+只读头部和 lstInfo 索引的卡片盘点：跳过 PNG、解析头部和块索引后即停止，
+块数据本身（lstinfo_raw）不读入内存；文件句柄上直接 seek 跳过
+
+    python -m chara_loader.inventory <目录> [--output inventory.jsonl]
+"""
+import io
+import json
+import os
+import struct
+from collections import Counter
+
+from .funcs import load_length, load_type, msg_unpack, skip_png
+from .profiler import PROFILER
+
+
+def detect_format(header):
+    """根据头部字符串判断卡片布局：恋活系（带 face_image）或 AI少女系（带 78 字节附加数据）"""
+    if b"KoiKatu" in header or b"EroMake" in header:
+        return "Koikatu"
+    return "AiSyoujyo"
+
+
+def read_inventory(filelike, contains_png=True):
+    """
+    返回卡片的格式、product_no、版本和块索引，不解码任何块
+    filelike 可以是路径、bytes 或已打开的二进制文件对象
+    """
+    if isinstance(filelike, str):
+        with open(filelike, "rb") as f:
+            return read_inventory(f, contains_png=contains_png)
+    if isinstance(filelike, (bytes, bytearray, memoryview)):
+        filelike = io.BytesIO(filelike)
+
+    data = filelike
+    start = data.tell()
+    with PROFILER.stage("inventory"):
+        image_size = skip_png(data) if contains_png else 0
+        product_no = load_type(data, "i")
+        header = load_length(data, "b")
+        version = load_length(data, "b")
+        fmt = detect_format(header)
+        if fmt == "Koikatu":
+            face_size = load_type(data, "i")
+            data.seek(face_size, 1)
+        else:
+            data.seek(78, 1)
+
+        lstinfo_index = msg_unpack(load_length(data, "i"))
+        raw_size = load_type(data, "q")
+        data_pos = data.tell()
+        # 只移动位置、不读块数据；seek 越过文件末尾不会报错，所以再看一下实际终点
+        data.seek(raw_size, 1)
+        end = data.seek(0, io.SEEK_END)
+
+    blocks = [
+        {"name": i["name"], "version": i["version"], "pos": i["pos"], "size": i["size"]}
+        for i in lstinfo_index["lstInfo"]
+    ]
+    return {
+        "format": fmt,
+        "product_no": product_no,
+        "header": header.decode("utf-8", errors="replace"),
+        "version": version.decode("utf-8", errors="replace"),
+        "image_size": image_size,
+        "blocks": blocks,
+        "blockdata_size": raw_size,
+        "truncated": data_pos + raw_size > end,
+        "file_size": end - start,
+    }
+
+
+def iter_inventory(root, suffix=".png"):
+    """递归遍历目录，逐张产出 (路径, 盘点结果或异常)"""
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.lower().endswith(suffix):
+                    try:
+                        yield entry.path, read_inventory(entry.path)
+                    except (AssertionError, struct.error, ValueError, KeyError, TypeError, OSError) as e:
+                        PROFILER.count("inventory_errors")
+                        yield entry.path, e
+
+
+def summarize(items):
+    """统计格式、块类型和块版本的数量；items 可以是任意迭代器，不会整体保存"""
+    formats = Counter()
+    block_types = Counter()
+    block_versions = Counter()
+    errors = 0
+    for _, inv in items:
+        if isinstance(inv, Exception):
+            errors += 1
+            continue
+        formats["{} {}".format(inv["format"], inv["version"])] += 1
+        for b in inv["blocks"]:
+            block_types[b["name"]] += 1
+            block_versions["{} {}".format(b["name"], b["version"])] += 1
+    return {"formats": formats, "block_types": block_types,
+            "block_versions": block_versions, "errors": errors}
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="角色卡库盘点（只读头部和块索引）")
+    parser.add_argument("root", help="角色卡目录（递归）")
+    parser.add_argument("--output", default=None, help="逐张结果写入 JSONL 文件")
+    args = parser.parse_args()
+
+    def write_through(items, out):
+        for path, inv in items:
+            if out:
+                record = {"file_path": path}
+                if isinstance(inv, Exception):
+                    record["error"] = "{}: {}".format(type(inv).__name__, inv)
+                else:
+                    record.update(inv)
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            yield path, inv
+
+    start = time.perf_counter()
+    out = open(args.output, "w", encoding="utf-8") if args.output else None
+    try:
+        summary = summarize(write_through(iter_inventory(args.root), out))
+    finally:
+        if out:
+            out.close()
+    elapsed = time.perf_counter() - start
+
+    total = sum(summary["formats"].values()) + summary["errors"]
+    print("共 {} 张卡片，{:.2f} 秒（{:.0f} 张/秒），解析失败 {} 张".format(
+        total, elapsed, total / elapsed if elapsed else 0, summary["errors"]))
+    for title, key in (("格式/版本", "formats"), ("块类型", "block_types"), ("块版本", "block_versions")):
+        print("\n{}:".format(title))
+        for name, n in summary[key].most_common():
+            print("  {:<32} {}".format(name, n))
@@ -0,0 +1,116 @@
+# -*- coding:utf-8 -*-
+"""
+分阶段计时 / 计数器
+默认关闭，关闭时 stage() 返回共享的空上下文，count() 直接返回，开销近似为零
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.timings = {}  # stage -> [次数, 总耗时(秒)]
+        self.counters = {}  # name -> 累计值
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                entry = self.timings.setdefault(name, [0, 0.0])
+                entry[0] += 1
+                entry[1] += elapsed
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def merge(self, other):
+        """合并另一个 Profiler（或其 snapshot()）的数据，用于汇总多进程结果"""
+        timings = other["timings"] if isinstance(other, dict) else other.timings
+        counters = other["counters"] if isinstance(other, dict) else other.counters
+        with self._lock:
+            for name, (calls, total) in timings.items():
+                entry = self.timings.setdefault(name, [0, 0.0])
+                entry[0] += calls
+                entry[1] += total
+            for name, value in counters.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "timings": {k: list(v) for k, v in self.timings.items()},
+                "counters": dict(self.counters),
+            }
+
+    def report(self):
+        lines = []
+        header = "{:<28} {:>10} {:>12} {:>12}".format("stage", "calls", "total(s)", "avg(ms)")
+        lines.append(header)
+        lines.append("-" * len(header))
+        for name, (calls, total) in sorted(
+            self.timings.items(), key=lambda kv: kv[1][1], reverse=True
+        ):
+            avg_ms = total / calls * 1000 if calls else 0.0
+            lines.append(
+                "{:<28} {:>10} {:>12.4f} {:>12.3f}".format(name, calls, total, avg_ms)
+            )
+        if self.counters:
+            lines.append("")
+            lines.append("{:<28} {:>10}".format("counter", "value"))
+            lines.append("-" * 39)
+            for name, value in sorted(self.counters.items()):
+                lines.append("{:<28} {:>10}".format(name, value))
+        return "\n".join(lines)
+
+    def write_prometheus(self, filename, prefix="bodydata"):
+        lines = [
+            "# TYPE {}_stage_seconds_total counter".format(prefix),
+        ]
+        for name, (_, total) in sorted(self.timings.items()):
+            lines.append('{}_stage_seconds_total{{stage="{}"}} {:.6f}'.format(prefix, name, total))
+        lines.append("# TYPE {}_stage_calls_total counter".format(prefix))
+        for name, (calls, _) in sorted(self.timings.items()):
+            lines.append('{}_stage_calls_total{{stage="{}"}} {}'.format(prefix, name, calls))
+        lines.append("# TYPE {}_events_total counter".format(prefix))
+        for name, value in sorted(self.counters.items()):
+            lines.append('{}_events_total{{name="{}"}} {}'.format(prefix, name, value))
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+PROFILER = Profiler()
@@ -0,0 +1,313 @@
+# -*- coding:utf-8 -*-
+"""
+批量改卡：按声明式的编辑规则对大量卡片执行 load → 修改 → save，多进程并行，
+先写同目录临时文件再 rename，中途失败不会留下写了一半的卡片；dry-run 只报告改动
+
+    python -m chara_loader.rewrite spec.json <目录> [--dry-run] [--workers 8] [--output-dir 新目录]
+
+编辑规则（JSON）示例：
+    {"edits": [
+        {"op": "clamp",  "path": "Custom.body.shapeValueBody", "min": 0.0, "max": 1.0},
+        {"op": "scale",  "path": "Custom.body.shapeValueBody.0", "factor": 1.05},
+        {"op": "set",    "path": "Parameter.nickname", "value": "新昵称"},
+        {"op": "rename", "path": "Parameter.oldKey", "to": "newKey"},
+        {"op": "delete", "path": "Parameter.unused"},
+        {"op": "clamp",  "path": "Coordinate.*.accessory.parts.*.color", "min": 0, "max": 1, "format": "Koikatu"}
+    ]}
+path 的第一段是块名，之后是字典键或列表下标，"*" 匹配该层全部元素；
+format 可限定只对 "AiSyoujyo" 或 "Koikatu" 卡片生效。没有任何改动的卡片不会被重写，
+改写的卡片中没有被编辑的块按原始字节写回。rename 的目标键已存在时整张卡报错、不写回（dry-run 同样报告）
+"""
+import json
+import os
+import tempfile
+from collections.abc import MutableSequence
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from .AiSyoujyoCharaData import AiSyoujyoCharaData, UnknownBlockData
+from .KoikatuCharaData import KoikatuCharaData
+from .inventory import detect_format, read_inventory
+from .stream import card_length
+from .validate import CardValidationError, validate_card
+
+OPS = {
+    "set": ("value",),
+    "clamp": (),
+    "scale": ("factor",),
+    "rename": ("to",),
+    "delete": (),
+}
+
+
+class EditConflict(ValueError):
+    """编辑会覆盖卡片中已有的数据（rename 的目标键已存在）"""
+
+
+def load_edit_spec(spec):
+    """读取并校验编辑规则，spec 可以是 JSON 文件路径、{"edits": [...]} 或编辑列表"""
+    if isinstance(spec, str):
+        with open(spec, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+    edits = spec["edits"] if isinstance(spec, dict) else spec
+    for i, e in enumerate(edits):
+        op = e.get("op")
+        if op not in OPS:
+            raise ValueError("edits[{}]: unknown op {!r}, expected one of {}".format(i, op, sorted(OPS)))
+        missing = [k for k in ("path",) + OPS[op] if k not in e]
+        if missing:
+            raise ValueError("edits[{}] ({}): missing {}".format(i, op, ", ".join(missing)))
+        if op == "clamp" and "min" not in e and "max" not in e:
+            raise ValueError("edits[{}] (clamp): needs min and/or max".format(i))
+        if e.get("format") not in (None, "AiSyoujyo", "Koikatu"):
+            raise ValueError("edits[{}]: format must be AiSyoujyo or Koikatu".format(i))
+    return edits
+
+
+def load_card(data):
+    """
+    与分析器的 load_character_bytes 相同：先做结构校验（不解码任何块），未通过时抛 CardValidationError；
+    通过后按头部判断出的格式直接用对应的加载器
+    """
+    fmt = validate_card(data)
+    loader = KoikatuCharaData if fmt == "Koikatu" else AiSyoujyoCharaData
+    return loader.load(data)
+
+
+def _is_number(v):
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def _targets(container, keys, prefix):
+    """沿 keys 逐层展开，产出 (父容器, 最后一个键, 完整路径)；路径不存在的分支直接跳过"""
+    key, rest = keys[0], keys[1:]
+    # 恋活 Coordinate 的服装列表是按需解码的 LazyOutfits，与 list 一样按序列处理
+    if key == "*":
+        if isinstance(container, dict):
+            candidates = list(container.keys())
+        elif isinstance(container, MutableSequence):
+            candidates = list(range(len(container)))
+        else:
+            return
+    elif isinstance(container, MutableSequence):
+        try:
+            candidates = [int(key)]
+        except ValueError:
+            return
+        if not -len(container) <= candidates[0] < len(container):
+            return
+    elif isinstance(container, dict):
+        candidates = [key]
+    else:
+        return
+
+    for k in candidates:
+        path = "{}.{}".format(prefix, k)
+        if not rest:
+            yield container, k, path
+        elif isinstance(container, dict) and k not in container:
+            continue
+        else:
+            yield from _targets(container[k], rest, path)
+
+
+def _clamp(v, lo, hi):
+    if lo is not None and v < lo:
+        v = lo
+    if hi is not None and v > hi:
+        v = hi
+    return v
+
+
+def _apply_one(edit, parent, key, path, diffs):
+    op = edit["op"]
+    exists = key in parent if isinstance(parent, dict) else True
+    if op == "set":
+        old = parent[key] if exists else None
+        if not exists or old != edit["value"]:
+            parent[key] = edit["value"]
+            diffs.append({"path": path, "old": old, "new": edit["value"]})
+    elif not exists:
+        return
+    elif op == "delete":
+        diffs.append({"path": path, "old": parent[key], "new": None})
+        del parent[key]
+    elif op == "rename":
+        if not isinstance(parent, dict) or edit["to"] == key:
+            return
+        if edit["to"] in parent:
+            raise EditConflict("rename {} -> {}: target key already exists (value {!r})".format(
+                path, edit["to"], parent[edit["to"]]))
+        parent[edit["to"]] = parent.pop(key)
+        diffs.append({"path": path, "old": key, "new": edit["to"]})
+    else:
+        value = parent[key]
+        if op == "clamp":
+            fn = partial(_clamp, lo=edit.get("min"), hi=edit.get("max"))
+        else:
+            fn = lambda v: v * edit["factor"] + edit.get("offset", 0.0)
+        # 数值列表逐个处理，diff 精确到下标
+        items = list(enumerate(value)) if isinstance(value, list) else [(None, value)]
+        for i, v in items:
+            if not _is_number(v):
+                continue
+            new = fn(v)
+            if new != v:
+                if i is None:
+                    parent[key] = new
+                    diffs.append({"path": path, "old": v, "new": new})
+                else:
+                    value[i] = new
+                    diffs.append({"path": "{}.{}".format(path, i), "old": v, "new": new})
+
+
+def apply_edits(chara, edits):
+    """就地修改卡片对象，返回改动列表 [{"path", "old", "new"}]"""
+    fmt = detect_format(chara.header)
+    diffs = []
+    for edit in edits:
+        if edit.get("format") not in (None, fmt):
+            continue
+        block, *keys = edit["path"].split(".")
+        if block not in chara.blockdata or not keys:
+            continue
+        data = getattr(chara, block).data
+        for parent, key, path in list(_targets(data, keys, block)):
+            _apply_one(edit, parent, key, path, diffs)
+    return diffs
+
+
+def original_blocks(data):
+    """按 lstInfo 索引切出每个块在原卡中的字节"""
+    inv = read_inventory(data)
+    raw_start = card_length(data) - inv["blockdata_size"]
+    return {b["name"]: data[raw_start + b["pos"] : raw_start + b["pos"] + b["size"]] for b in inv["blocks"]}
+
+
+def keep_untouched_blocks(chara, data, diffs):
+    """
+    没被改动的块换回原始字节再写出：Shift-JIS 角色名等经 msgpack 重新编码后字节会变，
+    这样改写后只有真正编辑过的块与原卡不同
+    """
+    touched = {d["path"].split(".", 1)[0] for d in diffs}
+    for name, raw in original_blocks(data).items():
+        if name not in touched and name in chara.blockdata:
+            setattr(chara, name, UnknownBlockData(name, raw, getattr(chara, name).version))
+
+
+def atomic_write(path, data):
+    """写同目录临时文件并 fsync 后 rename 覆盖目标，保留原文件权限"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix="." + os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.chmod(tmp, os.stat(path).st_mode & 0o7777)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def rewrite_card(path, edits, dry_run=False, output_path=None):
+    """
+    对单张卡执行编辑；返回 {"file_path", "changed", "diffs", "error"}，结构校验未通过时另有 invalid_reason
+    （validate.REASONS 中的键）。有改动且不是 dry-run 时写到 output_path（默认原地覆盖）
+    """
+    result = {"file_path": path, "changed": False, "diffs": [], "error": None}
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        chara = load_card(data)
+        diffs = apply_edits(chara, edits)
+        result["diffs"] = diffs
+        result["changed"] = bool(diffs)
+        if diffs and not dry_run:
+            keep_untouched_blocks(chara, data, diffs)
+            atomic_write(output_path or path, bytes(chara))
+    except Exception as e:
+        result["error"] = "{}: {}".format(type(e).__name__, e)
+        if isinstance(e, CardValidationError):
+            result["invalid_reason"] = e.reason
+    return result
+
+
+def _rewrite_task(item, edits, dry_run):
+    path, output_path = item
+    return rewrite_card(path, edits, dry_run=dry_run, output_path=output_path)
+
+
+def rewrite_cards(paths, spec, workers=None, dry_run=False, output_dir=None, root=None, chunksize=16):
+    """
+    用进程池批量执行编辑，按输入顺序逐个产出 rewrite_card 的结果
+    output_dir 不为空时按相对 root 的路径写到新目录，原卡片保持不变；workers=1 时在当前进程内执行
+    """
+    edits = load_edit_spec(spec)
+    items = []
+    for p in paths:
+        out = None
+        if output_dir:
+            out = os.path.join(output_dir, os.path.relpath(p, root or os.path.dirname(p)))
+        items.append((p, out))
+    task = partial(_rewrite_task, edits=edits, dry_run=dry_run)
+    if workers == 1:
+        yield from map(task, items)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(task, items, chunksize=chunksize)
+
+
+def iter_card_paths(root, suffix=".png"):
+    """递归列出目录下的卡片路径（排序后），跳过改写过程中的临时文件"""
+    paths = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.lower().endswith(suffix) and not name.startswith("."):
+                paths.append(os.path.join(dirpath, name))
+    return sorted(paths)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="按编辑规则批量改写角色卡")
+    parser.add_argument("spec", help="编辑规则 JSON")
+    parser.add_argument("root", help="角色卡目录（递归）")
+    parser.add_argument("--dry-run", action="store_true", help="只报告改动，不写文件")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认 CPU 核数")
+    parser.add_argument("--output-dir", default=None, help="改动后的卡片写到此目录（保持相对路径），不覆盖原卡")
+    parser.add_argument("--report", default=None, help="逐张结果（含改动明细）写入 JSONL 文件")
+    args = parser.parse_args()
+
+    paths = iter_card_paths(args.root)
+    start = time.perf_counter()
+    total = changed = errors = 0
+    report = open(args.report, "w", encoding="utf-8") if args.report else None
+    try:
+        for r in rewrite_cards(paths, args.spec, workers=args.workers, dry_run=args.dry_run,
+                               output_dir=args.output_dir, root=args.root):
+            total += 1
+            changed += r["changed"]
+            errors += bool(r["error"])
+            if r["error"]:
+                print("{} -> 错误: {}".format(r["file_path"], r["error"]))
+            elif r["changed"] and args.dry_run:
+                print(r["file_path"])
+                for d in r["diffs"]:
+                    print("  {}: {!r} -> {!r}".format(d["path"], d["old"], d["new"]))
+            if report:
+                report.write(json.dumps(r, ensure_ascii=False, default=repr) + "\n")
+    finally:
+        if report:
+            report.close()
+    elapsed = time.perf_counter() - start
+    print("共 {} 张卡片，{} 张{}，失败 {} 张，{:.2f} 秒（{:.0f} 张/秒）".format(
+        total, changed, "需要修改" if args.dry_run else "已改写", errors, elapsed, total / elapsed if elapsed else 0))
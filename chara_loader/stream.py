@@ -0,0 +1,151 @@
+# -*- coding:utf-8 -*-
+"""
+从连续字节流（stdin、管道、拼接文件）中切分角色卡，以及不解压到磁盘、直接读取 zip/tar 中的卡片
+"""
+import struct
+import tarfile
+import zipfile
+
+from .funcs import PNG_SIGNATURE, get_png_length
+from .inventory import detect_format
+
+# 与加载器 / validate_card 一致：头部和版本的长度是有符号字节
+_BYTE = struct.Struct("b")
+_INT = struct.Struct("i")
+_LONG = struct.Struct("q")
+
+
+def card_length(buf, start=0):
+    """
+    只看 PNG 块头和卡片头部的长度字段，算出从 start 开始的一整张卡的字节数；
+    数据还不够判断时返回 None，不是卡片时抛 ValueError
+    """
+    n = len(buf)
+    if n - start < 8:
+        return None
+    if bytes(buf[start : start + 8]) != PNG_SIGNATURE:
+        raise ValueError("not a character card: PNG signature missing at offset {}".format(start))
+    try:
+        idx = start + get_png_length(buf, start)
+    except struct.error:
+        return None
+
+    # product_no + header
+    if idx + 5 > n:
+        return None
+    header_len = _length(_BYTE, buf, idx + 4, "header")
+    idx += 5
+    if idx + header_len + 1 > n:
+        return None
+    header = bytes(buf[idx : idx + header_len])
+    idx += header_len
+    # version
+    idx += 1 + _length(_BYTE, buf, idx, "version")
+    if detect_format(header) == "Koikatu":
+        if idx + 4 > n:
+            return None
+        idx += 4 + _length(_INT, buf, idx, "face image")
+    else:
+        idx += 78
+    # lstInfo 索引 + 块数据
+    if idx + 4 > n:
+        return None
+    idx += 4 + _length(_INT, buf, idx, "lstInfo")
+    if idx + 8 > n:
+        return None
+    idx += 8 + _length(_LONG, buf, idx, "block data")
+    return idx - start
+
+
+def _length(fmt, buf, idx, name):
+    value = fmt.unpack_from(buf, idx)[0]
+    if value < 0:
+        raise ValueError("not a character card: negative {} length {} at offset {}".format(name, value, idx))
+    return value
+
+
+class StreamCardError(ValueError):
+    """字节流中无法切出卡片的一段：offset 为这段在流中的起点，size 为跳过的字节数"""
+
+    def __init__(self, reason, offset, size):
+        super().__init__("{} (offset {}, {} bytes skipped)".format(reason, offset, size))
+        self.reason = reason
+        self.offset = offset
+        self.size = size
+
+
+def iter_stream_cards(stream, chunk_size=1024 * 1024, max_card_size=256 * 1024 * 1024, resync=False):
+    """
+    从二进制流中逐张产出卡片字节；缓冲区最多只保留一张卡加一个读取块，
+    单张卡声明的长度超过 max_card_size 时视为坏数据，避免把内存吃光。
+    遇到坏数据（不是 PNG 开头、长度越界、流在卡片中间结束）时：
+      resync=False  抛 ValueError
+      resync=True   产出一个 StreamCardError（代替这段数据），从下一个 PNG 签名处继续切分
+    """
+    buf = bytearray()
+    eof = False
+    offset = 0       # buf[0] 在流中的位置
+    bad = None       # 正在跳过的坏数据段：(起点, 原因)
+    while True:
+        try:
+            length = card_length(buf) if buf else None
+            if length is not None and length > max_card_size:
+                raise ValueError("card larger than max_card_size: {} bytes".format(length))
+            if length is None and len(buf) > max_card_size:
+                raise ValueError("no card boundary within max_card_size bytes")
+            if eof and buf and (length is None or len(buf) < length):
+                raise ValueError("stream ended inside a card ({} bytes left)".format(len(buf)))
+        except ValueError as e:
+            if not resync:
+                raise
+            if bad is None:
+                bad = (offset, str(e))
+            i = buf.find(PNG_SIGNATURE, 1)
+            found = i >= 0
+            if not found:
+                # 没找到下一个签名：末尾不足一个签名长度的字节可能是签名的前半段，留到下一块
+                i = len(buf) if eof else max(len(buf) - len(PNG_SIGNATURE) + 1, 0)
+            del buf[:i]
+            offset += i
+            if found or eof:
+                yield StreamCardError(bad[1], bad[0], offset - bad[0])
+                bad = None
+                continue
+        else:
+            if length is not None and len(buf) >= length:
+                # 只复制一次：bytes(buf[:length]) 会先切出一个 bytearray 再复制
+                with memoryview(buf) as view:
+                    card = bytes(view[:length])
+                del buf[:length]
+                offset += length
+                yield card
+                continue
+            if eof:
+                return
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+        else:
+            buf += chunk
+
+
+def iter_archive_cards(archive_path, suffix=".png"):
+    """逐个产出 zip/tar（含 .tar.gz 等）中卡片成员的 (成员名, 字节)，不写临时文件"""
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(suffix):
+                    yield info.filename, zf.read(info)
+    elif tarfile.is_tarfile(archive_path):
+        # 流式模式按顺序读取，压缩的 tar 也不需要回退
+        with tarfile.open(archive_path, "r|*") as tf:
+            for member in tf:
+                if member.isfile() and member.name.lower().endswith(suffix):
+                    yield member.name, tf.extractfile(member).read()
+    else:
+        raise ValueError("unsupported archive: {}".format(archive_path))
+
+
+def archive_member_path(archive_path, member):
+    """结果中用于标识压缩包成员的路径"""
+    return "{}::{}".format(archive_path, member)
@@ -0,0 +1,133 @@
+# -*- coding:utf-8 -*-
+"""
+加载前的结构校验：只看 PNG 块头、卡片头部的长度字段和 lstInfo 索引，不解码任何块，
+截断、损坏或根本不是角色卡的文件在这里就被拒绝，不必先按 AI少女 格式解析失败、再按恋活格式解析一遍
+
+    python -m chara_loader.validate <卡片或目录> ...
+"""
+import struct
+
+from .funcs import PNG_SIGNATURE, DecodeTimeout, find_png_end, msg_unpack
+from .inventory import detect_format
+
+_INT = struct.Struct("i")
+_LONG = struct.Struct("q")
+
+# 失败原因（CardValidationError.reason）
+REASONS = {
+    "not_png": "PNG 签名缺失",
+    "png_truncated": "PNG 在 IEND 之前截断",
+    "no_card_data": "PNG 之后没有卡片数据",
+    "header": "卡片头部长度字段无效",
+    "face_image": "恋活头像长度越界",
+    "lstinfo": "lstInfo 索引无法解析",
+    "truncated": "块数据截断",
+    "block_bounds": "块的 pos/size 越界",
+    "missing_block": "缺少必需的块",
+}
+
+
+class CardValidationError(ValueError):
+    """结构校验失败；reason 为 REASONS 中的键"""
+
+    def __init__(self, reason, detail):
+        super().__init__("{} ({}): {}".format(REASONS[reason], reason, detail))
+        self.reason = reason
+        self.detail = detail
+
+
+def validate_card(data, required_blocks=()):
+    """
+    校验内存中的整张卡片，通过时返回格式（"AiSyoujyo" / "Koikatu"），否则抛 CardValidationError。
+    required_blocks 中的块必须出现在 lstInfo 里；块数据之后的多余字节不算错误
+    """
+    n = len(data)
+    if n < 8 or bytes(data[:8]) != PNG_SIGNATURE:
+        raise CardValidationError("not_png", "first 8 bytes are not a PNG signature")
+    try:
+        idx = find_png_end(data)
+    except struct.error as e:
+        raise CardValidationError("png_truncated", str(e))
+    if idx >= n:
+        raise CardValidationError("no_card_data", "file ends right after IEND ({} bytes)".format(n))
+
+    # product_no(i) + header(b 长度) + version(b 长度)；长度字段是有符号字节，负数会让加载器读到文件末尾
+    if idx + 5 > n:
+        raise CardValidationError("header", "product_no/header length missing at offset {}".format(idx))
+    header_len = struct.unpack_from("b", data, idx + 4)[0]
+    idx += 5
+    if header_len <= 0 or idx + header_len + 1 > n:
+        raise CardValidationError("header", "header length {} at offset {}".format(header_len, idx - 1))
+    header = bytes(data[idx:idx + header_len])
+    idx += header_len
+    version_len = struct.unpack_from("b", data, idx)[0]
+    idx += 1
+    if version_len < 0 or idx + version_len > n:
+        raise CardValidationError("header", "version length {} at offset {}".format(version_len, idx - 1))
+    idx += version_len
+
+    fmt = detect_format(header)
+    if fmt == "Koikatu":
+        if idx + 4 > n:
+            raise CardValidationError("face_image", "face image length missing at offset {}".format(idx))
+        face_len = _INT.unpack_from(data, idx)[0]
+        idx += 4
+        if face_len < 0 or idx + face_len > n:
+            raise CardValidationError("face_image", "face image length {} at offset {}".format(face_len, idx - 4))
+        idx += face_len
+    else:
+        idx += 78
+
+    if idx + 4 > n:
+        raise CardValidationError("lstinfo", "lstInfo length missing at offset {}".format(idx))
+    lstinfo_len = _INT.unpack_from(data, idx)[0]
+    idx += 4
+    if lstinfo_len <= 0 or idx + lstinfo_len + 8 > n:
+        raise CardValidationError("lstinfo", "lstInfo length {} at offset {}".format(lstinfo_len, idx - 4))
+    try:
+        blocks = msg_unpack(bytes(data[idx:idx + lstinfo_len]))["lstInfo"]
+        blocks = [(b["name"], b["pos"], b["size"]) for b in blocks]
+    except DecodeTimeout:
+        raise
+    except Exception as e:
+        raise CardValidationError("lstinfo", "{}: {}".format(type(e).__name__, e))
+    idx += lstinfo_len
+
+    raw_size = _LONG.unpack_from(data, idx)[0]
+    idx += 8
+    if raw_size < 0 or idx + raw_size > n:
+        raise CardValidationError("truncated", "block data needs {} bytes, {} available".format(raw_size, n - idx))
+    for name, pos, size in blocks:
+        if not isinstance(pos, int) or not isinstance(size, int) or pos < 0 or size < 0 or pos + size > raw_size:
+            raise CardValidationError("block_bounds", "{} pos={} size={} (block data {} bytes)".format(
+                name, pos, size, raw_size))
+    names = {b[0] for b in blocks}
+    missing = [name for name in required_blocks if name not in names]
+    if missing:
+        raise CardValidationError("missing_block", ", ".join(missing))
+    return fmt
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    from collections import Counter
+
+    paths = []
+    for arg in sys.argv[1:]:
+        if os.path.isdir(arg):
+            paths.extend(sorted(os.path.join(arg, f) for f in os.listdir(arg) if f.lower().endswith(".png")))
+        else:
+            paths.append(arg)
+    reasons = Counter()
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        try:
+            validate_card(data)
+        except CardValidationError as e:
+            reasons[e.reason] += 1
+            print("{}: {}".format(path, e))
+    print("共 {} 张，未通过 {} 张".format(len(paths), sum(reasons.values())))
+    for reason, count in reasons.most_common():
+        print("  {:<14} {:<20} {}".format(reason, REASONS[reason], count))
@@ -0,0 +1,272 @@
+# -*- coding:utf-8 -*-
+"""
+shapeValue 特征库：分析时顺手把每张卡的 Custom.body.shapeValueBody 和 Custom.face.shapeValueFace
+追加到一个定宽 float32 矩阵文件，分析类任务直接用 numpy.memmap 读取，不必再加载卡片
+
+目录结构：
+    meta.json        {"store": 1, "body_width": 64, "face_width": 64, "generation": g}
+    features.g.f32   行优先的 float32 矩阵，每行 body_width + face_width 列：
+                     [shapeValueBody 补 NaN 到 body_width | shapeValueFace 补 NaN 到 face_width]
+    index.g.jsonl    每行一条：{"row", "path", "hash", "format", "body_len", "face_len"}，
+                     或删除标记 {"path", "deleted": true}
+
+只追加：同一路径再次写入时新行覆盖旧行（按 index 中最后一条为准），compact() 去掉被覆盖/删除的行，
+写成下一代文件后原子替换 meta.json 切换过去。
+崩溃后打开时截掉 index 中写了一半的尾行，矩阵截到 index 引用的最后一行
+
+    python BodyDataAnalyzer.py ../cards --features features/
+    python feature_store.py features/ [--compact]
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Iterator, List, Sequence
+
+import numpy as np
+
+STORE_VERSION = 1
+META_FILE = "meta.json"
+
+
+def content_hash(data: bytes) -> str:
+    """与 shards.file_sha256 相同的格式，卡片字节已在内存中时直接计算"""
+    return "sha256:" + hashlib.sha256(data).hexdigest()
+
+
+class FeatureStore:
+    def __init__(self, directory: str, body_width: int = 64, face_width: int = 64):
+        """
+        打开（或新建）特征库；已存在时以 meta.json 中的宽度为准，传入的宽度只用于新建
+        """
+        self.directory = directory
+        self._lock = threading.Lock()
+        meta_path = os.path.join(directory, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("store") != STORE_VERSION:
+                raise ValueError(f"不支持的特征库版本: {meta.get('store')}")
+        else:
+            os.makedirs(directory, exist_ok=True)
+            meta = {"store": STORE_VERSION, "body_width": body_width, "face_width": face_width, "generation": 0}
+            self._write_meta(meta)
+        self.meta = meta
+        self.body_width = meta["body_width"]
+        self.face_width = meta["face_width"]
+        self.width = self.body_width + self.face_width
+        self.row_bytes = self.width * 4
+
+        self.latest = {}  # path -> 最新一条 index 记录（删除后移除）
+        self.rows = 0
+        self._recover()
+        self._matrix = open(self.matrix_path, "ab")
+        self._index = open(self.index_path, "ab")
+
+    def _paths(self, generation: int):
+        return (os.path.join(self.directory, f"features.{generation}.f32"),
+                os.path.join(self.directory, f"index.{generation}.jsonl"))
+
+    @property
+    def matrix_path(self) -> str:
+        return self._paths(self.meta["generation"])[0]
+
+    @property
+    def index_path(self) -> str:
+        return self._paths(self.meta["generation"])[1]
+
+    def _write_meta(self, meta: Dict) -> None:
+        path = os.path.join(self.directory, META_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    # ---------- 打开 / 恢复 ----------
+    def _recover(self) -> None:
+        matrix_rows = os.path.getsize(self.matrix_path) // self.row_bytes if os.path.exists(self.matrix_path) else 0
+        good = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb") as f:
+                for line in f:
+                    record = self._decode(line)
+                    # 写了一半的行，或引用了矩阵里没写完的行：从这里截断
+                    if record is None or record.get("row", -1) >= matrix_rows:
+                        break
+                    self._apply(record)
+                    good += len(line)
+            if good < os.path.getsize(self.index_path):
+                with open(self.index_path, "r+b") as f:
+                    f.truncate(good)
+        if os.path.exists(self.matrix_path) and os.path.getsize(self.matrix_path) != self.rows * self.row_bytes:
+            with open(self.matrix_path, "r+b") as f:
+                f.truncate(self.rows * self.row_bytes)
+
+    @staticmethod
+    def _decode(line: bytes):
+        if not line.endswith(b"\n"):
+            return None
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        return record if isinstance(record, dict) and "path" in record else None
+
+    def _apply(self, record: Dict) -> None:
+        if record.get("deleted"):
+            self.latest.pop(record["path"], None)
+        else:
+            self.latest[record["path"]] = record
+            self.rows = max(self.rows, record["row"] + 1)
+
+    # ---------- 写入 ----------
+    def has(self, path: str, hash_: str) -> bool:
+        """该路径已存有同一内容的特征（增量分析时跳过）"""
+        record = self.latest.get(path)
+        return record is not None and record["hash"] == hash_
+
+    def append(self, path: str, hash_: str, fmt: str, body: Sequence[float], face: Sequence[float]) -> int:
+        """追加一行，返回行号；向量比配置的宽度长时抛 ValueError，不写入任何内容"""
+        if len(body) > self.body_width or len(face) > self.face_width:
+            raise ValueError(f"shapeValue 长度 ({len(body)}, {len(face)}) 超过特征库宽度 "
+                             f"({self.body_width}, {self.face_width})")
+        row = np.full(self.width, np.nan, dtype=np.float32)
+        row[:len(body)] = body
+        row[self.body_width:self.body_width + len(face)] = face
+        with self._lock:
+            record = {"row": self.rows, "path": path, "hash": hash_, "format": fmt,
+                      "body_len": len(body), "face_len": len(face)}
+            # 先写矩阵行再写 index：index 里出现的行号在矩阵中一定完整
+            self._matrix.write(row.tobytes())
+            self._index.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+            self._apply(record)
+            return record["row"]
+
+    def remove(self, path: str) -> bool:
+        with self._lock:
+            if path not in self.latest:
+                return False
+            self._index.write((json.dumps({"path": path, "deleted": True}, ensure_ascii=False) + "\n").encode("utf-8"))
+            self._apply({"path": path, "deleted": True})
+            return True
+
+    def flush(self, fsync: bool = False) -> None:
+        with self._lock:
+            for f in (self._matrix, self._index):
+                f.flush()
+                if fsync:
+                    os.fsync(f.fileno())
+
+    def close(self) -> None:
+        if not self._index.closed:
+            self.flush(fsync=True)
+            self._matrix.close()
+            self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- 读取 ----------
+    def matrix(self) -> np.ndarray:
+        """全部行（含被覆盖/删除的旧行）的只读 memmap，形状 (rows, body_width + face_width)"""
+        self.flush()
+        if not self.rows:
+            return np.zeros((0, self.width), dtype=np.float32)
+        return np.memmap(self.matrix_path, dtype=np.float32, mode="r", shape=(self.rows, self.width))
+
+    def live_rows(self) -> np.ndarray:
+        """每个路径最新一行的行号，按路径排序"""
+        return np.array([self.latest[p]["row"] for p in sorted(self.latest)], dtype=np.int64)
+
+    def records(self) -> List[Dict]:
+        """与 live_rows 同序的 index 记录"""
+        return [self.latest[p] for p in sorted(self.latest)]
+
+    def body(self, live: bool = True) -> np.ndarray:
+        """shapeValueBody 列（NaN 表示该格式没有这一维）；live=True 时只取最新行（花式索引会复制）"""
+        m = self.matrix()[:, :self.body_width]
+        return m[self.live_rows()] if live else m
+
+    def face(self, live: bool = True) -> np.ndarray:
+        m = self.matrix()[:, self.body_width:]
+        return m[self.live_rows()] if live else m
+
+    def row(self, path: str) -> np.ndarray:
+        """单张卡的 (shapeValueBody, shapeValueFace)，不含补齐的 NaN"""
+        record = self.latest[path]
+        vec = self.matrix()[record["row"]]
+        return (np.array(vec[:record["body_len"]]),
+                np.array(vec[self.body_width:self.body_width + record["face_len"]]))
+
+    # ---------- 压缩 ----------
+    def compact(self, chunk_rows: int = 65536) -> Dict[str, int]:
+        """
+        去掉被覆盖和删除的行，按路径排序写成下一代矩阵和 index，落盘后原子替换 meta.json 切换，
+        再删除旧文件；切换之前崩溃则仍是旧的一代。返回 {"before": 原行数, "after": 新行数}
+        """
+        with self._lock:
+            self._matrix.flush()
+            self._index.flush()
+            before = self.rows
+            records = [self.latest[p] for p in sorted(self.latest)]
+            src = (np.memmap(self.matrix_path, dtype=np.float32, mode="r", shape=(before, self.width))
+                   if before else None)
+            old_paths = (self.matrix_path, self.index_path)
+            meta = dict(self.meta, generation=self.meta["generation"] + 1)
+            new_matrix, new_index = self._paths(meta["generation"])
+            with open(new_matrix, "wb") as fm, open(new_index, "wb") as fi:
+                for start in range(0, len(records), chunk_rows):
+                    chunk = records[start:start + chunk_rows]
+                    fm.write(np.ascontiguousarray(src[[r["row"] for r in chunk]]).tobytes())
+                    for i, r in enumerate(chunk, start):
+                        fi.write((json.dumps(dict(r, row=i), ensure_ascii=False) + "\n").encode("utf-8"))
+                for f in (fm, fi):
+                    f.flush()
+                    os.fsync(f.fileno())
+            del src
+            self._matrix.close()
+            self._index.close()
+            self._write_meta(meta)
+            self.meta = meta
+            for p in old_paths:
+                try:
+                    os.unlink(p)
+                except OSError:
+                    pass
+            self.latest = {r["path"]: dict(r, row=i) for i, r in enumerate(records)}
+            self.rows = len(records)
+            self._matrix = open(self.matrix_path, "ab")
+            self._index = open(self.index_path, "ab")
+        return {"before": before, "after": self.rows}
+
+    def __len__(self) -> int:
+        return len(self.latest)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self.records())
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="查看或压缩 shapeValue 特征库")
+    parser.add_argument("directory", help="特征库目录")
+    parser.add_argument("--compact", action="store_true", help="去掉被覆盖/删除的行并按路径重排")
+    args = parser.parse_args()
+
+    with FeatureStore(args.directory) as store:
+        print(f"特征库: {args.directory}  宽度 body {store.body_width} + face {store.face_width}")
+        print(f"卡片 {len(store)} 张，矩阵 {store.rows} 行（{store.rows * store.row_bytes / 1024 / 1024:.1f} MB）")
+        formats = {}
+        for r in store.records():
+            key = (r["format"], r["body_len"], r["face_len"])
+            formats[key] = formats.get(key, 0) + 1
+        for (fmt, body_len, face_len), n in sorted(formats.items()):
+            print(f"  {fmt:<10} body {body_len:>3}  face {face_len:>3}  {n} 张")
+        if args.compact:
+            summary = store.compact()
+            print(f"压缩: {summary['before']} 行 -> {summary['after']} 行")
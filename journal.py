@@ -0,0 +1,128 @@
+# -*- coding:utf-8 -*-
+"""
+批量分析的运行日志（JSONL）：每分析完一张卡就追加一行结果，按条数/时间间隔 fsync；
+进程中途退出后用同一命令重跑，已记录的卡片直接跳过
+
+第一行是头部记录（模型指纹、输入目录、阈值表哈希、影子模型指纹），之后每行一个结果。
+崩溃时最后一行可能只写了一半，打开时从第一条不完整/无法解析的行处截断后继续追加
+"""
+import json
+import os
+import time
+from typing import Dict
+
+JOURNAL_VERSION = 2
+# 与本次运行不一致时拒绝续跑的头部字段
+HEADER_KEYS = ("model_fingerprint", "input", "thresholds_fingerprint", "shadow_fingerprint")
+
+
+class JournalMismatch(ValueError):
+    """日志是用另一个模型、输入目录、阈值表或影子模型生成的，不能直接续跑"""
+
+
+class RunJournal:
+    def __init__(self, path: str, model_fingerprint: str, input_path: str,
+                 restart: bool = False, fsync_every: int = 64, fsync_interval: float = 2.0,
+                 thresholds_fingerprint: str = None, shadow_fingerprint: str = None):
+        """
+        打开（或新建）运行日志，self.done 为已记录的 {file_path: 结果}；
+        模型指纹、输入目录、阈值表哈希或影子模型指纹（没有影子评分时为 None）与日志头部不一致时
+        抛 JournalMismatch（旧版本日志没有阈值表哈希，同样视为不一致），restart=True 时丢弃旧日志重新开始
+        """
+        self.path = path
+        self.header = {"journal": JOURNAL_VERSION, "model_fingerprint": model_fingerprint,
+                       "input": os.path.abspath(input_path), "thresholds_fingerprint": thresholds_fingerprint,
+                       "shadow_fingerprint": shadow_fingerprint}
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.done = {}
+        self.dropped_bytes = 0
+
+        if restart or not os.path.exists(path):
+            self._create()
+        else:
+            self._recover()
+        self._f = open(path, "ab")
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _create(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "wb") as f:
+            f.write(self._encode(self.header))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _recover(self) -> None:
+        good = 0
+        with open(self.path, "rb") as f:
+            header = None
+            for line in f:
+                record = self._decode(line)
+                if record is None:
+                    break
+                if header is None:
+                    header = record
+                    self._check_header(header)
+                elif "file_path" in record:
+                    self.done[record["file_path"]] = record
+                else:
+                    break
+                good += len(line)
+            size = f.seek(0, os.SEEK_END)
+        if header is None:
+            # 连头部都没写完，当作新日志
+            self._create()
+            return
+        if good < size:
+            # 截掉崩溃时写了一半的尾部，后续追加从完整行之后开始
+            self.dropped_bytes = size - good
+            with open(self.path, "r+b") as f:
+                f.truncate(good)
+                os.fsync(f.fileno())
+
+    def _check_header(self, header: Dict) -> None:
+        for key in HEADER_KEYS:
+            if header.get(key) != self.header[key]:
+                raise JournalMismatch(
+                    f"运行日志 {self.path} 的 {key} 与本次不同（{header.get(key)} != {self.header[key]}），"
+                    f"已记录的结果不能复用；确认后用 --journal-restart 丢弃旧日志重新开始"
+                )
+
+    @staticmethod
+    def _encode(record: Dict) -> bytes:
+        return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+    @staticmethod
+    def _decode(line: bytes):
+        if not line.endswith(b"\n"):
+            return None
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        return record if isinstance(record, dict) else None
+
+    def append(self, result: Dict) -> None:
+        self._f.write(self._encode(result))
+        self.done[result["file_path"]] = result
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self) -> None:
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        if not self._f.closed:
+            self.sync()
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,405 @@
+# -*- coding:utf-8 -*-
+"""
+卡片库统计：以流的方式消费分析结果，只保留在线聚合量（均值/方差、固定分箱直方图、
+由直方图得到的近似分位数、身高分类/审美分类/组合标签计数），内存占用与卡片数无关。
+聚合量可以在多个进程或分片之间合并，保存为紧凑的 JSON 报告。
+ShadowStats 以同样的方式聚合影子评分（候选模型 vs 正式模型）的差值与分类变化
+
+    python BodyDataAnalyzer.py ../cards --stats stats.json --stats-only
+    python library_stats.py shard0.stats.json shard1.stats.json --output total.stats.json
+    python library_stats.py shard0.shadow.json shard1.shadow.json
+"""
+import json
+import math
+import os
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List
+
+REPORT_VERSION = 1
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+
+
+class RunningMoments:
+    """Welford 在线均值/方差，merge 用并行合并公式（Chan et al.）"""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x: float) -> None:
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+
+    def merge(self, other: "RunningMoments") -> None:
+        if not other.n:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    def to_dict(self) -> Dict:
+        if not self.n:
+            return {"n": 0}
+        return {"n": self.n, "mean": self.mean, "m2": self.m2, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "RunningMoments":
+        m = cls()
+        if d.get("n"):
+            m.n, m.mean, m.m2, m.min, m.max = d["n"], d["mean"], d["m2"], d["min"], d["max"]
+        return m
+
+
+class Histogram:
+    """[lo, hi) 上等宽分箱，区间外的值计入 underflow / overflow；分箱配置相同才能合并"""
+
+    def __init__(self, lo: float, hi: float, width: float):
+        self.lo = lo
+        self.hi = hi
+        self.width = width
+        self.bins = int(round((hi - lo) / width))
+        self.counts = [0] * self.bins
+        self.underflow = 0
+        self.overflow = 0
+
+    def add(self, x: float) -> None:
+        if x < self.lo:
+            self.underflow += 1
+        elif x >= self.hi:
+            self.overflow += 1
+        else:
+            self.counts[min(int((x - self.lo) / self.width), self.bins - 1)] += 1
+
+    def merge(self, other: "Histogram") -> None:
+        if (self.lo, self.hi, self.bins) != (other.lo, other.hi, other.bins):
+            raise ValueError("直方图分箱不同，不能合并: {} != {}".format(
+                (self.lo, self.hi, self.bins), (other.lo, other.hi, other.bins)))
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts) + self.underflow + self.overflow
+
+    def quantile(self, q: float, lo_value: float, hi_value: float) -> float:
+        """
+        近似分位数：在所在分箱内线性插值，误差不超过一个分箱宽度；
+        落在区间外时返回真实的最小/最大值 lo_value / hi_value
+        """
+        total = self.total
+        if not total:
+            return None
+        target = q * total
+        cum = self.underflow
+        if target <= cum:
+            return lo_value
+        for i, c in enumerate(self.counts):
+            if c and cum + c >= target:
+                x = self.lo + (i + (target - cum) / c) * self.width
+                return min(max(x, lo_value), hi_value)
+            cum += c
+        return hi_value
+
+    def coarse(self, width: float) -> List[List]:
+        """合并成宽度为 width 的粗分箱，只列出非空的 [起点, 数量]"""
+        step = max(1, int(round(width / self.width)))
+        out = []
+        for i in range(0, self.bins, step):
+            n = sum(self.counts[i : i + step])
+            if n:
+                out.append([round(self.lo + i * self.width, 6), n])
+        return out
+
+    def to_dict(self) -> Dict:
+        # 只存非空分箱，报告保持紧凑
+        return {"lo": self.lo, "hi": self.hi, "width": self.width,
+                "counts": {str(i): c for i, c in enumerate(self.counts) if c},
+                "underflow": self.underflow, "overflow": self.overflow}
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "Histogram":
+        h = cls(d["lo"], d["hi"], d["width"])
+        for i, c in d["counts"].items():
+            h.counts[int(i)] = c
+        h.underflow = d["underflow"]
+        h.overflow = d["overflow"]
+        return h
+
+
+class LibraryStats:
+    """
+    分析结果的在线聚合：add 逐条累计，observe 包装结果迭代器边统计边透传，
+    merge 合并其他进程/分片的聚合量
+    """
+
+    def __init__(self, height_range=(50.0, 250.0), bin_width: float = 0.1):
+        self.cards = 0
+        self.success = 0
+        self.errors = Counter()
+        self.height = RunningMoments()
+        self.histogram = Histogram(height_range[0], height_range[1], bin_width)
+        self.height_categories = Counter()
+        self.aesthetic = {}
+        self.combined_tags = Counter()
+
+    def add(self, result: Dict) -> None:
+        self.cards += 1
+        if not result.get("success"):
+            # 只按异常类型计数，不保留具体信息
+            self.errors[(result.get("error") or "").split(":", 1)[0] or "Unknown"] += 1
+            return
+        self.success += 1
+        height = result["height_cm"]
+        self.height.add(height)
+        self.histogram.add(height)
+        self.height_categories[result["height_category"]] += 1
+        for dim, label in (result.get("aesthetic_classifications") or {}).items():
+            self.aesthetic.setdefault(dim, Counter())[label] += 1
+        if result.get("combined_tag"):
+            self.combined_tags[result["combined_tag"]] += 1
+
+    def observe(self, results: Iterable[Dict]) -> Iterator[Dict]:
+        for r in results:
+            self.add(r)
+            yield r
+
+    def merge(self, other: "LibraryStats") -> "LibraryStats":
+        self.cards += other.cards
+        self.success += other.success
+        self.errors.update(other.errors)
+        self.height.merge(other.height)
+        self.histogram.merge(other.histogram)
+        self.height_categories.update(other.height_categories)
+        for dim, counts in other.aesthetic.items():
+            self.aesthetic.setdefault(dim, Counter()).update(counts)
+        self.combined_tags.update(other.combined_tags)
+        return self
+
+    def quantiles(self) -> Dict[str, float]:
+        if not self.height.n:
+            return {}
+        return {"p{:g}".format(q * 100): round(self.histogram.quantile(q, self.height.min, self.height.max), 2)
+                for q in QUANTILES}
+
+    def to_dict(self) -> Dict:
+        """可合并的完整聚合量，另附便于阅读的 summary（合并时忽略 summary）"""
+        return {
+            "version": REPORT_VERSION,
+            "cards": self.cards,
+            "success": self.success,
+            "errors": dict(self.errors),
+            "height": self.height.to_dict(),
+            "histogram": self.histogram.to_dict(),
+            "height_categories": dict(self.height_categories),
+            "aesthetic": {dim: dict(c) for dim, c in self.aesthetic.items()},
+            "combined_tags": dict(self.combined_tags.most_common()),
+            "summary": {
+                "mean": round(self.height.mean, 3) if self.height.n else None,
+                "std": round(math.sqrt(self.height.variance), 3) if self.height.n else None,
+                "min": self.height.min if self.height.n else None,
+                "max": self.height.max if self.height.n else None,
+                "quantiles": self.quantiles(),
+                "histogram_5cm": self.histogram.coarse(5.0),
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "LibraryStats":
+        if d.get("version") != REPORT_VERSION:
+            raise ValueError("不支持的统计报告版本: {}".format(d.get("version")))
+        s = cls()
+        s.cards = d["cards"]
+        s.success = d["success"]
+        s.errors = Counter(d["errors"])
+        s.height = RunningMoments.from_dict(d["height"])
+        s.histogram = Histogram.from_dict(d["histogram"])
+        s.height_categories = Counter(d["height_categories"])
+        s.aesthetic = {dim: Counter(c) for dim, c in d["aesthetic"].items()}
+        s.combined_tags = Counter(d["combined_tags"])
+        return s
+
+    def save(self, output_file: str) -> None:
+        os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+        with open(output_file, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "LibraryStats":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def report(self, top_tags: int = 10) -> str:
+        lines = ["卡片 {}，成功 {}，失败 {}".format(self.cards, self.success, self.cards - self.success)]
+        if self.height.n:
+            summary = self.to_dict()["summary"]
+            lines.append("身高: 均值 {mean} cm  标准差 {std}  最小 {min}  最大 {max}".format(**summary))
+            lines.append("分位数: " + "  ".join("{} {}".format(k, v) for k, v in summary["quantiles"].items()))
+            lines.append("身高分类: " + "  ".join("{} {}".format(k, v) for k, v in self.height_categories.most_common()))
+            for dim, counts in self.aesthetic.items():
+                lines.append("  {:<14}".format(dim) + "  ".join("{} {}".format(k, v) for k, v in counts.most_common()))
+            lines.append("组合标签 Top {}:".format(top_tags))
+            for tag, n in self.combined_tags.most_common(top_tags):
+                lines.append("  {:<32} {}".format(tag, n))
+        for err, n in self.errors.most_common():
+            lines.append("错误 {:<28} {}".format(err, n))
+        return "\n".join(lines)
+
+
+class ShadowStats:
+    """
+    影子评分的在线聚合：只统计正式预测成功的卡，
+    delta 为 候选 - 正式 的身高差（cm），abs_histogram 给出绝对差的近似分位数，
+    agree 为身高分类相同的卡数，flips 按 "正式分类→候选分类" 计数
+    """
+
+    KIND = "shadow"
+
+    def __init__(self, max_abs_delta: float = 50.0, bin_width: float = 0.01):
+        self.compared = 0
+        self.errors = Counter()
+        self.delta = RunningMoments()
+        self.abs_delta = RunningMoments()
+        self.abs_histogram = Histogram(0.0, max_abs_delta, bin_width)
+        self.agree = 0
+        self.flips = Counter()
+
+    def add(self, result: Dict) -> None:
+        shadow = result.get("shadow")
+        if not result.get("success") or shadow is None:
+            return
+        if shadow.get("error"):
+            self.errors[shadow["error"].split(":", 1)[0] or "Unknown"] += 1
+            return
+        self.compared += 1
+        d = shadow["delta_cm"]
+        self.delta.add(d)
+        self.abs_delta.add(abs(d))
+        self.abs_histogram.add(abs(d))
+        if shadow["height_category"] == result["height_category"]:
+            self.agree += 1
+        else:
+            self.flips["{}→{}".format(result["height_category"], shadow["height_category"])] += 1
+
+    def observe(self, results: Iterable[Dict]) -> Iterator[Dict]:
+        for r in results:
+            self.add(r)
+            yield r
+
+    def merge(self, other: "ShadowStats") -> "ShadowStats":
+        self.compared += other.compared
+        self.errors.update(other.errors)
+        self.delta.merge(other.delta)
+        self.abs_delta.merge(other.abs_delta)
+        self.abs_histogram.merge(other.abs_histogram)
+        self.agree += other.agree
+        self.flips.update(other.flips)
+        return self
+
+    def summary(self) -> Dict:
+        if not self.compared:
+            return {"compared": 0}
+        n = self.delta.n
+        mse = self.delta.m2 / n + self.delta.mean ** 2
+        return {
+            "compared": self.compared,
+            "mae": round(self.abs_delta.mean, 4),
+            "rmse": round(math.sqrt(mse), 4),
+            "mean_delta": round(self.delta.mean, 4),
+            "max_abs_delta": round(self.abs_delta.max, 4),
+            "abs_delta_quantiles": {
+                "p{:g}".format(q * 100): round(self.abs_histogram.quantile(q, self.abs_delta.min, self.abs_delta.max), 3)
+                for q in (0.5, 0.9, 0.99)},
+            "agreement": round(self.agree / self.compared, 6),
+            "flipped": self.compared - self.agree,
+        }
+
+    def to_dict(self) -> Dict:
+        return {
+            "version": REPORT_VERSION,
+            "kind": self.KIND,
+            "compared": self.compared,
+            "errors": dict(self.errors),
+            "delta": self.delta.to_dict(),
+            "abs_delta": self.abs_delta.to_dict(),
+            "abs_histogram": self.abs_histogram.to_dict(),
+            "agree": self.agree,
+            "flips": dict(self.flips.most_common()),
+            "summary": self.summary(),
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "ShadowStats":
+        if d.get("version") != REPORT_VERSION or d.get("kind") != cls.KIND:
+            raise ValueError("不是影子评分报告或版本不支持: {} {}".format(d.get("kind"), d.get("version")))
+        s = cls()
+        s.compared = d["compared"]
+        s.errors = Counter(d["errors"])
+        s.delta = RunningMoments.from_dict(d["delta"])
+        s.abs_delta = RunningMoments.from_dict(d["abs_delta"])
+        s.abs_histogram = Histogram.from_dict(d["abs_histogram"])
+        s.agree = d["agree"]
+        s.flips = Counter(d["flips"])
+        return s
+
+    save = LibraryStats.save
+
+    @classmethod
+    def load(cls, path: str) -> "ShadowStats":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def report(self) -> str:
+        s = self.summary()
+        lines = ["影子评分: 比较 {} 张，候选模型失败 {} 张".format(self.compared, sum(self.errors.values()))]
+        if self.compared:
+            lines.append("身高差（候选 - 正式）: MAE {mae} cm  RMSE {rmse} cm  平均 {mean_delta} cm  最大 {max_abs_delta} cm".format(**s))
+            lines.append("绝对差分位数: " + "  ".join("{} {}".format(k, v) for k, v in s["abs_delta_quantiles"].items()))
+            lines.append("身高分类一致率: {:.4%}，变化 {} 张".format(s["agreement"], s["flipped"]))
+            for flip, n in self.flips.most_common():
+                lines.append("  {:<10} {}".format(flip, n))
+        for err, n in self.errors.most_common():
+            lines.append("错误 {:<28} {}".format(err, n))
+        return "\n".join(lines)
+
+
+def load_report(path: str):
+    """按报告里的 kind 读成 LibraryStats 或 ShadowStats"""
+    with open(path, "r", encoding="utf-8") as f:
+        d = json.load(f)
+    return (ShadowStats if d.get("kind") == ShadowStats.KIND else LibraryStats).from_dict(d)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="合并并打印卡片库统计报告")
+    parser.add_argument("reports", nargs="+", help="--stats 生成的统计报告或 --shadow 生成的影子评分报告 JSON（同一种）")
+    parser.add_argument("--output", default=None, help="合并后的报告写入此路径")
+    args = parser.parse_args()
+
+    total = load_report(args.reports[0])
+    for path in args.reports[1:]:
+        other = load_report(path)
+        if type(other) is not type(total):
+            parser.error("不能混合合并卡片库统计和影子评分报告: {}".format(path))
+        total.merge(other)
+    print(total.report())
+    if args.output:
+        total.save(args.output)
+        print("\n合并后的统计已保存至: {}".format(args.output))
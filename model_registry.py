@@ -0,0 +1,177 @@
+# -*- coding:utf-8 -*-
+"""
+按卡片格式/版本选择身高模型的注册表：AI少女 和 恋活 的 shapeValueBody 布局不同，各用各的模型
+
+键的查找顺序：  "格式/版本"（如 "Koikatu/0.0.0"） → "格式"（"AiSyoujyo" / "Koikatu"） → "*"（默认模型）
+配置文件（JSON）把键映射到模型文件，相对路径以配置文件所在目录为准：
+    {"*": "height_xgb.pkl", "Koikatu": "height_kk.pkl", "AiSyoujyo/1.0.0": "height_ais_v1.pkl"}
+
+热替换：新模型在锁外加载完毕后，整张映射表一次性换成新的字典；
+批次开始时取一份 snapshot()，已经在途的批次继续用旧模型跑完，下一批才用新模型
+
+nthread 不为空时，注册表里的每个模型（包括之后热替换进来的）predict 都只用 nthread 个线程
+"""
+import hashlib
+import json
+import os
+import threading
+import uuid
+from typing import Dict, NamedTuple, Tuple
+
+import joblib
+
+from shards import file_sha256
+
+DEFAULT_KEY = "*"
+
+
+class ModelEntry(NamedTuple):
+    key: str
+    model: object
+    path: str
+    fingerprint: str
+
+
+def model_key(fmt: str, version: str = None) -> str:
+    return fmt if not version else "{}/{}".format(fmt, version)
+
+
+def set_model_threads(model, nthread: int) -> None:
+    """XGBRegressor 用 n_jobs，裸 Booster 用 nthread 参数"""
+    if hasattr(model, "set_params") and hasattr(model, "get_booster"):
+        model.set_params(n_jobs=nthread)
+        model.get_booster().set_param("nthread", nthread)
+    elif hasattr(model, "set_param"):
+        model.set_param("nthread", nthread)
+
+
+def model_fingerprint(model) -> str:
+    """
+    内存中模型的指纹：XGBoost 模型为序列化后树结构的 sha256，其他模型尽量按 pickle 计算；
+    算不出时返回一个随机值，journal / 分片 manifest 的一致性检查不会把它当成任何已有模型
+    """
+    booster = model.get_booster() if hasattr(model, "get_booster") else model
+    try:
+        if hasattr(booster, "save_raw"):
+            raw = bytes(booster.save_raw())
+        else:
+            import pickle
+            raw = pickle.dumps(model, protocol=4)
+    except Exception:
+        return "unknown:" + uuid.uuid4().hex
+    return "sha256:" + hashlib.sha256(raw).hexdigest()
+
+
+def load_model_config(config) -> Dict[str, str]:
+    """读取 {键: 模型路径} 配置；config 可以是 JSON 文件路径或字典"""
+    base = "."
+    if isinstance(config, str):
+        base = os.path.dirname(os.path.abspath(config))
+        with open(config, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    if not isinstance(config, dict) or not config:
+        raise ValueError("模型配置应为非空的 {键: 模型路径} 对象")
+    paths = {}
+    for key, path in config.items():
+        fmt = key.split("/", 1)[0]
+        if key != DEFAULT_KEY and fmt not in ("AiSyoujyo", "Koikatu"):
+            raise ValueError("模型键 {!r} 无效：应为 \"*\"、\"AiSyoujyo\"、\"Koikatu\" 或 \"格式/版本\"".format(key))
+        paths[key] = path if os.path.isabs(path) else os.path.join(base, path)
+    return paths
+
+
+class ModelRegistry:
+    def __init__(self, paths: Dict[str, str] = None, nthread: int = None):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.nthread = nthread
+        if paths:
+            self.reload(paths)
+
+    def _load_entry(self, key: str, path: str, model=None) -> ModelEntry:
+        """从 path 加载时指纹为文件的 sha256；直接传入 model 时按模型本身计算，与 path 上的文件无关"""
+        if model is None:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"找不到模型文件: {path}  （模型键 {key}）")
+            model = joblib.load(path)
+            fingerprint = file_sha256(path)
+        else:
+            fingerprint = model_fingerprint(model)
+        if self.nthread:
+            set_model_threads(model, self.nthread)
+        return ModelEntry(key, model, path, fingerprint)
+
+    def set_nthread(self, nthread: int) -> None:
+        """限制所有模型 predict 的线程数；None / 0 表示之后加载的模型保持各自的线程设置"""
+        self.nthread = nthread
+        if nthread:
+            for entry in self._entries.values():
+                set_model_threads(entry.model, nthread)
+
+    def snapshot(self) -> Dict[str, ModelEntry]:
+        """当前的 {键: ModelEntry}；返回的字典之后不会再被修改，整批预测都应使用同一份"""
+        return self._entries
+
+    def _publish(self, entries: Dict[str, ModelEntry]) -> None:
+        with self._lock:
+            self._entries = entries
+            self.generation += 1
+
+    def swap(self, key: str, path: str, model=None) -> ModelEntry:
+        """
+        加载（或直接使用传入的 model）并替换一个键的模型，返回被替换的旧条目（没有则为 None）。
+        加载失败时抛出异常，注册表保持不变
+        """
+        entry = self._load_entry(key, path, model)
+        with self._lock:
+            old = self._entries.get(key)
+            entries = dict(self._entries)
+            entries[key] = entry
+            self._entries = entries
+            self.generation += 1
+        return old
+
+    def remove(self, key: str) -> ModelEntry:
+        with self._lock:
+            entries = dict(self._entries)
+            old = entries.pop(key, None)
+            self._entries = entries
+            self.generation += 1
+        return old
+
+    def reload(self, config) -> None:
+        """按配置整体替换：所有模型都加载成功后才一次性生效，任何一个失败则保持原状"""
+        paths = load_model_config(config)
+        self._publish({key: self._load_entry(key, path) for key, path in paths.items()})
+
+    @staticmethod
+    def resolve(entries: Dict[str, ModelEntry], fmt: str, version: str = None) -> ModelEntry:
+        for key in (model_key(fmt, version), fmt, DEFAULT_KEY):
+            entry = entries.get(key)
+            if entry is not None:
+                return entry
+        raise KeyError("没有适用于 {} 卡片的身高模型".format(model_key(fmt, version)))
+
+    def get(self, fmt: str, version: str = None) -> ModelEntry:
+        return self.resolve(self._entries, fmt, version)
+
+    @property
+    def default(self) -> ModelEntry:
+        return self._entries.get(DEFAULT_KEY)
+
+    def fingerprint(self) -> str:
+        """
+        只有默认模型时就是该模型文件的 sha256（与单模型时的指纹相同）；
+        多个模型时为各 键:sha256 排序后的 sha256
+        """
+        entries = self._entries
+        if set(entries) == {DEFAULT_KEY}:
+            return entries[DEFAULT_KEY].fingerprint
+        h = hashlib.sha256()
+        for key in sorted(entries):
+            h.update("{}:{}\n".format(key, entries[key].fingerprint).encode("utf-8"))
+        return h.hexdigest()
+
+    def describe(self) -> Dict[str, Tuple[str, str]]:
+        return {key: (e.path, e.fingerprint) for key, e in sorted(self._entries.items())}
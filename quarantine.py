@@ -0,0 +1,193 @@
+# -*- coding:utf-8 -*-
+"""
+坏卡隔离名单（JSONL）：结构校验未通过的卡片记下 路径、大小、mtime、内容哈希和原因，
+之后的运行中大小和 mtime 都没变的直接跳过，连文件都不读；
+只有 mtime 变了就重新算哈希，内容相同仍然跳过，内容变了则移出名单重新分析
+
+每行一条记录，按路径以最后一条为准：
+    {"path", "size", "mtime_ns", "hash", "reason", "detail", "time"}
+    {"path", "released": true}        移出名单
+
+    python BodyDataAnalyzer.py ../cards --quarantine quarantine.jsonl
+    python quarantine.py quarantine.jsonl [--release PATH ...] [--clear]
+"""
+import json
+import os
+import threading
+import time
+from collections import Counter
+from typing import Dict, List
+
+from shards import file_sha256
+
+
+class CardQuarantined(ValueError):
+    """卡片在隔离名单中，未读取"""
+
+    def __init__(self, entry: Dict):
+        super().__init__(f"已隔离（{entry['reason']}）: {entry.get('detail', '')}")
+        self.entry = entry
+
+
+class Quarantine:
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}  # path -> 最新记录
+        self._lock = threading.Lock()
+        self._pending = None  # defer() 之后待交回父进程的记录
+        if os.path.exists(path):
+            self._recover()
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._f = open(path, "ab")
+
+    def _recover(self) -> None:
+        good = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                record = self._decode(line)
+                if record is None:
+                    break
+                if record.get("released"):
+                    self.entries.pop(record["path"], None)
+                else:
+                    self.entries[record["path"]] = record
+                good += len(line)
+            size = f.seek(0, os.SEEK_END)
+        if good < size:
+            # 截掉崩溃时写了一半的尾行
+            with open(self.path, "r+b") as f:
+                f.truncate(good)
+
+    @staticmethod
+    def _decode(line: bytes):
+        if not line.endswith(b"\n"):
+            return None
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        return record if isinstance(record, dict) and "path" in record else None
+
+    def _write(self, record: Dict) -> None:
+        # 每条都立即 flush：名单很少变化，而且 fork 出的子进程不会带着未写出的缓冲
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(record)
+            else:
+                self._f.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+                self._f.flush()
+            if record.get("released"):
+                self.entries.pop(record["path"], None)
+            else:
+                self.entries[record["path"]] = record
+
+    def check(self, path: str):
+        """卡片仍在名单中时返回记录，否则返回 None；文件已变化的条目顺便移出名单"""
+        entry = self.entries.get(path)
+        if entry is None:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if st.st_size != entry["size"]:
+            self.release(path)
+            return None
+        if st.st_mtime_ns != entry["mtime_ns"]:
+            if file_sha256(path) != entry["hash"]:
+                self.release(path)
+                return None
+            entry = dict(entry, mtime_ns=st.st_mtime_ns)
+            self._write(entry)
+        return entry
+
+    def add(self, path: str, reason: str, detail: str = "", hash_: str = None) -> Dict:
+        """记录一张坏卡；hash_ 为空时从文件计算。路径不是普通文件（压缩包成员、字节流）时不记录，返回 None"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        record = {"path": path, "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                  "hash": hash_ or file_sha256(path), "reason": reason, "detail": detail,
+                  "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        self._write(record)
+        return record
+
+    def defer(self) -> None:
+        """
+        fork 出的子进程调用：之后的记录只更新本进程的名单，不写文件，攒着由 take_pending() 交回父进程，
+        再由父进程 apply()；各子进程不会同时往继承来的同一个文件句柄里追加，父进程的汇总也不会漏数
+        """
+        with self._lock:
+            self._pending = []
+
+    def take_pending(self) -> List[Dict]:
+        """取走 defer() 之后攒下的记录；未 defer() 时返回空列表"""
+        with self._lock:
+            if self._pending is None:
+                return []
+            pending, self._pending = self._pending, []
+        return pending
+
+    def apply(self, records: List[Dict]) -> None:
+        """写入子进程交回的记录（新增 / 移出 / mtime 更新）"""
+        for record in records:
+            self._write(record)
+
+    def release(self, path: str) -> bool:
+        if path not in self.entries:
+            return False
+        self._write({"path": path, "released": True})
+        return True
+
+    def clear(self) -> int:
+        paths = list(self.entries)
+        for path in paths:
+            self.release(path)
+        return len(paths)
+
+    def records(self) -> List[Dict]:
+        return [self.entries[p] for p in sorted(self.entries)]
+
+    def summary(self) -> Counter:
+        """{原因: 张数}"""
+        return Counter(e["reason"] for e in self.entries.values())
+
+    def close(self) -> None:
+        if not self._f.closed:
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.entries
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="查看或整理坏卡隔离名单")
+    parser.add_argument("path", help="隔离名单 JSONL")
+    parser.add_argument("--release", nargs="+", default=None, metavar="CARD", help="把这些卡片移出名单")
+    parser.add_argument("--clear", action="store_true", help="清空名单，下次运行全部重新校验")
+    args = parser.parse_args()
+
+    with Quarantine(args.path) as q:
+        if args.release:
+            for card in args.release:
+                print(f"{card}: {'已移出' if q.release(card) else '不在名单中'}")
+        if args.clear:
+            print(f"已清空 {q.clear()} 条")
+        print(f"隔离名单: {args.path}  共 {len(q)} 张")
+        for reason, n in q.summary().most_common():
+            print(f"  {reason:<14} {n}")
+        for e in q.records():
+            print(f"{e['path']}  [{e['reason']}] {e.get('detail', '')}")
@@ -0,0 +1,57 @@
+# -*- coding:utf-8 -*-
+"""
+按文件大小调度的并行批量分析：卡片从 200 KB 到几十 MB 不等，按路径顺序切块时，
+最后几个装着巨型卡的任务会让一个进程跑到最后、其余进程空等。
+
+    scan_card_sizes   一次 os.scandir 拿到路径和大小
+    plan_batches      从大到小排序，按张数和总字节数装箱：巨型卡单独成为一个任务，越往后任务越轻
+任务按这个顺序放进进程池的共享队列，哪个进程空闲就取走下一个，相当于所有进程从同一个队列里“偷”任务，
+最慢的大卡最先开始，收尾阶段只剩小任务，各进程几乎同时结束
+"""
+import os
+from typing import List, Tuple
+
+# 不指定 batch_bytes 时，每个任务约为总字节数的 1 / (进程数 * TASKS_PER_WORKER)，限制在上下限之间
+TASKS_PER_WORKER = 8
+MIN_BATCH_BYTES = 1024 * 1024
+MAX_BATCH_BYTES = 64 * 1024 * 1024
+
+
+def scan_card_sizes(directory_path: str, suffix: str = ".png") -> List[Tuple[str, int]]:
+    """目录下的 (卡片路径, 字节数)，按路径排序；取不到大小的记为 0"""
+    entries = []
+    with os.scandir(directory_path) as it:
+        for entry in it:
+            if entry.name.lower().endswith(suffix) and not entry.is_dir():
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    size = 0
+                entries.append((entry.path, size))
+    return sorted(entries)
+
+
+def auto_batch_bytes(entries: List[Tuple[str, int]], workers: int) -> int:
+    total = sum(size for _, size in entries)
+    return min(max(total // (max(workers, 1) * TASKS_PER_WORKER), MIN_BATCH_BYTES), MAX_BATCH_BYTES)
+
+
+def plan_batches(entries: List[Tuple[str, int]], batch_size: int = 64, batch_bytes: int = None,
+                 workers: int = 1) -> List[List[str]]:
+    """
+    从大到小装箱：每个任务最多 batch_size 张、总大小不超过 batch_bytes（单张超过的卡自己一个任务；
+    为空时按 auto_batch_bytes(entries, workers)）。返回的任务按第一张卡的大小从大到小排列
+    """
+    if batch_bytes is None:
+        batch_bytes = auto_batch_bytes(entries, workers)
+    batches = []
+    batch, total = [], 0
+    for path, size in sorted(entries, key=lambda e: (-e[1], e[0])):
+        if batch and (len(batch) >= batch_size or total + size > batch_bytes):
+            batches.append(batch)
+            batch, total = [], 0
+        batch.append(path)
+        total += size
+    if batch:
+        batches.append(batch)
+    return batches
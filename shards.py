@@ -0,0 +1,146 @@
+# -*- coding:utf-8 -*-
+"""
+分片批量分析：按卡片相对路径的稳定哈希把目录分成 N 片，每片写一个 JSONL 结果文件和一个 manifest；
+merge_shards 校验所有 manifest 后按 file_path 归并，逐行读取，不把结果整体载入内存
+
+    python BodyDataAnalyzer.py ../cards --shard 0/4 --output out/results.jsonl
+    python BodyDataAnalyzer.py --merge out/*.manifest.json --output merged.json
+"""
+import hashlib
+import heapq
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+def parse_shard_spec(spec: str) -> Tuple[int, int]:
+    """把 "i/N" 解析为 (i, N)，要求 0 <= i < N"""
+    try:
+        index, total = (int(x) for x in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"分片格式应为 i/N: {spec}") from None
+    if total < 1 or not 0 <= index < total:
+        raise ValueError(f"分片编号超出范围: {spec}")
+    return index, total
+
+
+def shard_of(key: str, num_shards: int) -> int:
+    """与进程、机器、PYTHONHASHSEED 无关的稳定分片编号"""
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % num_shards
+
+
+def shard_key(directory_path: str, file_path: str) -> str:
+    # 用相对目录的 POSIX 路径做键，不同机器上挂载点不同也能分到同一片
+    return os.path.relpath(file_path, directory_path).replace(os.sep, "/")
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return "sha256:" + h.hexdigest()
+
+
+def shard_output_path(output: str, index: int, total: int) -> str:
+    """results.jsonl -> results.shard-0-of-4.jsonl"""
+    root, ext = os.path.splitext(output)
+    return f"{root}.shard-{index}-of-{total}{ext or '.jsonl'}"
+
+
+def manifest_path(results_path: str) -> str:
+    return os.path.splitext(results_path)[0] + MANIFEST_SUFFIX
+
+
+def write_shard(results: Iterable[Dict], results_path: str, manifest: Dict) -> Dict:
+    """
+    逐条写出结果（每行一个 JSON），边写边算校验和；全部写完后才写 manifest，
+    所以有 manifest 的分片一定是完整的。返回写入的 manifest
+    """
+    os.makedirs(os.path.dirname(results_path) or ".", exist_ok=True)
+    h = hashlib.sha256()
+    count = success = 0
+    with open(results_path, "wb") as f:
+        for r in results:
+            line = (json.dumps(r, ensure_ascii=False) + "\n").encode("utf-8")
+            f.write(line)
+            h.update(line)
+            count += 1
+            success += bool(r.get("success"))
+    manifest = dict(manifest, results=os.path.basename(results_path), count=count,
+                    success=success, checksum="sha256:" + h.hexdigest())
+    with open(manifest_path(results_path), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def load_manifests(paths: List[str]) -> List[Tuple[str, Dict]]:
+    """
+    读取并校验一组分片 manifest：模型指纹和分片数一致、编号 0..N-1 各出现一次、
+    结果文件的校验和与行数和 manifest 相符。返回 [(结果文件路径, manifest)]，按分片编号排序
+    """
+    shards = []
+    for p in paths:
+        with open(p, "r", encoding="utf-8") as f:
+            m = json.load(f)
+        shards.append((os.path.join(os.path.dirname(p), m["results"]), m))
+    if not shards:
+        raise ValueError("没有要合并的分片")
+
+    first = shards[0][1]
+    for _, m in shards:
+        for key in ("num_shards", "model_fingerprint"):
+            if m[key] != first[key]:
+                raise ValueError(f"分片 {m['shard']} 的 {key} 不一致: {m[key]} != {first[key]}")
+    indices = sorted(m["shard"] for _, m in shards)
+    if indices != list(range(first["num_shards"])):
+        raise ValueError(f"分片不完整或重复: 共 {first['num_shards']} 片，收到 {indices}")
+
+    for results_path, m in shards:
+        checksum = file_sha256(results_path)
+        if checksum != m["checksum"]:
+            raise ValueError(f"分片 {m['shard']} 校验和不符: {results_path}")
+        with open(results_path, "rb") as f:
+            lines = sum(1 for _ in f)
+        if lines != m["count"]:
+            raise ValueError(f"分片 {m['shard']} 行数 {lines} 与 manifest 记录的 {m['count']} 不符")
+    return sorted(shards, key=lambda s: s[1]["shard"])
+
+
+def iter_shard_results(results_path: str) -> Iterator[Dict]:
+    with open(results_path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def write_json_array(items: Iterable[Dict], output_file: str) -> int:
+    """逐条写出 JSON 数组，格式与 json.dump(list, indent=2) 完全相同；返回条数"""
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    n = 0
+    with open(output_file, "w", encoding="utf-8") as f:
+        for item in items:
+            body = json.dumps(item, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+            f.write(("[\n  " if n == 0 else ",\n  ") + body)
+            n += 1
+        f.write("\n]" if n else "[]")
+    return n
+
+
+def merge_shards(manifest_paths: List[str], output_file: str) -> Dict:
+    """
+    校验后把各分片按 file_path 归并写成一个 analysis_results.json 格式的文件；
+    每个分片内部已按 file_path 排序，heapq.merge 每片只持有一条结果
+    """
+    shards = load_manifests(manifest_paths)
+    streams = [iter_shard_results(results_path) for results_path, _ in shards]
+    count = write_json_array(heapq.merge(*streams, key=lambda r: r["file_path"]), output_file)
+    first = shards[0][1]
+    return {
+        "num_shards": first["num_shards"],
+        "model_fingerprint": first["model_fingerprint"],
+        "count": count,
+        "success": sum(m["success"] for _, m in shards),
+    }
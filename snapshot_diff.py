@@ -0,0 +1,258 @@
+# -*- coding:utf-8 -*-
+"""
+两次分析结果的快照差异：按 file_path 排序后流式归并，只输出变化的卡片（JSONL），供下游增量更新。
+
+    new            只在新结果中
+    removed        只在旧结果中
+    modified       内容哈希变了（两边都没有 content_hash 时比较 success / height_cm / error），分类没变
+    recategorized  height_category、combined_tag 或审美分类变了（含成功↔失败；--thresholds / --reclassify
+                   只改审美分类时也算），content_changed 注明内容是否也变了
+
+输入可以是 analysis_results.json（JSON 数组）或分片 / 运行日志的 JSONL，不必按路径排序
+（没有 file_path 的记录，如运行日志的头部，直接跳过）：
+每条结果只取比较用的几个字段，凑满 run_size 条排序后写成临时文件，最后 heapq.merge 归并，
+内存只与 run_size 有关，与卡片库大小和未变化的卡片数无关。同一路径出现多次时以最后一条为准
+
+    python BodyDataAnalyzer.py --diff old/analysis_results.json new/analysis_results.json --output changes.jsonl
+    python snapshot_diff.py OLD NEW [-o changes.jsonl]
+"""
+import heapq
+import json
+import os
+import pickle
+import re
+import sys
+import tempfile
+from collections import Counter
+from itertools import groupby
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# 每个临时有序段的条数；只取比较字段后每条约 200 字节
+RUN_SIZE = 50000
+# 有序段按块 pickle 写入，归并时每段只载入一块
+SPILL_BLOCK = 1024
+CHUNK_SIZE = 1024 * 1024
+
+_SEP = re.compile(r"[\s,]*")
+
+
+def iter_json_array(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[Dict]:
+    """逐条读取 JSON 数组文件，缓冲区只保留当前未解析完的部分"""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = f.read(chunk_size)
+        pos = _SEP.match(buf).end()
+        if buf[pos:pos + 1] != "[":
+            raise ValueError(f"不是 JSON 数组: {path}")
+        pos += 1
+        eof = False
+        while True:
+            pos = _SEP.match(buf, pos).end()
+            if pos < len(buf):
+                if buf[pos] == "]":
+                    return
+                try:
+                    item, pos = decoder.raw_decode(buf, pos)
+                except ValueError:
+                    if eof:
+                        raise
+                else:
+                    yield item
+                    continue
+            elif eof:
+                raise ValueError(f"JSON 数组没有结束: {path}")
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+
+
+def iter_results(path: str) -> Iterator[Dict]:
+    """
+    按第一个非空白字符判断格式：[ 为 JSON 数组，否则按 JSONL 逐行读取；
+    只产出带 file_path 的结果，运行日志的头部记录等跳过
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        head = f.read(4096).lstrip()
+    if head.startswith("["):
+        records = iter_json_array(path)
+    else:
+        records = _iter_jsonl(path)
+    for record in records:
+        if isinstance(record, dict) and "file_path" in record:
+            yield record
+
+
+def _iter_jsonl(path: str) -> Iterator[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _project(r: Dict) -> List:
+    # [file_path, content_hash, success, height_category, height_cm, error, combined_tag, 审美分类]
+    return [r["file_path"], r.get("content_hash"), bool(r.get("success")), r.get("height_category"),
+            r.get("height_cm"), r.get("error"), r.get("combined_tag"), pack_labels(r.get("aesthetic_classifications"))]
+
+
+# 审美分类压成一个字符串再比较，每条比较记录不必带一个字典
+_LABEL_SEP, _PAIR_SEP = "\x1f", "\x1e"
+
+
+def pack_labels(classifications: Optional[Dict]) -> Optional[str]:
+    """{参数: 分类} -> 按键排序拼成的字符串，相同分类得到相同字符串；为空时返回 None"""
+    if not classifications:
+        return None
+    return _LABEL_SEP.join(f"{k}{_PAIR_SEP}{v}" for k, v in sorted(classifications.items()))
+
+
+def unpack_labels(packed: str) -> Dict:
+    return dict(item.split(_PAIR_SEP, 1) for item in packed.split(_LABEL_SEP))
+
+
+def _path(record: List) -> str:
+    return record[0]
+
+
+def _spill(run: List[List], tmp_dir: str, index: int) -> str:
+    # 临时文件只由本进程写、本进程读，用 pickle 而不是 JSON，写出和读回都快几倍
+    path = os.path.join(tmp_dir, f"run-{index:05d}.pkl")
+    with open(path, "wb") as f:
+        for i in range(0, len(run), SPILL_BLOCK):
+            pickle.dump(run[i:i + SPILL_BLOCK], f, pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def _iter_run(path: str) -> Iterator[List]:
+    with open(path, "rb") as f:
+        while True:
+            try:
+                block = pickle.load(f)
+            except EOFError:
+                return
+            yield from block
+
+
+def sorted_snapshot(results: Iterable[Dict], tmp_dir: str, run_size: int = RUN_SIZE) -> Iterator[List]:
+    """
+    把一组结果变成按 file_path 排序的比较记录流；超过 run_size 条时分段排序写入 tmp_dir 再归并。
+    排序和归并都是稳定的，同一路径的记录保持输入顺序，只保留最后一条
+    """
+    runs, run = [], []
+    for r in results:
+        run.append(_project(r))
+        if len(run) >= run_size:
+            run.sort(key=_path)
+            runs.append(_spill(run, tmp_dir, len(runs)))
+            run = []
+    run.sort(key=_path)
+    if runs:
+        runs.append(_spill(run, tmp_dir, len(runs)))
+        merged = heapq.merge(*(_iter_run(p) for p in runs), key=_path)
+    else:
+        merged = iter(run)
+    for _, same_path in groupby(merged, key=_path):
+        for record in same_path:
+            pass
+        yield record
+
+
+def _state(record: List) -> Dict:
+    state = {"height_category": record[3], "height_cm": record[4]}
+    if record[6] is not None:
+        state["combined_tag"] = record[6]
+    if record[7] is not None:
+        state["aesthetic_classifications"] = unpack_labels(record[7])
+    if record[1] is not None:
+        state["content_hash"] = record[1]
+    if not record[2]:
+        state["error"] = record[5]
+    return state
+
+
+def compare(old: List, new: List) -> Optional[Dict]:
+    """同一路径的两条比较记录，没有变化时返回 None"""
+    if old[1] is not None and new[1] is not None:
+        content_changed = old[1] != new[1]
+    else:
+        content_changed = (old[2], old[4], old[5]) != (new[2], new[4], new[5])
+    # combined_tag 不含腰围分类，审美分类要单独比较
+    if (old[3], old[6], old[7]) != (new[3], new[6], new[7]):
+        change = {"change": "recategorized", "file_path": new[0], "old_category": old[3],
+                  "content_changed": content_changed}
+        if old[6] != new[6]:
+            change["old_combined_tag"] = old[6]
+    elif content_changed:
+        change = {"change": "modified", "file_path": new[0]}
+        if old[1] is not None:
+            change["old_hash"] = old[1]
+    else:
+        return None
+    change.update(_state(new))
+    return change
+
+
+def diff_snapshots(old: Iterator[List], new: Iterator[List], counts: Counter = None) -> Iterator[Dict]:
+    """归并两个按 file_path 排序的比较记录流，逐条产出变化；counts 不为空时累计各类变化和 unchanged 数"""
+    if counts is None:
+        counts = Counter()
+    o, n = next(old, None), next(new, None)
+    while o is not None or n is not None:
+        if n is None or (o is not None and o[0] < n[0]):
+            change = {"change": "removed", "file_path": o[0]}
+            o = next(old, None)
+        elif o is None or n[0] < o[0]:
+            change = dict({"change": "new", "file_path": n[0]}, **_state(n))
+            n = next(new, None)
+        else:
+            change = compare(o, n)
+            o, n = next(old, None), next(new, None)
+        if change is None:
+            counts["unchanged"] += 1
+        else:
+            counts[change["change"]] += 1
+            yield change
+
+
+def diff_files(old_path: str, new_path: str, output: str = None, run_size: int = RUN_SIZE,
+               tmp_dir: str = None) -> Counter:
+    """
+    比较两个结果文件，把变化逐行写到 output（JSONL；为空时写到标准输出）。
+    返回 {new / removed / modified / recategorized / unchanged: 张数}
+    """
+    counts = Counter()
+    with tempfile.TemporaryDirectory(prefix="bda_diff_", dir=tmp_dir) as work:
+        old_dir, new_dir = os.path.join(work, "old"), os.path.join(work, "new")
+        os.mkdir(old_dir)
+        os.mkdir(new_dir)
+        changes = diff_snapshots(sorted_snapshot(iter_results(old_path), old_dir, run_size),
+                                 sorted_snapshot(iter_results(new_path), new_dir, run_size), counts)
+        if output is None:
+            for change in changes:
+                sys.stdout.write(json.dumps(change, ensure_ascii=False) + "\n")
+        else:
+            os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+            with open(output, "w", encoding="utf-8") as f:
+                for change in changes:
+                    f.write(json.dumps(change, ensure_ascii=False) + "\n")
+    return counts
+
+
+def format_counts(counts: Counter) -> str:
+    return "  ".join(f"{key} {counts[key]}" for key in ("new", "removed", "modified", "recategorized", "unchanged"))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="比较两次分析结果，输出变化的卡片（JSONL）")
+    parser.add_argument("old", help="旧结果（JSON 数组或 JSONL）")
+    parser.add_argument("new", help="新结果（JSON 数组或 JSONL）")
+    parser.add_argument("-o", "--output", default=None, help="变化集 JSONL 路径，默认写到标准输出")
+    parser.add_argument("--run-size", type=int, default=RUN_SIZE, help="每个临时有序段的条数（决定内存上限）")
+    parser.add_argument("--tmp-dir", default=None, help="临时有序段所在目录，默认系统临时目录")
+    args = parser.parse_args()
+
+    counts = diff_files(args.old, args.new, args.output, args.run_size, args.tmp_dir)
+    print(format_counts(counts), file=sys.stderr if args.output is None else sys.stdout)
@@ -0,0 +1,32 @@
+# -*- coding:utf-8 -*-
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 仓库根目录（分析器与 chara_loader）和 benchmarks（合成卡片生成器）
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+
+@pytest.fixture(scope="session")
+def models(tmp_path_factory):
+    """AI少女 / 恋活 各一个合成模型的 --models 配置，整个测试会话只训练一次"""
+    from synth_cards import train_synthetic_models
+    return train_synthetic_models(str(tmp_path_factory.mktemp("models")), n_estimators=50)
+
+
+@pytest.fixture
+def analyzer(models):
+    from BodyDataAnalyzer import BodyDataAnalyzer
+    return BodyDataAnalyzer(models=models)
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """40 张合成卡片（约 30% 恋活）所在目录"""
+    from synth_cards import write_corpus
+    directory = str(tmp_path / "corpus")
+    write_corpus(directory, 40, seed=2)
+    return directory
@@ -0,0 +1,65 @@
+# -*- coding:utf-8 -*-
+"""多进程模式：结果与串行一致，路径按需拉取，在途任务数有上限"""
+import pytest
+
+
+@pytest.fixture
+def pool(analyzer):
+    pool = analyzer.forked_pool(2)
+    yield pool
+    pool.shutdown()
+
+
+def test_forked_matches_serial(analyzer, corpus, pool):
+    serial = analyzer.batch_analyze(corpus)
+    paths = [r["file_path"] for r in serial]
+    assert list(analyzer.iter_analyze_forked(paths, batch_size=6, pool=pool)) == serial
+
+
+def test_forked_keeps_a_bounded_window(analyzer, corpus, pool):
+    paths = analyzer.list_card_paths(corpus)
+    pulled = []
+
+    def lazy_paths():
+        for p in paths:
+            pulled.append(p)
+            yield p
+
+    results = analyzer.iter_analyze_forked(lazy_paths(), batch_size=2, pool=pool, prefetch=3)
+    first = next(results)
+    # 取走第一个任务后补交一个：最多 3 个任务在途，共拉取 4 个任务的路径
+    assert len(pulled) == 4 * 2
+    rest = list(results)
+    assert [r["file_path"] for r in [first] + rest] == paths
+
+
+def test_worker_profile_is_merged(analyzer, corpus):
+    from chara_loader import PROFILER
+
+    paths = analyzer.list_card_paths(corpus)
+    PROFILER.reset()
+    PROFILER.enable()
+    try:
+        # 进程池在开启计时后创建，子进程继承 enabled；fork 前父进程已有的计时不会被子进程重复交回
+        PROFILER.count("before_fork")
+        pool = analyzer.forked_pool(2)
+        try:
+            list(analyzer.iter_analyze_forked(paths, batch_size=7, pool=pool))
+            list(analyzer.iter_analyze_scheduled([(p, 1) for p in paths], batch_size=7, pool=pool))
+        finally:
+            pool.shutdown()
+        stats = PROFILER.snapshot()
+    finally:
+        PROFILER.disable()
+        PROFILER.reset()
+    assert stats["timings"]["parse"][0] == 2 * len(paths)
+    assert stats["counters"]["before_fork"] == 1
+
+
+@pytest.mark.parametrize("extra", [["--processes", "2"], ["--processes", "2", "--schedule"]])
+def test_explain_is_rejected_with_processes(corpus, extra, capsys):
+    from BodyDataAnalyzer import main
+
+    with pytest.raises(SystemExit):
+        main([corpus, "--explain", "3"] + extra)
+    assert "--processes" in capsys.readouterr().err
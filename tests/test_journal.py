@@ -0,0 +1,75 @@
+# -*- coding:utf-8 -*-
+"""断点续跑：一时的失败（解码超时等）不记入运行日志，重跑时重试；坏卡的失败记入日志，不再重复分析"""
+import json
+import os
+
+import pytest
+
+from BodyDataAnalyzer import main
+
+
+def journal_records(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f][1:]
+
+
+def test_transient_failures_are_retried(analyzer, corpus, tmp_path):
+    with open(os.path.join(corpus, "junk.png"), "wb") as f:
+        f.write(b"not a card")
+    journal = str(tmp_path / "run.jsonl")
+
+    analyzer.CARD_DEADLINE = 1e-9  # 每张卡都解码超时
+    first = analyzer.batch_analyze_resumable(corpus, journal)
+    assert all(not r["success"] for r in first)
+    assert sum(bool(r.get("timeout")) for r in first) == len(first) - 1
+    # 只有坏卡记入日志
+    assert [r["file_name"] for r in journal_records(journal)] == ["junk.png"]
+
+    analyzer.CARD_DEADLINE = None
+    second = analyzer.batch_analyze_resumable(corpus, journal)
+    assert [r["file_path"] for r in second] == [r["file_path"] for r in first]
+    assert all(r["success"] for r in second if r["file_name"] != "junk.png")
+    assert len(journal_records(journal)) == len(second)
+
+    # 全部完成后再跑一次，不再分析任何卡片
+    analyzer.CARD_DEADLINE = 1e-9
+    assert analyzer.batch_analyze_resumable(corpus, journal) == second
+
+
+def test_failures_in_old_journals_are_retried(analyzer, corpus, tmp_path):
+    journal = str(tmp_path / "run.jsonl")
+    expected = analyzer.batch_analyze_resumable(corpus, journal)
+    # 模拟旧版本写入的一时失败记录：以最后一条为准
+    with open(journal, "a", encoding="utf-8") as f:
+        f.write(json.dumps(dict(expected[0], success=False, error="OSError: 网络盘掉线")) + "\n")
+    assert analyzer.batch_analyze_resumable(corpus, journal) == expected
+
+
+def test_explain_is_rejected_with_journal(analyzer, corpus, tmp_path):
+    journal = str(tmp_path / "run.jsonl")
+    with pytest.raises(ValueError, match="explain_top_k"):
+        analyzer.batch_analyze_resumable(corpus, journal, pipeline=True, explain_top_k=3)
+    assert not os.path.exists(journal)
+    with pytest.raises(SystemExit):
+        main([corpus, "--journal", journal, "--explain", "3"])
+
+
+def test_thresholds_and_shadow_are_part_of_the_header(analyzer, corpus, models, tmp_path):
+    from journal import JournalMismatch
+
+    journal = str(tmp_path / "run.jsonl")
+    expected = analyzer.batch_analyze_resumable(corpus, journal)
+
+    analyzer.set_thresholds({"AESTHETIC_CATEGORIES": {"muscle": {"low": 0.1}}})
+    with pytest.raises(JournalMismatch, match="thresholds_fingerprint"):
+        analyzer.batch_analyze_resumable(corpus, journal)
+    analyzer.AESTHETIC_CATEGORIES = type(analyzer).AESTHETIC_CATEGORIES
+    assert analyzer.batch_analyze_resumable(corpus, journal) == expected
+
+    analyzer.set_shadow_models(models)
+    with pytest.raises(JournalMismatch, match="shadow_fingerprint"):
+        analyzer.batch_analyze_resumable(corpus, journal)
+    # 确认后重新开始，新日志记下候选模型
+    restarted = analyzer.batch_analyze_resumable(corpus, journal, restart=True)
+    assert all("shadow" in r for r in restarted if r["success"])
+    assert len(analyzer.batch_analyze_resumable(corpus, journal)) == len(restarted)
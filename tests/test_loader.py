@@ -0,0 +1,49 @@
+# -*- coding:utf-8 -*-
+"""加载器：轻量加载不解码 KKEx、不保留缩略图和恋活头像；按需解码的服装列表改动后仍能正确写回"""
+import random
+
+import pytest
+
+from chara_loader import CompactKoikatuCharaData, KoikatuCharaData
+from synth_cards import make_kk_card
+
+
+@pytest.fixture
+def kk_card():
+    return bytes(make_kk_card(random.Random(0), kkex_size=4096))
+
+
+@pytest.mark.parametrize("loader", [KoikatuCharaData, CompactKoikatuCharaData])
+def test_lightweight_skips_kkex_and_face_image(kk_card, loader):
+    full = loader.load(kk_card)
+    light = loader.load(kk_card, keep_image=False, keep_unknown=False)
+
+    assert light.image is None and light.face_image is None
+    offset, length = light.face_image_span
+    assert kk_card[offset:offset + length] == full.face_image
+    assert light.KKEx.data is None
+    assert "KKEx" in light.unknown_blockdata
+    assert light.blockdata == full.blockdata
+    assert light.Custom.data == full.Custom.data
+    assert light.Parameter.data == full.Parameter.data
+
+
+def test_full_load_still_round_trips(kk_card):
+    full = KoikatuCharaData.load(kk_card)
+    assert full.KKEx.data["mod"]
+    assert bytes(full) == kk_card
+
+
+def test_outfit_slice_assignment_keeps_raw_in_step(kk_card):
+    chara = KoikatuCharaData.load(kk_card)
+    outfits = chara.Coordinate.data
+    first, last = outfits[0], outfits[-1]
+    outfits[1:-1] = [first, last]
+    assert len(outfits) == 4
+    # 外层结构完整，重新加载后得到同样的服装
+    reloaded = KoikatuCharaData.load(bytes(chara))
+    assert list(reloaded.Coordinate.data) == [first, first, last, last]
+
+    with pytest.raises(ValueError):
+        outfits[::2] = [first]
+    assert len(outfits) == 4 and bytes(KoikatuCharaData.load(bytes(chara))) == bytes(chara)
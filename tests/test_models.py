@@ -0,0 +1,48 @@
+# -*- coding:utf-8 -*-
+"""模型注册表：直接赋值的模型按内容计算指纹，SIGHUP 在后台线程重新加载"""
+import json
+import os
+import signal
+import time
+
+import joblib
+import pytest
+
+from BodyDataAnalyzer import BodyDataAnalyzer, install_reload_handler
+from synth_cards import train_synthetic_model
+
+
+def test_assigned_model_changes_fingerprint(tmp_path):
+    first = train_synthetic_model(str(tmp_path / "a.pkl"), n_estimators=20)
+    second = train_synthetic_model(str(tmp_path / "b.pkl"), n_estimators=20, seed=5)
+    analyzer = BodyDataAnalyzer(first)
+    on_disk = analyzer.model_fingerprint
+
+    analyzer.model = joblib.load(second)
+    assigned = analyzer.model_fingerprint
+    assert assigned != on_disk
+
+    # 同样内容的模型指纹相同，不同内容的不同
+    analyzer.model = joblib.load(second)
+    assert analyzer.model_fingerprint == assigned
+    analyzer.model = joblib.load(first)
+    assert analyzer.model_fingerprint != assigned
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGHUP"), reason="没有 SIGHUP")
+def test_sighup_reloads_off_the_main_thread(tmp_path, models):
+    config = str(tmp_path / "models.json")
+    with open(config, "w", encoding="utf-8") as f:
+        json.dump(models, f)
+    analyzer = BodyDataAnalyzer(models=config)
+    generation = analyzer.registry.generation
+    previous = signal.getsignal(signal.SIGHUP)
+    try:
+        install_reload_handler(analyzer, config)
+        os.kill(os.getpid(), signal.SIGHUP)
+        deadline = time.monotonic() + 30
+        while analyzer.registry.generation == generation and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert analyzer.registry.generation == generation + 1
+    finally:
+        signal.signal(signal.SIGHUP, previous)
@@ -0,0 +1,36 @@
+# -*- coding:utf-8 -*-
+"""流水线模式：与串行结果一致，读取阶段出错时不会卡死，异常在调用方线程重新抛出"""
+import threading
+
+import pytest
+
+
+def test_pipelined_matches_serial(analyzer, corpus):
+    serial = analyzer.batch_analyze(corpus)
+    assert all(r["success"] for r in serial)
+    assert analyzer.batch_analyze_pipelined(corpus, batch_size=7) == serial
+
+
+def test_failing_paths_iterator_is_reraised(analyzer, corpus):
+    paths = analyzer.list_card_paths(corpus)
+
+    def broken_paths():
+        yield from paths[:5]
+        raise RuntimeError("目录在遍历中被删除")
+
+    results = []
+    with pytest.raises(RuntimeError, match="遍历中"):
+        for r in analyzer.iter_analyze_pipelined(broken_paths(), batch_size=2):
+            results.append(r)
+    # 出错前已读到的卡片照常产出
+    assert [r["file_path"] for r in results] == paths[:5]
+    assert not [t for t in threading.enumerate() if t.daemon and t.is_alive() and "read_stage" in t.name]
+
+
+@pytest.mark.parametrize("extra", [["--threads", "2"], ["--processes", "2"]])
+def test_memory_budget_is_rejected_outside_the_pipeline(corpus, extra, capsys):
+    from BodyDataAnalyzer import main
+
+    with pytest.raises(SystemExit):
+        main([corpus, "--memory-budget", "64"] + extra)
+    assert "--memory-budget" in capsys.readouterr().err
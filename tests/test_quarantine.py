@@ -0,0 +1,44 @@
+# -*- coding:utf-8 -*-
+"""隔离名单：多进程模式下由父进程统一写入，汇总不漏掉子进程隔离的卡片"""
+import os
+
+from quarantine import Quarantine
+
+
+def write_junk(corpus, n):
+    for i in range(n):
+        with open(os.path.join(corpus, f"junk_{i}.png"), "wb") as f:
+            f.write(b"not a card %d" % i)
+
+
+def test_forked_workers_report_quarantined_cards(analyzer, corpus, tmp_path):
+    write_junk(corpus, 5)
+    path = str(tmp_path / "quarantine.jsonl")
+    analyzer.quarantine = Quarantine(path)
+    pool = analyzer.forked_pool(2)
+    try:
+        results = list(analyzer.iter_analyze_forked(analyzer.list_card_paths(corpus), batch_size=4, pool=pool))
+    finally:
+        pool.shutdown()
+        analyzer.quarantine.close()
+    assert sum(r.get("invalid_reason") == "not_png" for r in results) == 5
+    assert analyzer.quarantine.summary() == {"not_png": 5}
+    # 文件里每张坏卡恰好一行，重新打开得到同样的名单
+    with open(path, "rb") as f:
+        assert len(f.readlines()) == 5
+    with Quarantine(path) as reopened:
+        assert sorted(reopened.entries) == sorted(analyzer.quarantine.entries)
+
+
+def test_deferred_records_are_applied_by_the_owner(tmp_path):
+    card = tmp_path / "bad.png"
+    card.write_bytes(b"junk")
+    path = str(tmp_path / "quarantine.jsonl")
+    with Quarantine(path) as parent, Quarantine(path) as child:
+        child.defer()
+        child.add(str(card), "not_png")
+        assert os.path.getsize(path) == 0
+        assert str(card) in child
+        parent.apply(child.take_pending())
+        assert child.take_pending() == []
+        assert str(card) in parent and os.path.getsize(path) > 0
@@ -0,0 +1,137 @@
+# -*- coding:utf-8 -*-
+"""批量改卡：字节还原、dry-run 不写文件、原子写失败时原卡不变、rename 冲突、多进程与单进程结果一致"""
+import os
+
+import pytest
+
+from chara_loader import rewrite
+from chara_loader.rewrite import load_card, original_blocks, rewrite_card, rewrite_cards
+from synth_cards import write_corpus
+
+
+@pytest.fixture
+def cards(tmp_path):
+    return write_corpus(str(tmp_path / "cards"), 12, seed=1)
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def snapshot(paths):
+    return {p: (read(p), os.stat(p).st_mtime_ns) for p in paths}
+
+
+SCALE_HEIGHT = [{"op": "scale", "path": "Custom.body.shapeValueBody.0", "factor": 2.0}]
+UNSCALE_HEIGHT = [{"op": "scale", "path": "Custom.body.shapeValueBody.0", "factor": 0.5}]
+
+
+def test_untouched_blocks_are_byte_identical(cards):
+    for path in cards:
+        before = read(path)
+        r = rewrite_card(path, SCALE_HEIGHT)
+        assert r["error"] is None and r["changed"]
+        after = read(path)
+        old_blocks, new_blocks = original_blocks(before), original_blocks(after)
+        assert old_blocks.keys() == new_blocks.keys()
+        for name in old_blocks:
+            if name != "Custom":
+                assert new_blocks[name] == old_blocks[name], name
+        old_sv = load_card(before).Custom["body"]["shapeValueBody"]
+        new_sv = load_card(after).Custom["body"]["shapeValueBody"]
+        assert new_sv[0] == old_sv[0] * 2.0 and new_sv[1:] == old_sv[1:]
+
+
+def test_inverse_edit_round_trips_to_original_bytes(cards):
+    before = {p: read(p) for p in cards}
+    for path in cards:
+        assert rewrite_card(path, SCALE_HEIGHT)["error"] is None
+        assert rewrite_card(path, UNSCALE_HEIGHT)["error"] is None
+        assert read(path) == before[path]
+
+
+def test_no_op_edit_does_not_rewrite(cards):
+    before = snapshot(cards)
+    edits = [{"op": "clamp", "path": "Custom.body.shapeValueBody", "min": -100.0, "max": 100.0}]
+    for path in cards:
+        r = rewrite_card(path, edits)
+        assert r["error"] is None and not r["changed"]
+    assert snapshot(cards) == before
+
+
+def test_dry_run_reports_without_writing(cards):
+    before = snapshot(cards)
+    results = list(rewrite_cards(cards, SCALE_HEIGHT, workers=1, dry_run=True))
+    assert all(r["changed"] and r["diffs"] and r["error"] is None for r in results)
+    assert snapshot(cards) == before
+    assert sorted(os.listdir(os.path.dirname(cards[0]))) == sorted(os.path.basename(p) for p in cards)
+
+
+def test_failed_atomic_write_leaves_original_intact(cards, monkeypatch):
+    path = cards[0]
+    before = snapshot(cards)
+
+    def broken_fsync(fd):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(rewrite.os, "fsync", broken_fsync)
+    r = rewrite_card(path, SCALE_HEIGHT)
+    assert r["error"].startswith("OSError")
+    assert snapshot(cards) == before
+    # 临时文件已清理
+    assert sorted(os.listdir(os.path.dirname(path))) == sorted(os.path.basename(p) for p in cards)
+
+
+def test_rename_onto_existing_key_is_rejected(cards):
+    path = next(p for p in cards if os.path.basename(p).startswith("ais_"))
+    before = snapshot([path])
+    edits = [{"op": "rename", "path": "Custom.body.skinId", "to": "shapeValueBody"}]
+    for dry_run in (True, False):
+        r = rewrite_card(path, edits, dry_run=dry_run)
+        assert r["error"].startswith("EditConflict") and not r["changed"]
+        assert snapshot([path]) == before
+
+
+def test_rename_to_new_key(cards):
+    path = next(p for p in cards if os.path.basename(p).startswith("ais_"))
+    skin = load_card(read(path)).Custom["body"]["skinId"]
+    r = rewrite_card(path, [{"op": "rename", "path": "Custom.body.skinId", "to": "skinIdOld"}])
+    assert r["error"] is None and r["diffs"] == [{"path": "Custom.body.skinId", "old": "skinId", "new": "skinIdOld"}]
+    body = load_card(read(path)).Custom["body"]
+    assert "skinId" not in body and body["skinIdOld"] == skin
+
+
+def test_process_pool_matches_serial(tmp_path, cards):
+    serial_dir, pool_dir = str(tmp_path / "serial"), str(tmp_path / "pool")
+    root = os.path.dirname(cards[0])
+    serial = list(rewrite_cards(cards, SCALE_HEIGHT, workers=1, output_dir=serial_dir, root=root))
+    pooled = list(rewrite_cards(cards, SCALE_HEIGHT, workers=2, output_dir=pool_dir, root=root, chunksize=3))
+    assert [r["diffs"] for r in serial] == [r["diffs"] for r in pooled]
+    for p in cards:
+        name = os.path.basename(p)
+        assert read(os.path.join(serial_dir, name)) == read(os.path.join(pool_dir, name))
+
+
+def test_malformed_card_reports_invalid_reason(cards):
+    path = cards[0]
+    data = read(path)
+    with open(path, "wb") as f:
+        f.write(data[: len(data) - 100])
+    before = snapshot([path])
+    r = rewrite_card(path, SCALE_HEIGHT)
+    assert r["invalid_reason"] == "truncated" and r["error"] and not r["changed"]
+    assert snapshot([path]) == before
+    assert "invalid_reason" not in rewrite_card(cards[1], SCALE_HEIGHT)
+
+
+def test_cards_are_loaded_once_by_declared_format(cards, monkeypatch):
+    calls = []
+    for loader in (rewrite.AiSyoujyoCharaData, rewrite.KoikatuCharaData):
+        monkeypatch.setattr(loader, "load", classmethod(
+            lambda cls, data, _load=loader.load.__func__: calls.append(cls.__name__) or _load(cls, data)))
+    for path in cards:
+        calls.clear()
+        chara = load_card(read(path))
+        assert calls == [type(chara).__name__]
+    assert {type(load_card(read(p))).__name__ for p in cards} == {"AiSyoujyoCharaData", "KoikatuCharaData"}
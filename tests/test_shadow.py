@@ -0,0 +1,30 @@
+# -*- coding:utf-8 -*-
+"""影子评分：batch_analyze(shadow=...) 只对这一次调用生效"""
+import pytest
+
+
+def test_shadow_argument_is_scoped_to_the_call(analyzer, corpus, models):
+    shadowed = analyzer.batch_analyze(corpus, shadow=models)
+    assert all("shadow" in r for r in shadowed if r["success"])
+    # 候选模型与正式模型相同，身高不变
+    assert all(r["shadow"]["delta_cm"] == 0 for r in shadowed if r["success"])
+    assert analyzer.shadow is None
+    assert not any("shadow" in r for r in analyzer.batch_analyze(corpus))
+
+
+def test_previous_shadow_is_restored(analyzer, corpus, models):
+    analyzer.set_shadow_models(models)
+    previous = analyzer.shadow
+    analyzer.batch_analyze(corpus, shadow={"*": models["*"]})
+    assert analyzer.shadow is previous
+
+
+def test_shadow_is_restored_on_error(analyzer, models, monkeypatch):
+    def broken(directory_path):
+        raise RuntimeError("遍历失败")
+        yield
+
+    monkeypatch.setattr(analyzer, "iter_batch_analyze", broken)
+    with pytest.raises(RuntimeError):
+        analyzer.batch_analyze("unused", shadow=models)
+    assert analyzer.shadow is None
@@ -0,0 +1,72 @@
+# -*- coding:utf-8 -*-
+"""快照差异：JSON 数组、分片 JSONL 和运行日志都能作为输入，乱序和多段归并与整体比较结果一致"""
+import json
+import random
+
+from shards import write_json_array
+from snapshot_diff import diff_files
+
+
+def result(path, category="普妹", cm=160.0, hash_=None, success=True):
+    r = {"file_path": path, "success": success, "height_cm": cm, "height_category": category,
+         "error": None if success else "OSError: x"}
+    if hash_:
+        r["content_hash"] = hash_
+    return r
+
+
+def read_changes(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_change_kinds_with_unsorted_input_and_small_runs(tmp_path):
+    old = [result(f"c/{i:04d}.png", hash_=f"sha256:{i}") for i in range(500)]
+    new = [dict(r) for r in old[10:]]
+    new[0]["content_hash"] = "sha256:changed"                      # modified
+    new[1].update(height_category="御姐", height_cm=175.0)          # recategorized，内容未变
+    new.append(result("c/new.png", hash_="sha256:new"))            # new
+    random.Random(0).shuffle(new)
+    write_json_array(old, str(tmp_path / "old.json"))
+    write_json_array(new, str(tmp_path / "new.json"))
+
+    counts = diff_files(str(tmp_path / "old.json"), str(tmp_path / "new.json"), str(tmp_path / "changes.jsonl"),
+                        run_size=37, tmp_dir=str(tmp_path))
+    changes = read_changes(str(tmp_path / "changes.jsonl"))
+    assert dict(counts) == {"removed": 10, "modified": 1, "recategorized": 1, "new": 1, "unchanged": 488}
+    assert [c["file_path"] for c in changes] == sorted(c["file_path"] for c in changes)
+    recat = next(c for c in changes if c["change"] == "recategorized")
+    assert recat["old_category"] == "普妹" and recat["content_changed"] is False
+    # 临时有序段已清理
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["changes.jsonl", "new.json", "old.json"]
+
+
+def test_run_journal_input(analyzer, corpus, tmp_path):
+    journal = str(tmp_path / "run.jsonl")
+    results = analyzer.batch_analyze_resumable(corpus, journal)
+    write_json_array(results, str(tmp_path / "results.json"))
+    counts = diff_files(journal, str(tmp_path / "results.json"), str(tmp_path / "changes.jsonl"))
+    assert dict(counts) == {"unchanged": len(results)}
+    assert read_changes(str(tmp_path / "changes.jsonl")) == []
+
+
+def test_aesthetic_label_changes_are_recategorized(tmp_path):
+    labels = {"bodyHeight": "普妹", "bustSize": "适中", "waistSize": "标准", "hipSize": "匀称",
+              "bustSoftness": "自然", "muscle": "健康"}
+    old = [dict(result(f"c/{i}.png", hash_=f"sha256:{i}"), aesthetic_classifications=dict(labels),
+                combined_tag="普妹_适中_匀称_健康_自然") for i in range(3)]
+    new = [dict(r, aesthetic_classifications=dict(r["aesthetic_classifications"])) for r in old]
+    # 重新分类后只有审美标签变了：一张 combined_tag 也变了，一张只变了不进 combined_tag 的腰围
+    new[0]["aesthetic_classifications"]["bustSize"] = "丰满"
+    new[0]["combined_tag"] = "普妹_丰满_匀称_健康_自然"
+    new[1]["aesthetic_classifications"]["waistSize"] = "纤细"
+    write_json_array(old, str(tmp_path / "old.json"))
+    write_json_array(new, str(tmp_path / "new.json"))
+
+    counts = diff_files(str(tmp_path / "old.json"), str(tmp_path / "new.json"), str(tmp_path / "changes.jsonl"))
+    assert dict(counts) == {"recategorized": 2, "unchanged": 1}
+    first, second = read_changes(str(tmp_path / "changes.jsonl"))
+    assert first["old_combined_tag"] == "普妹_适中_匀称_健康_自然"
+    assert first["combined_tag"] == "普妹_丰满_匀称_健康_自然" and first["content_changed"] is False
+    assert "old_combined_tag" not in second
+    assert second["aesthetic_classifications"]["waistSize"] == "纤细"
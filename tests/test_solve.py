@@ -0,0 +1,28 @@
+# -*- coding:utf-8 -*-
+"""反求目标身高：只改指定的滑块，indices 不合法时给出明确的 ValueError"""
+import pytest
+
+
+@pytest.fixture
+def chara(analyzer, corpus):
+    path = next(p for p in analyzer.list_card_paths(corpus) if p.endswith(".png") and "ais_" in p)
+    return analyzer.load_character_card(path)
+
+
+def test_solve_only_moves_given_sliders(analyzer, chara):
+    before = list(chara.Custom["body"]["shapeValueBody"])
+    shape_values, height = analyzer.solve_shape_for_height(chara, 160.0, indices=(0, 3))
+    assert len(shape_values) == len(before)
+    assert all(a == pytest.approx(b) for i, (a, b) in enumerate(zip(shape_values, before)) if i not in (0, 3))
+    assert isinstance(height, float)
+
+
+@pytest.mark.parametrize("indices, message", [
+    ((), "不能为空"),
+    ((0, 999), "越界"),
+    ((-1,), "越界"),
+    ((2, 2), "重复"),
+])
+def test_invalid_indices(analyzer, chara, indices, message):
+    with pytest.raises(ValueError, match=message):
+        analyzer.solve_shape_for_height(chara, 160.0, indices=indices)
@@ -0,0 +1,79 @@
+# -*- coding:utf-8 -*-
+"""字节流切分：坏数据记为一条错误并从下一个 PNG 签名处继续，前后的卡片不受影响"""
+import io
+
+import pytest
+
+from chara_loader.stream import StreamCardError, iter_stream_cards
+from synth_cards import generate_corpus
+
+
+@pytest.fixture(scope="module")
+def cards():
+    return [data for _, data in generate_corpus(6, seed=4)]
+
+
+def broken_stream(cards):
+    """
+    卡片之间夹着垃圾字节、一张截断的卡，流末尾再截断一张。
+    截断的都是 AI少女 卡：恋活卡内嵌的头像也是 PNG，截断后会从头像处再切出一段坏数据
+    """
+    parts = [cards[0], b"garbage" * 100, cards[1], cards[2][: len(cards[2]) // 2], cards[3], cards[5],
+             cards[4][:-10]]
+    return b"".join(parts)
+
+
+@pytest.mark.parametrize("chunk_size", [7, 1000, 1024 * 1024])
+def test_resync_keeps_good_cards(cards, chunk_size):
+    assert [name[:2] for name, _ in generate_corpus(6, seed=4)] == ["kk", "kk", "ai", "ai", "ai", "kk"]
+    items = list(iter_stream_cards(io.BytesIO(broken_stream(cards)), chunk_size=chunk_size, resync=True))
+    good = [x for x in items if isinstance(x, bytes)]
+    errors = [x for x in items if isinstance(x, StreamCardError)]
+    assert good == [cards[0], cards[1], cards[3], cards[5]]
+    assert [type(x).__name__ for x in items] == ["bytes", "StreamCardError", "bytes", "StreamCardError",
+                                                 "bytes", "bytes", "StreamCardError"]
+    assert errors[0].offset == len(cards[0]) and errors[0].size == 700
+    assert errors[-1].reason.startswith("stream ended inside a card")
+
+
+def test_oversized_card_is_skipped(cards):
+    limit = max(len(c) for c in cards[1:3])
+    stream = io.BytesIO(cards[1] + cards[0] + cards[2])
+    if len(cards[0]) <= limit:
+        pytest.skip("合成卡片大小相同")
+    items = list(iter_stream_cards(stream, max_card_size=limit, resync=True))
+    assert items[0] == cards[1] and items[-1] == cards[2]
+    assert isinstance(items[1], StreamCardError) and "max_card_size" in str(items[1])
+
+
+def test_without_resync_raises(cards):
+    stream = io.BytesIO(cards[0] + b"garbage" + cards[1])
+    it = iter_stream_cards(stream)
+    assert next(it) == cards[0]
+    with pytest.raises(ValueError, match="PNG signature"):
+        next(it)
+
+
+def test_stream_analysis_records_errors_and_continues(analyzer, cards):
+    results = list(analyzer.iter_analyze_stream(io.BytesIO(broken_stream(cards)), name="in", batch_size=2))
+    assert [r["file_path"] for r in results] == [f"in#{i}" for i in range(7)]
+    assert [r["success"] for r in results] == [True, False, True, False, True, True, False]
+    assert results[1]["error"].startswith("StreamCardError")
+
+
+@pytest.mark.parametrize("field, offset", [("header", 4), ("version", None)])
+def test_length_bytes_are_signed(cards, field, offset):
+    from chara_loader.funcs import get_png_length
+    from chara_loader.stream import card_length
+    from chara_loader.validate import CardValidationError, validate_card
+
+    data = bytearray(cards[2])
+    idx = get_png_length(data, 0)
+    if offset is None:
+        offset = 5 + data[idx + 4]  # 版本长度紧跟在头部字符串之后
+    data[idx + offset] = 0x90  # 按有符号字节读是 -112
+    with pytest.raises(ValueError, match="negative {} length".format(field)):
+        card_length(data)
+    # 加载前的结构校验同样拒绝这张卡，切分和解析不会在不同的位置断开
+    with pytest.raises(CardValidationError):
+        validate_card(bytes(data))